@@ -76,20 +76,22 @@ export class FileUploadComponent implements OnInit {
   }
 
   handleFile(file: File): void {
-    // Validate file type
-    const validTypes = ['text/csv', 'application/json', 'text/json'];
-    const isCSV = file.name.endsWith('.csv');
-    const isJSON = file.name.endsWith('.json');
-
-    if (!isCSV && !isJSON && !validTypes.includes(file.type)) {
-      this.uploadError = 'Format de fichier non valide. Seuls les fichiers CSV et JSON sont acceptés.';
+    // Validate file type (CSV, JSON, NDJSON, éventuellement compressés en .gz/.zst)
+    const validTypes = ['text/csv', 'application/json', 'text/json', 'application/x-ndjson'];
+    const name = file.name.toLowerCase().replace(/\.(gz|zst)$/, '');
+    const isCSV = name.endsWith('.csv');
+    const isJSON = name.endsWith('.json');
+    const isNDJSON = name.endsWith('.ndjson') || name.endsWith('.jsonl');
+
+    if (!isCSV && !isJSON && !isNDJSON && !validTypes.includes(file.type)) {
+      this.uploadError = 'Format de fichier non valide. Seuls les fichiers CSV, JSON et NDJSON (éventuellement compressés en .gz/.zst) sont acceptés.';
       return;
     }
 
-    // Validate file size (max 10MB)
-    const maxSize = 10 * 1024 * 1024; // 10MB
+    // Validate file size (max 4GB, le serveur parse le fichier en flux)
+    const maxSize = 4 * 1024 * 1024 * 1024; // 4GB
     if (file.size > maxSize) {
-      this.uploadError = 'Le fichier est trop volumineux. Taille maximale: 10MB';
+      this.uploadError = 'Le fichier est trop volumineux. Taille maximale: 4GB';
       return;
     }
 
@@ -110,13 +112,6 @@ export class FileUploadComponent implements OnInit {
     this.uploadSuccess = false;
     this.uploadResponse = null;
 
-    // Simulate progress (since the API doesn't support progress events)
-    const progressInterval = setInterval(() => {
-      if (this.uploadProgress < 90) {
-        this.uploadProgress += 10;
-      }
-    }, 200);
-
     // Préparer le FormData avec le type de données
     const formData = new FormData();
     formData.append('file', this.selectedFile);
@@ -126,31 +121,18 @@ export class FileUploadComponent implements OnInit {
       formData.append('data_type', this.selectedDataType);
     }
 
+    // Traitement asynchrone côté serveur : la progression réelle est suivie par polling
+    formData.append('async', 'true');
+
     this.fileUploadService.uploadFileWithType(formData).subscribe({
       next: (response) => {
-        clearInterval(progressInterval);
-        this.uploadProgress = 100;
-        this.uploading = false;
-        this.uploadSuccess = true;
-        this.uploadResponse = response;
-        
-        console.log('Upload successful:', response);
-
-        // Reload history and stats
-        setTimeout(() => {
-          this.loadHistory();
-          this.loadStats();
-        }, 500);
-
-        // Reset success message after 5 seconds
-        setTimeout(() => {
-          this.uploadSuccess = false;
-          this.uploadResponse = null;
-          this.selectedFile = null;
-        }, 5000);
+        if (response?.job_id) {
+          this.trackProgress(response);
+        } else {
+          this.onUploadCompleted(response);
+        }
       },
       error: (error) => {
-        clearInterval(progressInterval);
         this.uploading = false;
         this.uploadProgress = 0;
         this.uploadError = error.error?.message || 'Erreur lors de l\'upload du fichier';
@@ -159,6 +141,50 @@ export class FileUploadComponent implements OnInit {
     });
   }
 
+  trackProgress(job: any): void {
+    this.fileUploadService.pollUploadProgress(job.job_id).subscribe({
+      next: (progress) => {
+        this.uploadProgress = Math.round(progress.progress_percent ?? 0);
+
+        if (progress.status === 'completed') {
+          this.onUploadCompleted({ ...job, ...progress, records_processed: progress.records_count });
+        } else if (progress.status === 'failed') {
+          this.uploading = false;
+          this.uploadProgress = 0;
+          this.uploadError = progress.error_message || 'Erreur lors du traitement du fichier';
+          this.loadHistory();
+        }
+      },
+      error: (error) => {
+        this.uploading = false;
+        this.uploadError = 'Impossible de suivre la progression du traitement';
+        console.error('Progress error:', error);
+      }
+    });
+  }
+
+  onUploadCompleted(response: any): void {
+    this.uploadProgress = 100;
+    this.uploading = false;
+    this.uploadSuccess = true;
+    this.uploadResponse = response;
+    
+    console.log('Upload successful:', response);
+
+    // Reload history and stats
+    setTimeout(() => {
+      this.loadHistory();
+      this.loadStats();
+    }, 500);
+
+    // Reset success message after 5 seconds
+    setTimeout(() => {
+      this.uploadSuccess = false;
+      this.uploadResponse = null;
+      this.selectedFile = null;
+    }, 5000);
+  }
+
   loadHistory(): void {
     this.loadingHistory = true;
     this.fileUploadService.getRecentUploads().subscribe({
@@ -201,8 +227,9 @@ export class FileUploadComponent implements OnInit {
   }
 
   getFileIcon(filename: string): string {
-    if (filename.endsWith('.csv')) return '📊';
-    if (filename.endsWith('.json')) return '📄';
+    const name = filename.toLowerCase().replace(/\.(gz|zst)$/, '');
+    if (name.endsWith('.csv')) return '📊';
+    if (name.endsWith('.json') || name.endsWith('.ndjson') || name.endsWith('.jsonl')) return '📄';
     return '📁';
   }
 
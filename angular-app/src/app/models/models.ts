@@ -117,6 +117,21 @@ export interface FileUploadHistory {
   timestamp: string;
   status: string;
   error_message?: string;
+  data_type?: string;
+  records_processed?: number;
+}
+
+export interface UploadProgress {
+  id: number;
+  status: 'pending' | 'processing' | 'completed' | 'failed';
+  records_processed: number;
+  records_count: number;
+  bytes_processed: number;
+  file_size: number;
+  progress_percent: number | null;
+  error_message?: string | null;
+  started_at?: string | null;
+  completed_at?: string | null;
 }
 
 export interface SensorStatistics {
@@ -323,3 +338,25 @@ export interface StatsData {
   avg: number;
   sum: number;
 }
+
+// Flux temps réel (/api/stream/, Server-Sent Events)
+export interface LiveStreamParams {
+  data_type?: string;
+  batiment?: string;
+  severite?: string;
+  buffer?: number;
+  policy?: 'drop' | 'merge';
+}
+
+export interface LiveDocument {
+  _id: string;
+  _index: string;
+  data_type: string;
+  [field: string]: any;
+}
+
+export type LiveStreamEvent =
+  | { type: 'documents'; documents: LiveDocument[] }
+  | { type: 'dropped'; count: number }
+  | { type: 'summary'; counts: { [dataType: string]: number } }
+  | { type: 'resync' };
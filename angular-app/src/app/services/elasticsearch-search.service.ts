@@ -5,6 +5,7 @@ import { environment } from '../../environments/environment';
 
 export interface SearchRequest {
   query?: string;
+  fuzzy?: boolean;
   index?: string;
   size?: number;
   from_offset?: number;
@@ -17,6 +18,7 @@ export interface SearchRequest {
   date_to?: string;
   sort_by?: string;
   sort_order?: string;
+  fields?: string;
 }
 
 export interface SearchResult {
@@ -1,9 +1,9 @@
 import { Injectable } from '@angular/core';
 import { HttpClient } from '@angular/common/http';
-import { Observable, Subject } from 'rxjs';
-import { tap } from 'rxjs/operators';
+import { Observable, Subject, timer } from 'rxjs';
+import { switchMap, takeWhile, tap } from 'rxjs/operators';
 import { environment } from '../../environments/environment';
-import { FileUploadHistory } from '../models/models';
+import { FileUploadHistory, UploadProgress } from '../models/models';
 
 @Injectable({
   providedIn: 'root'
@@ -44,4 +44,21 @@ export class FileUploadService {
   getUploadStats(): Observable<any> {
     return this.http.get<any>(`${this.apiUrl}/files/stats/`);
   }
+
+  getUploadProgress(uploadId: number): Observable<UploadProgress> {
+    return this.http.get<UploadProgress>(`${this.apiUrl}/files/${uploadId}/progress/`);
+  }
+
+  // Interroge la progression d'un upload asynchrone jusqu'à la fin du traitement
+  pollUploadProgress(uploadId: number, intervalMs = 1000): Observable<UploadProgress> {
+    return timer(0, intervalMs).pipe(
+      switchMap(() => this.getUploadProgress(uploadId)),
+      takeWhile(progress => progress.status === 'pending' || progress.status === 'processing', true),
+      tap(progress => {
+        if (progress.status === 'completed') {
+          this.uploadCompletedSource.next();
+        }
+      })
+    );
+  }
 }
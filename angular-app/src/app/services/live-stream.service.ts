@@ -0,0 +1,35 @@
+import { Injectable, NgZone } from '@angular/core';
+import { Observable } from 'rxjs';
+import { environment } from '../../environments/environment';
+import { LiveStreamEvent, LiveStreamParams } from '../models/models';
+
+@Injectable({
+  providedIn: 'root'
+})
+export class LiveStreamService {
+  private apiUrl = `${environment.apiUrl}/stream/`;
+
+  constructor(private zone: NgZone) {}
+
+  // Documents indexés au fil de l'eau ; dropped, summary et resync : recharger la liste par l'API REST
+  stream(params: LiveStreamParams = {}): Observable<LiveStreamEvent> {
+    const query = new URLSearchParams();
+    Object.entries(params).forEach(([key, value]) => {
+      if (value !== undefined && value !== null && value !== '') {
+        query.set(key, String(value));
+      }
+    });
+
+    return new Observable<LiveStreamEvent>(subscriber => {
+      // EventSource se reconnecte seul (retry envoyé par le serveur)
+      const source = new EventSource(`${this.apiUrl}?${query.toString()}`);
+      const emit = (type: string) => (event: MessageEvent) =>
+        this.zone.run(() => subscriber.next({ type, ...JSON.parse(event.data) } as LiveStreamEvent));
+
+      ['documents', 'dropped', 'summary', 'resync'].forEach(type =>
+        source.addEventListener(type, emit(type) as EventListener)
+      );
+      return () => source.close();
+    });
+  }
+}
@@ -9,18 +9,21 @@ from .models import FileUploadHistory, ElasticsearchQuery
 class FileUploadHistoryAdmin(admin.ModelAdmin):
     """Admin pour l'historique des uploads"""
     
-    list_display = ('filename', 'file_type', 'records_count', 'status', 'uploaded_at')
-    list_filter = ('file_type', 'status', 'uploaded_at')
+    list_display = ('filename', 'file_type', 'data_type', 'records_count', 'status', 'uploaded_at')
+    list_filter = ('file_type', 'data_type', 'status', 'uploaded_at')
     search_fields = ('filename',)
-    readonly_fields = ('uploaded_at',)
+    readonly_fields = ('uploaded_at', 'started_at', 'completed_at')
     
     fieldsets = (
         ('Fichier', {
-            'fields': ('filename', 'file_type', 'records_count')
+            'fields': ('filename', 'file_type', 'data_type', 'records_count', 'stored_file', 'file_size')
         }),
         ('Status', {
             'fields': ('status', 'error_message')
         }),
+        ('Progression', {
+            'fields': ('records_processed', 'bytes_processed', 'started_at', 'completed_at')
+        }),
         ('Métadonnées', {
             'fields': ('uploaded_at',)
         }),
@@ -0,0 +1,313 @@
+"""
+Service Elasticsearch asynchrone (déploiement ASGI, voir config/asgi.py)
+
+AsyncElasticsearchService reprend d'ElasticsearchService la construction
+des requêtes et la mise en forme des réponses ; seules les méthodes qui
+appellent Elasticsearch sont redéfinies en coroutines, sur AsyncElasticsearch
+(paquet aiohttp). Les réponses sont identiques à celles du service
+synchrone.
+
+Le client (clients.async_elasticsearch_client) est lié à la boucle
+d'événements qui l'utilise en premier : un par processus uvicorn. Sous WSGI, chaque vue asynchrone reçoit une
+nouvelle boucle : les vues asynchrones ne sont routées que sous ASGI.
+"""
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from django.conf import settings
+
+from .clients import async_elasticsearch_client
+from .elasticsearch_service import (
+    SENSOR_AGGREGATIONS,
+    VEHICLE_AGGREGATIONS,
+    ElasticsearchService,
+    decode_cursor,
+)
+from .metrics import InstrumentedElasticsearch, Metrics, debug_sampled
+from .query_cache import QueryCache
+from .rollups import Plan, RollupPlanner
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncElasticsearchService(ElasticsearchService):
+    """Variantes asynchrones des méthodes d'ElasticsearchService"""
+    
+    def __init__(self, metrics: Optional[Metrics] = None, query_cache: Optional[QueryCache] = None):
+        self.es = async_elasticsearch_client
+        if metrics is not None:
+            self.es = InstrumentedElasticsearch(self.es, metrics)
+        self.query_cache = query_cache
+        self.rollups = RollupPlanner()
+    
+    async def close(self):
+        await self.es.close()
+    
+    async def check_connection(self) -> bool:
+        try:
+            return await self.es.ping()
+        except Exception as e:
+            logger.error(f"Erreur connexion Elasticsearch: {e}")
+            return False
+    
+    async def get_indices(self) -> List[str]:
+        try:
+            indices = await self.es.cat.indices(format='json')
+            return [idx['index'] for idx in indices]
+        except Exception as e:
+            logger.error(f"Erreur récupération indices: {e}")
+            return []
+    
+    async def count_documents(self, index: str = None) -> int:
+        try:
+            result = await self.es.count(index=index or self.default_index)
+            return result['count']
+        except Exception as e:
+            logger.error(f"Erreur comptage documents: {e}")
+            return 0
+    
+    async def search(
+        self,
+        query: Optional[str] = None,
+        index: str = None,
+        size: int = 50,
+        from_offset: int = 0,
+        filters: Optional[Dict] = None,
+        sort_by: str = '@timestamp',
+        sort_order: str = 'desc',
+        source: Optional[Dict] = None,
+        fuzzy: bool = False
+    ) -> Dict[str, Any]:
+        try:
+            index = index or self.default_index
+            body = self._search_body(query, index, size, from_offset, filters, sort_by, sort_order, source, fuzzy)
+            
+            if debug_sampled():
+                logger.info(f"Recherche Elasticsearch: index={index}, query={query}, filters={filters}")
+            
+            result = await self._cached_search(index, body)
+            return self._search_response(result, from_offset, size)
+        
+        except Exception as e:
+            logger.error(f"Erreur recherche Elasticsearch: {e}")
+            return {
+                'total': 0,
+                'count': 0,
+                'documents': [],
+                'error': str(e)
+            }
+    
+    async def _cached_search(self, index: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        if self.query_cache is None:
+            return await self.es.search(index=index, body=body)
+        return await self.query_cache.aget_or_call(
+            self.query_cache.key(index, body),
+            lambda: self.es.search(index=index, body=body)
+        )
+    
+    async def search_page(
+        self,
+        query: Optional[str] = None,
+        index: str = None,
+        size: int = 50,
+        filters: Optional[Dict] = None,
+        sort_by: str = '@timestamp',
+        sort_order: str = 'desc',
+        source: Optional[Dict] = None,
+        cursor: Optional[str] = None,
+        fuzzy: bool = False,
+        with_total: bool = False
+    ) -> Dict[str, Any]:
+        try:
+            if cursor:
+                state = decode_cursor(cursor)
+            else:
+                index = index or self.default_index
+                pit = await self.es.open_point_in_time(index=index, keep_alive=settings.SEARCH_PIT_KEEP_ALIVE)
+                state = self._page_state(query, index, filters, sort_by, sort_order, source, pit['id'], fuzzy)
+            
+            result = await self.es.search(body=self._pit_body(state, size, track_total_hits=with_total and not cursor))
+            page, pit_id = self._page_response(state, result, size)
+            if page['next_cursor'] is None:
+                await self._close_point_in_time(pit_id)
+            return page
+        
+        except Exception as e:
+            logger.error(f"Erreur recherche paginée Elasticsearch: {e}")
+            return {
+                'total': 0,
+                'count': 0,
+                'documents': [],
+                'next_cursor': None,
+                'error': str(e)
+            }
+    
+    async def iter_documents(
+        self,
+        query: Optional[str] = None,
+        index: str = None,
+        filters: Optional[Dict] = None,
+        sort_by: str = '@timestamp',
+        sort_order: str = 'desc',
+        source: Optional[Dict] = None,
+        batch_size: int = 1000,
+        fuzzy: bool = False
+    ) -> AsyncIterator[Dict]:
+        index = index or self.default_index
+        pit = await self.es.open_point_in_time(index=index, keep_alive=settings.SEARCH_PIT_KEEP_ALIVE)
+        state = self._page_state(query, index, filters, sort_by, sort_order, source, pit['id'], fuzzy)
+        try:
+            while True:
+                result = await self.es.search(body=self._pit_body(state, batch_size, track_total_hits=False))
+                hits = result['hits']['hits']
+                state['pit'] = result.get('pit_id', state['pit'])
+                for document in self._documents(hits):
+                    yield document
+                if len(hits) < batch_size:
+                    return
+                state['after'] = hits[-1]['sort']
+        finally:
+            await self._close_point_in_time(state['pit'])
+    
+    async def _close_point_in_time(self, pit_id: str):
+        try:
+            await self.es.close_point_in_time(id=pit_id)
+        except Exception as e:
+            logger.warning(f"Fermeture du point-in-time impossible: {e}")
+    
+    async def get_by_id(self, doc_id: str, index: str = None) -> Optional[Dict]:
+        try:
+            index = index or self.default_index
+            result = await self.es.search(index=index, query={"ids": {"values": [doc_id]}}, size=1)
+            hits = result['hits']['hits']
+            if not hits:
+                return None
+            return {
+                '_id': hits[0]['_id'],
+                **hits[0]['_source']
+            }
+        except Exception as e:
+            logger.error(f"Erreur récupération document {doc_id}: {e}")
+            return None
+    
+    async def aggregate(
+        self,
+        field: str,
+        agg_type: str = 'terms',
+        index: str = None,
+        size: int = 10,
+        **kwargs
+    ) -> Dict[str, Any]:
+        try:
+            index = index or self.default_index
+            body = {
+                "size": 0,
+                "aggs": {
+                    "result": self._aggregation_body(field, agg_type, index, size, **kwargs)
+                }
+            }
+            result = await self._cached_search(index, body)
+            return {
+                'aggregation_type': agg_type,
+                'field': field,
+                'result': result['aggregations']['result']
+            }
+        except Exception as e:
+            logger.error(f"Erreur agrégation: {e}")
+            return {
+                'error': str(e)
+            }
+    
+    async def aggregate_many(
+        self,
+        aggregations: Dict[str, tuple],
+        index: str = None,
+        filters: Optional[Dict] = None
+    ) -> Dict[str, Any]:
+        try:
+            index = index or self.default_index
+            result = await self._cached_search(index, self._aggregations_body(aggregations, index, filters))
+            return self._aggregations_response(aggregations, result)
+        except Exception as e:
+            logger.error(f"Erreur agrégations: {e}")
+            return {
+                'error': str(e)
+            }
+    
+    async def get_sensor_statistics(self) -> Dict[str, Any]:
+        return await self.aggregate_many(SENSOR_AGGREGATIONS, filters={'device_id_exists': True})
+    
+    async def get_vehicle_statistics(self) -> Dict[str, Any]:
+        return await self.aggregate_many(VEHICLE_AGGREGATIONS, filters={'vehicle_id_exists': True})
+    
+    async def get_statistics(self, index: str = None) -> Dict[str, Any]:
+        try:
+            index = index or self.default_index
+            result = await self.es.search(index=index, body=self._statistics_body(index))
+            return self._statistics_response(result)
+        except Exception as e:
+            logger.error(f"Erreur statistiques: {e}")
+            return {'error': str(e)}
+    
+    async def _run_plan(self, plan: Plan) -> Dict[str, Any]:
+        searches, format_responses = plan
+        return format_responses((await self.es.msearch(searches=searches))['responses'])
+    
+    async def get_dashboard(self) -> Dict[str, Any]:
+        plans = self._stats_plans()
+        try:
+            responses = (await self.es.msearch(searches=self._dashboard_searches(plans)))['responses']
+        except Exception as e:
+            logger.error(f"Erreur dashboard: {e}")
+            return {'error': str(e)}
+        return self._dashboard_response(plans, responses)
+    
+    async def get_type_statistics(self, data_type: str) -> Dict[str, Any]:
+        """Statistiques d'un type de données (get_<type>_statistics)"""
+        if data_type == 'consommation':
+            return await self.get_consommation_statistics()
+        body, format_response = self._stats_sections()[data_type]
+        try:
+            result = await self.es.search(index=f"iot-{data_type}", body=body())
+            return format_response(result)
+        except Exception as e:
+            logger.error(f"Erreur stats {data_type}: {e}")
+            return {'error': str(e)}
+    
+    async def get_alertes_statistics(self) -> Dict[str, Any]:
+        return await self.get_type_statistics('alertes')
+    
+    async def get_capteurs_statistics(self) -> Dict[str, Any]:
+        return await self.get_type_statistics('capteurs')
+    
+    async def get_consommation_statistics(
+        self,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        filters: Optional[Dict] = None
+    ) -> Dict[str, Any]:
+        try:
+            return await self._run_plan(self.rollups.statistics_plan(date_from, date_to, filters))
+        except Exception as e:
+            logger.error(f"Erreur stats consommation: {e}")
+            return {'error': str(e)}
+    
+    async def get_consommation_histogram(
+        self,
+        interval: str = 'day',
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        filters: Optional[Dict] = None
+    ) -> Dict[str, Any]:
+        try:
+            return await self._run_plan(self.rollups.histogram_plan(interval, date_from, date_to, filters))
+        except Exception as e:
+            logger.error(f"Erreur histogramme consommation: {e}")
+            return {'error': str(e)}
+    
+    async def get_occupation_statistics(self) -> Dict[str, Any]:
+        return await self.get_type_statistics('occupation')
+    
+    async def get_maintenance_statistics(self) -> Dict[str, Any]:
+        return await self.get_type_statistics('maintenance')
@@ -0,0 +1,295 @@
+"""
+Vues asynchrones (déploiement ASGI : config/asgi.py, DJANGO_ASYNC_VIEWS=1)
+
+Variantes des vues de lecture les plus sollicitées par les tableaux de
+bord : statistiques, dashboard, listes par type. Elles attendent
+Elasticsearch (AsyncElasticsearchService) et Redis (redis.asyncio) sans
+bloquer de thread : un worker uvicorn sert ainsi de nombreuses requêtes
+en attente d'Elasticsearch au lieu d'une seule par thread. Les endpoints
+de santé lisent l'instantané en mémoire (health.py) directement dans la
+boucle d'événements. Le flux temps réel /api/stream/ (live_stream.py)
+n'existe qu'ici. L'export /api/export/ y est aussi servi : sous ASGI,
+Django lit en entier un StreamingHttpResponse synchrone avant de
+l'envoyer, l'export complet tiendrait en mémoire.
+
+Mêmes URL, mêmes noms de route et mêmes réponses JSON que les vues
+synchrones (views.py), qui restent utilisées pour tout le reste (upload,
+DLQ...) et sous WSGI. Les clients sont liés à la boucle
+d'événements du processus : ce module n'est importé que sous ASGI.
+"""
+import logging
+
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import path
+from django.views import View
+from rest_framework.exceptions import ValidationError
+
+from . import clients, views
+from .async_service import AsyncElasticsearchService
+from .exporters import aiter_export
+from .live_stream import LiveStreamHub, StreamLimitReached, format_event
+from .schemas import DATA_TYPES
+from .stats_cache import AsyncStatsCache
+
+logger = logging.getLogger(__name__)
+
+# Connexion Redis asynchrone (créée dans la boucle du worker, voir clients.py)
+redis_client = clients.async_redis_client
+
+# Service Elasticsearch asynchrone, mêmes métriques et même cache de recherches que views.es_service
+es_service = AsyncElasticsearchService(metrics=views.metrics, query_cache=views.query_cache)
+
+# Même cache (mêmes clés, même invalidation) que views.stats_cache
+stats_cache = AsyncStatsCache(redis_client, prefix=settings.STATS_CACHE_PREFIX, ttl=settings.STATS_CACHE_TTL)
+
+# Un abonnement Redis par worker, relayé à tous ses clients SSE
+live_hub = LiveStreamHub(
+    redis_client,
+    channel=settings.LIVE_STREAM_CHANNEL,
+    buffer_size=settings.LIVE_STREAM_BUFFER,
+    policy=settings.LIVE_STREAM_POLICY,
+    max_subscribers=settings.LIVE_STREAM_MAX_CLIENTS
+)
+
+
+@views.metrics.process_collector
+def live_stream_metrics():
+    """Clients du flux temps réel et documents relayés par ce worker (live_stream.py)"""
+    counters = live_hub.counters()
+    yield 'iot_live_stream_subscribers', {}, counters['subscribers']
+    yield 'iot_live_stream_documents_total', {}, counters['documents']
+    for policy in ('drop', 'merge'):
+        yield 'iot_live_stream_overflow_total', {'policy': policy}, counters[policy]
+    yield 'iot_live_stream_rejected_total', {}, counters['rejected']
+
+
+async def paginated_search(page, **criteria):
+    """Comme views.paginated_search, sur le service asynchrone"""
+    if page.get('cursor') or page.get('pagination') == 'cursor':
+        return await es_service.search_page(size=page['size'], cursor=page.get('cursor') or None,
+                                            with_total=page.get('total', False), **criteria)
+    return await es_service.search(size=page['size'], from_offset=page['from_offset'], **criteria)
+
+
+async def cached_stats(endpoint, index, compute, params=None):
+    """Comme views.cached_stats ; compute est une coroutine"""
+    stats, hit = await stats_cache.get_or_compute(endpoint, index, compute, params)
+    response = JsonResponse(stats, safe=False)
+    response['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+
+class StatisticsView(View):
+    """Vue pour obtenir des statistiques globales"""
+    
+    async def get(self, request):
+        index = request.GET.get('index', es_service.default_index)
+        return await cached_stats('stats', index, lambda: es_service.get_statistics(index), {'index': index})
+
+
+class DashboardView(View):
+    """Statistiques des cinq types de données en une requête (un seul _msearch)"""
+    
+    async def get(self, request):
+        indices = ','.join(f'iot-{data_type}' for data_type in DATA_TYPES)
+        return await cached_stats('dashboard', indices, es_service.get_dashboard)
+
+
+class TypeStatsView(View):
+    """Statistiques d'un type de données (<type>_stats, mis en cache)"""
+    
+    data_type = None
+    
+    async def get(self, request):
+        return await cached_stats(
+            f'{self.data_type}_stats', f'iot-{self.data_type}',
+            lambda: es_service.get_type_statistics(self.data_type)
+        )
+
+
+class ConsommationStatsView(View):
+    """Statistiques de consommation sur une période (voir views.ConsommationStatsView)"""
+    
+    async def get(self, request):
+        try:
+            report = views.consumption_report(request.GET)
+        except ValidationError as e:
+            return JsonResponse(e.detail, status=400)
+        return await cached_stats(
+            'consommation_stats', 'iot-consommation',
+            lambda: es_service.get_consommation_statistics(report['date_from'], report['date_to'], report['filters']),
+            report
+        )
+
+
+class ConsommationHistogramView(View):
+    """Consommation par intervalle (voir views.ConsommationHistogramView)"""
+    
+    async def get(self, request):
+        try:
+            report = views.consumption_report(request.GET)
+        except ValidationError as e:
+            return JsonResponse(e.detail, status=400)
+        return await cached_stats(
+            'consommation_histogram', 'iot-consommation',
+            lambda: es_service.get_consommation_histogram(
+                report['interval'], report['date_from'], report['date_to'], report['filters']
+            ),
+            report
+        )
+
+
+class SensorStatisticsView(View):
+    """Statistiques sur les capteurs (SensorViewSet.statistics)"""
+    
+    async def get(self, request):
+        return JsonResponse(await es_service.get_sensor_statistics())
+
+
+class VehicleStatisticsView(View):
+    """Statistiques sur les véhicules (VehicleViewSet.statistics)"""
+    
+    async def get(self, request):
+        return JsonResponse(await es_service.get_vehicle_statistics())
+
+
+class TypedSearchView(View):
+    """Recherche dans l'index d'un type de données (voir views.TypedSearchView)"""
+    
+    data_type = None
+    filters = {}
+    
+    async def get(self, request):
+        params = request.GET
+        try:
+            page = views.page_params(params)
+        except ValidationError as e:
+            return JsonResponse(e.detail, status=400)
+        criteria = views.typed_search_criteria(params, self.data_type, self.filters)
+        return JsonResponse(await paginated_search(page, **criteria))
+
+
+class LiveStreamView(View):
+    """
+    Flux temps réel des documents indexés (Server-Sent Events)
+    
+    Paramètres : data_type, batiment, severite (valeurs séparées par des
+    virgules), buffer (documents en attente au plus) et policy (drop, merge).
+    Événements : ready, documents, dropped, summary, resync ; un commentaire toutes
+    les LIVE_STREAM_HEARTBEAT s sans nouveauté.
+    """
+    
+    async def get(self, request):
+        try:
+            params = views.live_stream_params(request.GET)
+        except ValidationError as e:
+            return JsonResponse(e.detail, status=400)
+        try:
+            subscription = live_hub.subscribe(params['filters'], params['buffer'], params['policy'])
+        except StreamLimitReached as e:
+            logger.warning(f"⚠️  Flux temps réel: {e}")
+            response = JsonResponse({'error': str(e)}, status=503)
+            response['Retry-After'] = '30'
+            return response
+        
+        response = StreamingHttpResponse(self.events(subscription), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Pas de mise en tampon par un proxy nginx devant l'API
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
+    async def events(self, subscription):
+        # Le client parti, Django annule le générateur : l'abonnement est libéré
+        try:
+            yield 'retry: 3000\n\n'
+            yield format_event('ready', {
+                'filters': {field: sorted(values) for field, values in subscription.filters.items()},
+                'buffer': subscription.buffer_size,
+                'policy': subscription.policy,
+            })
+            while True:
+                events = await subscription.next_events(settings.LIVE_STREAM_HEARTBEAT)
+                if not events:
+                    yield ': keep-alive\n\n'
+                for event, data in events:
+                    yield format_event(event, data)
+        finally:
+            live_hub.unsubscribe(subscription)
+
+
+async def prepend(first, documents):
+    """Flux asynchrone de documents précédé de first (déjà lu)"""
+    if first is not None:
+        yield first
+    async for document in documents:
+        yield document
+
+
+class ExportView(View):
+    """Export en flux des résultats d'une recherche (voir views.ExportView)"""
+    
+    async def get(self, request):
+        try:
+            params, criteria = views.export_request(request.GET)
+        except ValidationError as e:
+            return JsonResponse(e.detail, status=400)
+        documents = es_service.iter_documents(batch_size=params['batch_size'], **criteria)
+        
+        # Premier lot lu avant la réponse : une erreur Elasticsearch donne un statut 502
+        try:
+            first = await anext(documents, None)
+        except Exception as e:
+            logger.error(f"❌ Export impossible: {e}")
+            return JsonResponse({'error': str(e)}, status=502)
+        return views.export_response(prepend(first, documents), params, criteria, exporter=aiter_export)
+
+
+class HealthCheckView(View):
+    """Endpoints de santé : instantané en mémoire (views.health), sans passer par un thread"""
+    
+    async def get(self, request):
+        return JsonResponse(views.health_status())
+
+
+class LivenessView(View):
+    """Sonde liveness (voir views.LivenessView)"""
+    
+    async def get(self, request):
+        return views.LivenessView().get(request)
+
+
+class ReadinessView(View):
+    """Sonde readiness (voir views.ReadinessView)"""
+    
+    async def get(self, request):
+        return views.ReadinessView().get(request)
+
+
+def urlpatterns():
+    """Routes asynchrones, à placer avant les routes synchrones (config/urls.py)"""
+    patterns = [
+        path('api/stats/', StatisticsView.as_view(), name='statistics'),
+        path('api/dashboard/', DashboardView.as_view(), name='dashboard'),
+        path('api/health/', HealthCheckView.as_view(), name='health-check'),
+        path('api/health/live/', LivenessView.as_view(), name='health-live'),
+        path('api/health/ready/', ReadinessView.as_view(), name='health-ready'),
+        path('api/sensors/statistics/', SensorStatisticsView.as_view(), name='sensor-statistics'),
+        path('api/vehicles/statistics/', VehicleStatisticsView.as_view(), name='vehicle-statistics'),
+        path('api/consommation/stats/', ConsommationStatsView.as_view(), name='consommation-stats'),
+        path('api/consommation/histogram/', ConsommationHistogramView.as_view(), name='consommation-histogram'),
+        path('api/stream/', LiveStreamView.as_view(), name='live-stream'),
+        path('api/export/', ExportView.as_view(), name='export'),
+    ]
+    for sync_view in views.TypedSearchView.__subclasses__():
+        data_type = sync_view.data_type
+        patterns.append(
+            path(f'api/{data_type}/', TypedSearchView.as_view(data_type=data_type, filters=sync_view.filters),
+                 name=data_type)
+        )
+        # Consommation : ConsommationStatsView (période et filtres, rollups)
+        if data_type != 'consommation':
+            patterns.append(
+                path(f'api/{data_type}/stats/', TypeStatsView.as_view(data_type=data_type), name=f'{data_type}-stats')
+            )
+    return patterns
@@ -0,0 +1,202 @@
+"""
+Clients Redis et Elasticsearch partagés, créés à la demande dans chaque processus
+
+Les clients ne sont plus construits à l'import : redis_client,
+elasticsearch_client (et leurs variantes asynchrones pour les vues ASGI)
+sont des mandataires (LazyClient) qui créent le client et son pool de
+connexions au premier appel, puis le réutilisent. Un import ne coûte donc
+plus aucune connexion, et après un fork (gunicorn --preload,
+multiprocessing) le processus enfant repart d'un registre vide et ouvre
+ses propres connexions au lieu de partager les sockets du parent.
+
+Tailles de pool, délais de connexion/lecture, reprises et sniffing :
+settings.py (REDIS_* et ELASTICSEARCH_*). Un backend lent fait échouer
+l'appel après le délai configuré au lieu de bloquer le worker.
+"""
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import redis
+import redis.retry
+import redis.asyncio
+import redis.asyncio.retry
+from elasticsearch import AsyncElasticsearch, Elasticsearch
+from redis.backoff import ExponentialBackoff
+
+
+class ClientRegistry:
+    """Un client par nom et par processus, créé au premier accès"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients: Dict[str, Any] = {}
+        self._pid = os.getpid()
+    
+    def get(self, name: str, factory: Callable[[], Any]) -> Any:
+        if self._pid != os.getpid():
+            self.reset()
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = self._clients[name] = factory()
+        return client
+    
+    def reset(self) -> None:
+        """Oublier les clients (processus enfant : les sockets appartiennent au parent)"""
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._pid = os.getpid()
+    
+    def created(self) -> Dict[str, Any]:
+        """Clients déjà créés dans ce processus"""
+        return dict(self._clients)
+
+
+registry = ClientRegistry()
+os.register_at_fork(after_in_child=registry.reset)
+
+
+class LazyClient:
+    """Mandataire d'un client du registre, utilisable comme le client lui-même"""
+    
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self._name = name
+        self._factory = factory
+    
+    def __getattr__(self, attribute):
+        return getattr(registry.get(self._name, self._factory), attribute)
+    
+    def __repr__(self):
+        return f'<LazyClient {self._name}>'
+
+
+def redis_options(
+    host: str,
+    port: int,
+    password: Optional[str],
+    max_connections: int = 50,
+    connect_timeout: float = 2.0,
+    timeout: float = 5.0,
+    retry_on_timeout: bool = True,
+    health_check_interval: int = 30
+) -> Dict[str, Any]:
+    """Arguments de redis.Redis / redis.asyncio.Redis (pool borné, délais)"""
+    return {
+        'host': host,
+        'port': port,
+        'password': password,
+        'decode_responses': True,
+        'max_connections': max_connections,
+        'socket_connect_timeout': connect_timeout,
+        'socket_timeout': timeout,
+        'retry_on_timeout': retry_on_timeout,
+        'health_check_interval': health_check_interval,
+    }
+
+
+def _redis_settings() -> Dict[str, Any]:
+    from django.conf import settings
+    return redis_options(
+        settings.REDIS_HOST,
+        settings.REDIS_PORT,
+        settings.REDIS_PASSWORD,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        timeout=settings.REDIS_SOCKET_TIMEOUT,
+        retry_on_timeout=settings.REDIS_RETRY_ON_TIMEOUT,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+    )
+
+
+def _elasticsearch_settings() -> Dict[str, Any]:
+    from django.conf import settings
+    return {
+        'hosts': [settings.ELASTICSEARCH_URL],
+        'connections_per_node': settings.ELASTICSEARCH_CONNECTIONS_PER_NODE,
+        'request_timeout': settings.ELASTICSEARCH_REQUEST_TIMEOUT,
+        'max_retries': settings.ELASTICSEARCH_MAX_RETRIES,
+        'retry_on_timeout': settings.ELASTICSEARCH_RETRY_ON_TIMEOUT,
+        'sniff_on_start': settings.ELASTICSEARCH_SNIFF,
+        'sniff_on_node_failure': settings.ELASTICSEARCH_SNIFF,
+    }
+
+
+def create_redis() -> redis.Redis:
+    from django.conf import settings
+    return redis.Redis(
+        retry=redis.retry.Retry(ExponentialBackoff(), settings.REDIS_RETRIES),
+        **_redis_settings()
+    )
+
+
+def create_async_redis() -> redis.asyncio.Redis:
+    from django.conf import settings
+    return redis.asyncio.Redis(
+        retry=redis.asyncio.retry.Retry(ExponentialBackoff(), settings.REDIS_RETRIES),
+        **_redis_settings()
+    )
+
+
+def create_elasticsearch() -> Elasticsearch:
+    return Elasticsearch(**_elasticsearch_settings())
+
+
+def create_async_elasticsearch() -> AsyncElasticsearch:
+    return AsyncElasticsearch(**_elasticsearch_settings())
+
+
+redis_client = LazyClient('redis', create_redis)
+elasticsearch_client = LazyClient('elasticsearch', create_elasticsearch)
+
+# Liés à la boucle d'événements : à n'utiliser que depuis les vues asynchrones
+async_redis_client = LazyClient('async-redis', create_async_redis)
+async_elasticsearch_client = LazyClient('async-elasticsearch', create_async_elasticsearch)
+
+
+def _redis_pool_stats(client) -> Dict[str, Any]:
+    pool = client.connection_pool
+    in_use, idle = len(pool._in_use_connections), len(pool._available_connections)
+    return {
+        'max': pool.max_connections,
+        'created': getattr(pool, '_created_connections', in_use + idle),
+        'in_use': in_use,
+        'idle': idle,
+    }
+
+
+def _elasticsearch_pool_stats(client) -> Dict[str, Any]:
+    # Nœuds urllib3 : file de connexions pré-remplie (None = emplacement libre jamais connecté)
+    stats = {'max': 0, 'created': 0, 'in_use': 0, 'idle': 0}
+    for node in client.transport.node_pool.all():
+        pool = getattr(node, 'pool', None)
+        queue = getattr(pool, 'pool', None)
+        if queue is None:
+            continue
+        free = list(queue.queue)
+        stats['max'] += queue.maxsize
+        stats['created'] += pool.num_connections
+        stats['in_use'] += queue.maxsize - len(free)
+        stats['idle'] += sum(1 for connection in free if connection is not None)
+    return stats
+
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Utilisation des pools des clients créés dans ce processus
+    
+    {nom: {'max', 'created', 'in_use', 'idle'}} ; un client pas encore
+    utilisé n'apparaît pas (aucune connexion ouverte).
+    """
+    stats = {}
+    for name, client in registry.created().items():
+        try:
+            if isinstance(client, (redis.Redis, redis.asyncio.Redis)):
+                stats[name] = _redis_pool_stats(client)
+            elif isinstance(client, Elasticsearch):
+                stats[name] = _elasticsearch_pool_stats(client)
+        except AttributeError:
+            continue
+    return stats
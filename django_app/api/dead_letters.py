@@ -0,0 +1,157 @@
+"""
+File des messages rejetés par Elasticsearch (dead-letter queue)
+
+Un document refusé définitivement (conflit de mapping, document invalide...)
+ou un message illisible n'est pas perdu : il est déposé dans la liste Redis
+iot:dlq avec la raison du rejet. Une fois la cause corrigée (mapping,
+données), les messages peuvent être rejoués vers la file d'ingestion.
+
+Chaque entrée est un objet JSON :
+    {"message": <message d'origine>, "reason": "...", "status": 400,
+     "index": "iot-capteurs", "source": "iot:data", "failed_at": "..."}
+
+Ce module n'importe pas Django.
+"""
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .redis_queue import STREAM_MESSAGE_FIELD, TRANSPORT_LIST, TRANSPORT_STREAM, DEFAULT_QUEUE_KEY, mark_redelivery
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DLQ_KEY = "iot:dlq"
+
+
+def build_dead_letter(
+    message: Any,
+    reason: str,
+    status: Optional[int] = None,
+    index: Optional[str] = None,
+    source: Optional[str] = None
+) -> Dict[str, Any]:
+    """Entrée de la DLQ pour un message (dict décodé ou texte brut illisible)"""
+    return {
+        'message': message,
+        'reason': reason,
+        'status': status,
+        'index': index,
+        'source': source,
+        'failed_at': datetime.now().isoformat(),
+    }
+
+
+def bulk_error_reason(item: Dict[str, Any]) -> str:
+    """Raison lisible d'un élément en erreur d'une réponse bulk"""
+    error = item.get('error')
+    if isinstance(error, dict):
+        reason = f"{error.get('type')}: {error.get('reason')}"
+        caused_by = error.get('caused_by')
+        if isinstance(caused_by, dict):
+            reason += f" ({caused_by.get('type')}: {caused_by.get('reason')})"
+        return reason
+    if error:
+        return str(error)
+    return f"HTTP {item.get('status')}"
+
+
+class DeadLetterQueue:
+    """Liste Redis des messages rejetés (les plus récents en tête)"""
+    
+    def __init__(self, client, key: str = DEFAULT_DLQ_KEY):
+        self.client = client
+        self.key = key
+    
+    def push(self, letters: List[Dict[str, Any]]) -> int:
+        """Déposer des entrées ; retourne la longueur de la DLQ"""
+        if not letters:
+            return self.length()
+        return self.client.lpush(self.key, *[json.dumps(letter, default=str) for letter in letters])
+    
+    def length(self) -> int:
+        return self.client.llen(self.key)
+    
+    def list(self, offset: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        """Entrées de la DLQ, des plus récentes aux plus anciennes"""
+        raw_letters = self.client.lrange(self.key, offset, offset + limit - 1)
+        letters = []
+        for raw in raw_letters:
+            try:
+                letters.append(json.loads(raw))
+            except ValueError:
+                letters.append({'message': raw, 'reason': 'Entrée DLQ illisible'})
+        return letters
+    
+    def replay(
+        self,
+        target_key: str = DEFAULT_QUEUE_KEY,
+        count: Optional[int] = None,
+        transport: str = TRANSPORT_LIST,
+        maxlen: Optional[int] = None,
+        chunk_size: int = 500
+    ) -> int:
+        """
+        Renvoyer les messages vers la file d'ingestion (les plus anciens d'abord)
+        
+        Chaque paquet est déplacé dans une transaction MULTI/EXEC : ajout dans
+        la file cible et retrait de la DLQ réussissent ou échouent ensemble.
+        
+        Args:
+            target_key: Liste (ou stream) d'ingestion
+            count: Nombre maximal de messages rejoués (tous par défaut)
+            transport: 'list' (LPUSH) ou 'stream' (XADD)
+            maxlen: Taille maximale approximative du stream
+        
+        Returns:
+            Nombre de messages rejoués
+        """
+        # Borné à la longueur initiale : un message rejeté à nouveau pendant
+        # le rejeu n'est pas rejoué une seconde fois
+        limit = self.length() if count is None else count
+        consumed = 0
+        replayed = 0
+        while consumed < limit:
+            size = min(chunk_size, limit - consumed)
+            # Les plus anciennes entrées sont en fin de liste
+            raw_letters = self.client.lrange(self.key, -size, -1)
+            if not raw_letters:
+                break
+            
+            messages = []
+            for raw in reversed(raw_letters):
+                try:
+                    message = json.loads(raw).get('message')
+                except (ValueError, AttributeError):
+                    message = None
+                if message is None:
+                    logger.error(f"Entrée DLQ illisible abandonnée: {raw[:200]}")
+                    continue
+                # Un message rejoué a pu être indexé avant son rejet
+                messages.append(mark_redelivery(message))
+            
+            pipe = self.client.pipeline(transaction=True)
+            if transport == TRANSPORT_STREAM:
+                for message in messages:
+                    pipe.xadd(target_key, {STREAM_MESSAGE_FIELD: message}, maxlen=maxlen, approximate=True)
+            elif messages:
+                pipe.lpush(target_key, *messages)
+            pipe.ltrim(self.key, 0, -len(raw_letters) - 1)
+            pipe.execute()
+            
+            consumed += len(raw_letters)
+            replayed += len(messages)
+            if len(raw_letters) < size:
+                break
+        
+        if replayed:
+            logger.info(f"{replayed} messages rejoués de {self.key} vers {target_key}")
+        return replayed
+    
+    def purge(self) -> int:
+        """Vider la DLQ ; retourne le nombre d'entrées supprimées"""
+        pipe = self.client.pipeline(transaction=True)
+        pipe.llen(self.key)
+        pipe.delete(self.key)
+        count, _ = pipe.execute()
+        return count
@@ -0,0 +1,51 @@
+"""
+Identifiants déterministes des documents IoT
+
+Un même enregistrement reçoit toujours le même _id, quel que soit le chemin
+d'ingestion (indexeur Python, Logstash, scripts ingest_all). Une nouvelle
+tentative, un rejeu de la DLQ ou un nouvel upload du même fichier remplace
+donc le document existant au lieu de créer un doublon.
+
+L'_id est construit depuis une clé métier propre au type de données, ou à
+défaut depuis un hash du contenu de l'enregistrement. Il est calculé sur
+l'enregistrement tel qu'il a été lu (avant conversion des champs
+numériques) pour ne pas dépendre des conversions de chaque chemin.
+
+Ce module n'importe que la bibliothèque standard. Le filtre ruby de
+logstash/pipeline/redis-to-elasticsearch.conf applique le même calcul.
+"""
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+# Champs formant la clé métier de chaque type
+ID_FIELDS = {
+    'alertes': ('id_alerte',),
+    'maintenance': ('intervention_id',),
+    'capteurs': ('capteur_id', 'timestamp'),
+    'occupation': ('salle_id', 'timestamp'),
+    'consommation': ('equipement_id', 'timestamp'),
+}
+
+KEY_SEPARATOR = '|'
+
+
+def content_hash(record: Dict[str, Any]) -> str:
+    """SHA-1 du JSON canonique de l'enregistrement (clés triées, sans espaces)"""
+    payload = json.dumps(record, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def document_id(record: Dict[str, Any], data_type: Optional[str]) -> str:
+    """
+    _id d'un enregistrement
+    
+    Exemples: alerte -> 'ALT-20240115-001',
+    capteur -> 'CAP_TEMP_001|2024-01-15 08:30:00', sinon hash du contenu
+    """
+    fields = ID_FIELDS.get(data_type)
+    if fields:
+        values = [record.get(field) for field in fields]
+        if all(value not in (None, '') for value in values):
+            return KEY_SEPARATOR.join(str(value) for value in values)
+    return content_hash(record)
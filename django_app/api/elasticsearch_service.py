@@ -1,19 +1,64 @@
 """
 Service layer pour interagir avec Elasticsearch
 """
+import base64
+import json
 import logging
-from typing import Dict, List, Any, Optional
-from elasticsearch import Elasticsearch
+from datetime import datetime
+from typing import Dict, Iterator, List, Any, Optional
 from django.conf import settings
 
+from .clients import elasticsearch_client
+from .metrics import InstrumentedElasticsearch, Metrics, debug_sampled
+from .query_cache import QueryCache
+from .rollups import Plan, RollupPlanner, response_error
+from .schemas import DATA_TYPES, keyword_field, search_fields
+
 logger = logging.getLogger(__name__)
 
 
+def encode_cursor(state: Dict[str, Any]) -> str:
+    """Curseur opaque (JSON en base64 URL-safe) de search_page"""
+    payload = json.dumps(state, separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (ValueError, TypeError):
+        raise ValueError("Curseur de pagination invalide")
+
+
+# Agrégations des statistiques des ViewSets capteurs et véhicules
+SENSOR_AGGREGATIONS = {
+    'by_device': ('device_id', 'terms', 100),
+    'by_location': ('location', 'terms', 20),
+    'by_status': ('status', 'terms', 10),
+    'temperature_stats': ('temperature', 'stats', None),
+    'humidity_stats': ('humidity', 'stats', None),
+}
+
+VEHICLE_AGGREGATIONS = {
+    'by_vehicle': ('vehicle_id', 'terms', 100),
+    'by_driver': ('driver', 'terms', 50),
+    'by_status': ('status', 'terms', 10),
+    'speed_stats': ('speed', 'stats', None),
+    'fuel_level_stats': ('fuel_level', 'stats', None),
+}
+
+
 class ElasticsearchService:
     """Service pour gérer les opérations Elasticsearch"""
     
-    def __init__(self):
-        self.es = Elasticsearch([settings.ELASTICSEARCH_URL])
+    def __init__(self, metrics: Optional[Metrics] = None, query_cache: Optional[QueryCache] = None):
+        self.es = elasticsearch_client
+        if metrics is not None:
+            self.es = InstrumentedElasticsearch(self.es, metrics)
+        self.query_cache = query_cache
+        # Point de contrôle des rollups de consommation, lu à chaque requête
+        self.rollups = RollupPlanner()
         # Remove any cached default_index instance attribute
         if 'default_index' in self.__dict__:
             del self.__dict__['default_index']
@@ -24,9 +69,7 @@ class ElasticsearchService:
     @property
     def default_index(self):
         """Get default index dynamically from settings"""
-        index = settings.ELASTICSEARCH_INDEX['IOT_DATA']
-        logger.info(f"[DEBUG] default_index property called, returning: {index}")
-        return index
+        return settings.ELASTICSEARCH_INDEX['IOT_DATA']
     
     def check_connection(self) -> bool:
         """Vérifier la connexion à Elasticsearch"""
@@ -63,7 +106,9 @@ class ElasticsearchService:
         from_offset: int = 0,
         filters: Optional[Dict] = None,
         sort_by: str = '@timestamp',
-        sort_order: str = 'desc'
+        sort_order: str = 'desc',
+        source: Optional[Dict] = None,
+        fuzzy: bool = False
     ) -> Dict[str, Any]:
         """
         Rechercher des documents avec filtres et tri
@@ -76,106 +121,298 @@ class ElasticsearchService:
             filters: Filtres additionnels (dict)
             sort_by: Champ de tri
             sort_order: Ordre (asc/desc)
+            source: Filtre _source (voir schemas.source_filter), None = document complet
+            fuzzy: Tolérer les fautes de frappe dans query (plus coûteux)
         
         Returns:
             Dict contenant les résultats et métadonnées
         """
         try:
             # Use default index if not specified, handle empty string as None
-            if not index:
-                logger.info(f"[DEBUG search] index is empty/None: {repr(index)}")
-                logger.info(f"[DEBUG search] About to access self.default_index")
-                logger.info(f"[DEBUG search] self.__dict__ = {self.__dict__}")
-                logger.info(f"[DEBUG search] type(self).__dict__.keys() = {list(type(self).__dict__.keys())}")
-                index = self.default_index
-                logger.info(f"[DEBUG search] After accessing property, index = {index}")
-            
-            # Construction de la requête
-            body = {
-                "query": self._build_query(query, filters),
-                "size": size,
-                "from": from_offset
-            }
-            
-            # Si recherche textuelle, trier par score de pertinence
-            # Sinon trier par timestamp
-            if query and query.strip():
-                body["sort"] = [
-                    {"_score": {"order": "desc"}},
-                    {sort_by: {"order": sort_order}}
-                ]
-            else:
-                body["sort"] = [{sort_by: {"order": sort_order}}]
-            
-            logger.info(f"Recherche Elasticsearch: index={index}, query={query}, filters={filters}")
-            
-            result = self.es.search(index=index, body=body)
+            index = index or self.default_index
+            body = self._search_body(query, index, size, from_offset, filters, sort_by, sort_order, source, fuzzy)
             
-            # Extraire les résultats
-            hits = result['hits']['hits']
-            total = result['hits']['total']['value']
+            if debug_sampled():
+                logger.info(f"Recherche Elasticsearch: index={index}, query={query}, filters={filters}")
             
-            documents = [
-                {
-                    '_id': hit['_id'],
-                    '_score': hit.get('_score'),
-                    **hit['_source']
-                }
-                for hit in hits
-            ]
+            result = self._cached_search(index, body)
+            return self._search_response(result, from_offset, size)
             
+        except Exception as e:
+            logger.error(f"Erreur recherche Elasticsearch: {e}")
             return {
-                'total': total,
-                'count': len(documents),
-                'documents': documents,
-                'from': from_offset,
-                'size': size
+                'total': 0,
+                'count': 0,
+                'documents': [],
+                'error': str(e)
             }
+    
+    def _cached_search(self, index: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        """es.search, partagé entre requêtes identiques si un query_cache est configuré"""
+        if self.query_cache is None:
+            return self.es.search(index=index, body=body)
+        return self.query_cache.get_or_call(
+            self.query_cache.key(index, body),
+            lambda: self.es.search(index=index, body=body)
+        )
+    
+    def _search_body(
+        self,
+        query: Optional[str],
+        index: str,
+        size: int,
+        from_offset: int,
+        filters: Optional[Dict],
+        sort_by: str,
+        sort_order: str,
+        source: Optional[Dict],
+        fuzzy: bool = False
+    ) -> Dict[str, Any]:
+        body = {
+            "query": self._build_query(query, filters, index, fuzzy),
+            "size": size,
+            "from": from_offset,
+            "sort": self._sort_clause(query, sort_by, sort_order)
+        }
+        if source is not None:
+            body["_source"] = source
+        return body
+    
+    def _search_response(self, result: Dict[str, Any], from_offset: int, size: int) -> Dict[str, Any]:
+        documents = self._documents(result['hits']['hits'])
+        return {
+            'total': result['hits']['total']['value'],
+            'count': len(documents),
+            'documents': documents,
+            'from': from_offset,
+            'size': size
+        }
+    
+    def search_page(
+        self,
+        query: Optional[str] = None,
+        index: str = None,
+        size: int = 50,
+        filters: Optional[Dict] = None,
+        sort_by: str = '@timestamp',
+        sort_order: str = 'desc',
+        source: Optional[Dict] = None,
+        cursor: Optional[str] = None,
+        fuzzy: bool = False,
+        with_total: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Pagination par curseur : point-in-time + search_after
+        
+        La première page ouvre un point-in-time (vue figée des index) ;
+        chaque page renvoie next_cursor, à repasser tel quel pour la page
+        suivante. Le curseur porte la requête, les filtres, le tri, le total
+        et la position : une page profonde coûte autant que la première, sans
+        limite index.max_result_window. Le point-in-time est fermé à la
+        dernière page (next_cursor à None) ou expire après
+        SEARCH_PIT_KEEP_ALIVE sans lecture.
+        
+        Args:
+            source: Filtre _source (voir schemas.source_filter)
+            cursor: next_cursor de la page précédente (les autres critères
+                sont alors repris du curseur, seul size peut changer)
+            with_total: Compter le total à la première page ; sinon total
+                vaut None et la recherche triée s'arrête au plus tôt
+                (track_total_hits: false, index.sort)
+        
+        Returns:
+            Dict contenant les résultats et next_cursor
+        """
+        try:
+            if cursor:
+                state = decode_cursor(cursor)
+            else:
+                index = index or self.default_index
+                pit = self.es.open_point_in_time(index=index, keep_alive=settings.SEARCH_PIT_KEEP_ALIVE)
+                state = self._page_state(query, index, filters, sort_by, sort_order, source, pit['id'], fuzzy)
             
+            # Total compté à la première page seulement, et sur demande
+            result = self.es.search(body=self._pit_body(state, size, track_total_hits=with_total and not cursor))
+            page, pit_id = self._page_response(state, result, size)
+            if page['next_cursor'] is None:
+                self._close_point_in_time(pit_id)
+            return page
+        
         except Exception as e:
-            logger.error(f"Erreur recherche Elasticsearch: {e}")
+            logger.error(f"Erreur recherche paginée Elasticsearch: {e}")
             return {
                 'total': 0,
                 'count': 0,
                 'documents': [],
+                'next_cursor': None,
                 'error': str(e)
             }
     
-    def _build_query(self, query: Optional[str], filters: Optional[Dict]) -> Dict:
+    def _page_state(
+        self,
+        query: Optional[str],
+        index: str,
+        filters: Optional[Dict],
+        sort_by: str,
+        sort_order: str,
+        source: Optional[Dict],
+        pit_id: str,
+        fuzzy: bool = False
+    ) -> Dict[str, Any]:
+        """État initial d'un parcours point-in-time (contenu du curseur)"""
+        return {
+            'index': index,
+            'query': query,
+            'filters': {field: value for field, value in (filters or {}).items() if value},
+            'sort_by': sort_by,
+            'sort_order': sort_order,
+            'source': source,
+            'fuzzy': fuzzy,
+            'pit': pit_id,
+            'after': None,
+            'total': None,
+        }
+    
+    def _page_response(self, state: Dict[str, Any], result: Dict[str, Any], size: int) -> tuple:
+        """
+        Page de search_page et point-in-time courant
+        
+        next_cursor vaut None à la dernière page : le point-in-time renvoyé
+        est alors à fermer.
+        """
+        hits = result['hits']['hits']
+        total = state['total']
+        if total is None and 'total' in result['hits']:
+            total = result['hits']['total']['value']
+        pit_id = result.get('pit_id', state['pit'])
+        
+        next_cursor = None
+        if len(hits) == size:
+            next_cursor = encode_cursor({**state, 'pit': pit_id, 'after': hits[-1]['sort'], 'total': total})
+        
+        documents = self._documents(hits)
+        return {
+            'total': total,
+            'count': len(documents),
+            'documents': documents,
+            'size': size,
+            'next_cursor': next_cursor
+        }, pit_id
+    
+    def iter_documents(
+        self,
+        query: Optional[str] = None,
+        index: str = None,
+        filters: Optional[Dict] = None,
+        sort_by: str = '@timestamp',
+        sort_order: str = 'desc',
+        source: Optional[Dict] = None,
+        batch_size: int = 1000,
+        fuzzy: bool = False
+    ) -> Iterator[Dict]:
+        """
+        Parcourir tous les documents d'une recherche (export)
+        
+        Générateur : un lot de batch_size documents à la fois via
+        point-in-time + search_after, la mémoire ne dépend pas du nombre
+        de documents. Le point-in-time est fermé à la fin du parcours ou
+        si le générateur est abandonné (client déconnecté). Les erreurs
+        Elasticsearch sont levées, pas renvoyées dans un dict.
+        """
+        index = index or self.default_index
+        pit = self.es.open_point_in_time(index=index, keep_alive=settings.SEARCH_PIT_KEEP_ALIVE)
+        state = self._page_state(query, index, filters, sort_by, sort_order, source, pit['id'], fuzzy)
+        try:
+            while True:
+                result = self.es.search(body=self._pit_body(state, batch_size, track_total_hits=False))
+                hits = result['hits']['hits']
+                state['pit'] = result.get('pit_id', state['pit'])
+                yield from self._documents(hits)
+                if len(hits) < batch_size:
+                    return
+                state['after'] = hits[-1]['sort']
+        finally:
+            self._close_point_in_time(state['pit'])
+    
+    def _pit_body(self, state: Dict[str, Any], size: int, track_total_hits: bool) -> Dict[str, Any]:
+        """Requête point-in-time + search_after depuis l'état d'un curseur"""
+        # _shard_doc départage les documents de même @timestamp
+        body = {
+            "query": self._build_query(state['query'], state['filters'], state['index'], state.get('fuzzy', False)),
+            "size": size,
+            "sort": self._sort_clause(state['query'], state['sort_by'], state['sort_order'])
+                    + [{"_shard_doc": "asc"}],
+            "pit": {"id": state['pit'], "keep_alive": settings.SEARCH_PIT_KEEP_ALIVE},
+            "track_total_hits": track_total_hits,
+        }
+        if state.get('source') is not None:
+            body["_source"] = state['source']
+        if state['after']:
+            body["search_after"] = state['after']
+        return body
+    
+    def _close_point_in_time(self, pit_id: str):
+        try:
+            self.es.close_point_in_time(id=pit_id)
+        except Exception as e:
+            logger.warning(f"Fermeture du point-in-time impossible: {e}")
+    
+    def _sort_clause(self, query: Optional[str], sort_by: str, sort_order: str) -> List[Dict]:
+        """Tri par pertinence si recherche textuelle, puis par sort_by (timestamp par défaut)"""
+        if query and query.strip():
+            return [
+                {"_score": {"order": "desc"}},
+                {sort_by: {"order": sort_order}}
+            ]
+        return [{sort_by: {"order": sort_order}}]
+    
+    def _documents(self, hits: List[Dict]) -> List[Dict]:
+        return [
+            {
+                '_id': hit['_id'],
+                '_score': hit.get('_score'),
+                **hit['_source']
+            }
+            for hit in hits
+        ]
+    
+    def _build_query(
+        self,
+        query: Optional[str],
+        filters: Optional[Dict],
+        index: Optional[str] = None,
+        fuzzy: bool = False
+    ) -> Dict:
         """Construire la requête Elasticsearch"""
         
         # Requête de base
         must_clauses = []
         filter_clauses = []
         
-        # Recherche textuelle
+        # Recherche textuelle : champs boostés du profil de l'index et champ
+        # catch-all search_all (schemas.search_fields) ; '*' hors index iot-*
         if query:
-            # Cibler les champs textuels importants avec des boosts
-            must_clauses.append({
-                "multi_match": {
-                    "query": query,
-                    "fields": [
-                        "batiment^3",
-                        "description^2",
-                        "type_alerte^2",
-                        "categorie^2",
-                        "salle^1.5",
-                        "zone^1.5",
-                        "statut",
-                        "severite^2",
-                        "*"
-                    ],
-                    "type": "best_fields",
-                    "fuzziness": "AUTO",
-                    "minimum_should_match": "75%"
-                }
-            })
+            multi_match = {
+                "query": query,
+                "fields": search_fields(index) or ["*"],
+                "type": "best_fields",
+                "minimum_should_match": "75%"
+            }
+            if fuzzy:
+                multi_match["fuzziness"] = "AUTO"
+            must_clauses.append({"multi_match": multi_match})
         
         # Appliquer les filtres
         if filters:
             for field, value in filters.items():
                 if value is not None and value != '':
-                    if field.endswith('_from'):
+                    if field.endswith('_exists'):
+                        # Présence du champ (ex: device_id_exists=True)
+                        if value:
+                            filter_clauses.append({
+                                "exists": {"field": field[:-len('_exists')]}
+                            })
+                    elif field.endswith('_from'):
                         # Date range from
                         actual_field = field.replace('_from', '')
                         filter_clauses.append({
@@ -195,7 +432,7 @@ class ElasticsearchService:
                         # Match exact
                         filter_clauses.append({
                             "term": {
-                                f"{field}.keyword": value
+                                keyword_field(field, index): value
                             }
                         })
         
@@ -214,10 +451,15 @@ class ElasticsearchService:
         """Récupérer un document par son ID"""
         try:
             index = index or self.default_index
-            result = self.es.get(index=index, id=doc_id)
+            # GET /_doc refuse un alias à plusieurs index (iot-<type> après
+            # rollover) ou un motif : recherche par _id
+            result = self.es.search(index=index, query={"ids": {"values": [doc_id]}}, size=1)
+            hits = result['hits']['hits']
+            if not hits:
+                return None
             return {
-                '_id': result['_id'],
-                **result['_source']
+                '_id': hits[0]['_id'],
+                **hits[0]['_source']
             }
         except Exception as e:
             logger.error(f"Erreur récupération document {doc_id}: {e}")
@@ -246,39 +488,7 @@ class ElasticsearchService:
         """
         try:
             index = index or self.default_index
-            
-            # Construire l'agrégation
-            if agg_type == 'terms':
-                agg_body = {
-                    "terms": {
-                        "field": f"{field}.keyword" if not field.endswith('.keyword') else field,
-                        "size": size
-                    }
-                }
-            elif agg_type == 'stats':
-                agg_body = {
-                    "stats": {
-                        "field": field
-                    }
-                }
-            elif agg_type == 'date_histogram':
-                interval = kwargs.get('interval', '1d')
-                agg_body = {
-                    "date_histogram": {
-                        "field": field,
-                        "calendar_interval": interval
-                    }
-                }
-            elif agg_type == 'range':
-                ranges = kwargs.get('ranges', [])
-                agg_body = {
-                    "range": {
-                        "field": field,
-                        "ranges": ranges
-                    }
-                }
-            else:
-                raise ValueError(f"Type d'agrégation non supporté: {agg_type}")
+            agg_body = self._aggregation_body(field, agg_type, index, size, **kwargs)
             
             body = {
                 "size": 0,
@@ -287,7 +497,7 @@ class ElasticsearchService:
                 }
             }
             
-            result = self.es.search(index=index, body=body)
+            result = self._cached_search(index, body)
             
             return {
                 'aggregation_type': agg_type,
@@ -301,212 +511,414 @@ class ElasticsearchService:
                 'error': str(e)
             }
     
-    def get_statistics(self, index: str = None) -> Dict[str, Any]:
-        """Obtenir des statistiques globales"""
+    def aggregate_many(
+        self,
+        aggregations: Dict[str, tuple],
+        index: str = None,
+        filters: Optional[Dict] = None
+    ) -> Dict[str, Any]:
+        """
+        Plusieurs agrégations en une seule requête
+        
+        Args:
+            aggregations: {nom: (champ, type d'agrégation, size)}
+            index: Nom de l'index
+            filters: Filtres communs, comme pour search (ex: device_id_exists)
+        
+        Returns:
+            {nom: résultat au format d'aggregate}
+        """
         try:
             index = index or self.default_index
+            result = self._cached_search(index, self._aggregations_body(aggregations, index, filters))
+            return self._aggregations_response(aggregations, result)
             
-            # Compter les documents
-            total_docs = self.count_documents(index)
-            
-            # Agrégations multiples
-            body = {
-                "size": 0,
-                "aggs": {
-                    "by_file_type": {
-                        "terms": {"field": "file_type.keyword", "size": 10}
-                    },
-                    "by_source_file": {
-                        "terms": {"field": "source_file.keyword", "size": 20}
-                    },
-                    "by_status": {
-                        "terms": {"field": "status.keyword", "size": 10}
-                    },
-                    "upload_timeline": {
-                        "date_histogram": {
-                            "field": "@timestamp",
-                            "calendar_interval": "1d"
-                        }
-                    }
+        except Exception as e:
+            logger.error(f"Erreur agrégations: {e}")
+            return {
+                'error': str(e)
+            }
+    
+    def _aggregations_body(self, aggregations: Dict[str, tuple], index: str, filters: Optional[Dict]) -> Dict[str, Any]:
+        return {
+            "size": 0,
+            "query": self._build_query(None, filters, index),
+            "aggs": {
+                name: self._aggregation_body(field, agg_type, index, size)
+                for name, (field, agg_type, size) in aggregations.items()
+            }
+        }
+    
+    def _aggregations_response(self, aggregations: Dict[str, tuple], result: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            name: {
+                'aggregation_type': agg_type,
+                'field': field,
+                'result': result['aggregations'][name]
+            }
+            for name, (field, agg_type, size) in aggregations.items()
+        }
+    
+    def _aggregation_body(self, field: str, agg_type: str, index: str, size: int = 10, **kwargs) -> Dict[str, Any]:
+        """Définition d'une agrégation (terms, stats, date_histogram, range)"""
+        if agg_type == 'terms':
+            return {
+                "terms": {
+                    "field": keyword_field(field, index),
+                    "size": size
                 }
             }
-            
-            result = self.es.search(index=index, body=body)
-            aggs = result['aggregations']
-            
+        elif agg_type == 'stats':
             return {
-                'total_documents': total_docs,
-                'by_file_type': [
-                    {'key': b['key'], 'count': b['doc_count']}
-                    for b in aggs['by_file_type']['buckets']
-                ],
-                'by_source_file': [
-                    {'key': b['key'], 'count': b['doc_count']}
-                    for b in aggs['by_source_file']['buckets']
-                ],
-                'by_status': [
-                    {'key': b['key'], 'count': b['doc_count']}
-                    for b in aggs.get('by_status', {}).get('buckets', [])
-                ],
-                'upload_timeline': [
-                    {
-                        'date': b['key_as_string'],
-                        'count': b['doc_count']
-                    }
-                    for b in aggs['upload_timeline']['buckets']
-                ]
+                "stats": {
+                    "field": field
+                }
             }
+        elif agg_type == 'date_histogram':
+            interval = kwargs.get('interval', '1d')
+            return {
+                "date_histogram": {
+                    "field": field,
+                    "calendar_interval": interval
+                }
+            }
+        elif agg_type == 'range':
+            ranges = kwargs.get('ranges', [])
+            return {
+                "range": {
+                    "field": field,
+                    "ranges": ranges
+                }
+            }
+        else:
+            raise ValueError(f"Type d'agrégation non supporté: {agg_type}")
+    
+    def get_sensor_statistics(self) -> Dict[str, Any]:
+        """Statistiques des documents capteurs (avec device_id), en une requête"""
+        return self.aggregate_many(SENSOR_AGGREGATIONS, filters={'device_id_exists': True})
+    
+    def get_vehicle_statistics(self) -> Dict[str, Any]:
+        """Statistiques des documents véhicules (avec vehicle_id), en une requête"""
+        return self.aggregate_many(VEHICLE_AGGREGATIONS, filters={'vehicle_id_exists': True})
+    
+    def get_statistics(self, index: str = None) -> Dict[str, Any]:
+        """Obtenir des statistiques globales"""
+        try:
+            index = index or self.default_index
+            result = self.es.search(index=index, body=self._statistics_body(index))
+            return self._statistics_response(result)
             
         except Exception as e:
             logger.error(f"Erreur statistiques: {e}")
             return {'error': str(e)}
     
-    def get_alertes_statistics(self) -> Dict[str, Any]:
-        """Statistiques pour les alertes"""
-        try:
-            body = {
-                "size": 0,
-                "aggs": {
-                    "by_severite": {"terms": {"field": "severite.keyword"}},
-                    "by_statut": {"terms": {"field": "statut.keyword"}},
-                    "by_categorie": {"terms": {"field": "categorie.keyword"}},
-                    "by_batiment": {"terms": {"field": "batiment.keyword"}},
-                    "count_non_resolue": {
-                        "filter": {"term": {"statut.keyword": "non_resolue"}}
+    def _statistics_body(self, index: str) -> Dict[str, Any]:
+        # Agrégations multiples ; le total vient de hits.total (même requête)
+        return {
+            "size": 0,
+            "track_total_hits": True,
+            "aggs": {
+                "by_file_type": {
+                    "terms": {"field": keyword_field("file_type", index), "size": 10}
+                },
+                "by_source_file": {
+                    "terms": {"field": keyword_field("source_file", index), "size": 20}
+                },
+                "by_status": {
+                    "terms": {"field": keyword_field("status", index), "size": 10}
+                },
+                "upload_timeline": {
+                    "date_histogram": {
+                        "field": "@timestamp",
+                        "calendar_interval": "1d"
                     }
                 }
             }
-            result = self.es.search(index="iot-alertes", body=body)
-            aggs = result['aggregations']
-            
-            return {
-                'total': self.count_documents("iot-alertes"),
-                'by_severite': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_severite']['buckets']],
-                'by_statut': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_statut']['buckets']],
-                'by_categorie': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_categorie']['buckets']],
-                'by_batiment': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_batiment']['buckets']],
-                'non_resolues': aggs['count_non_resolue']['doc_count']
-            }
+        }
+    
+    def _statistics_response(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        aggs = result['aggregations']
+        
+        return {
+            'total_documents': result['hits']['total']['value'],
+            'by_file_type': [
+                {'key': b['key'], 'count': b['doc_count']}
+                for b in aggs['by_file_type']['buckets']
+            ],
+            'by_source_file': [
+                {'key': b['key'], 'count': b['doc_count']}
+                for b in aggs['by_source_file']['buckets']
+            ],
+            'by_status': [
+                {'key': b['key'], 'count': b['doc_count']}
+                for b in aggs.get('by_status', {}).get('buckets', [])
+            ],
+            'upload_timeline': [
+                {
+                    'date': b['key_as_string'],
+                    'count': b['doc_count']
+                }
+                for b in aggs['upload_timeline']['buckets']
+            ]
+        }
+    
+    # === Statistiques par type de données ===
+    # Pour chaque type : corps de la requête (_<type>_stats_body) et mise en
+    # forme de la réponse (_<type>_stats_response). get_<type>_statistics les
+    # enchaîne sur une recherche, get_dashboard sur un seul _msearch.
+    
+    def _stats_sections(self) -> Dict[str, tuple]:
+        return {
+            'alertes': (self._alertes_stats_body, self._alertes_stats_response),
+            'capteurs': (self._capteurs_stats_body, self._capteurs_stats_response),
+            'occupation': (self._occupation_stats_body, self._occupation_stats_response),
+            'maintenance': (self._maintenance_stats_body, self._maintenance_stats_response),
+        }
+    
+    def _stats_plans(self) -> Dict[str, Plan]:
+        """
+        Recherches _msearch et mise en forme des statistiques de chaque type
+        
+        Une recherche par type, sauf la consommation, lue dans les rollups
+        pour la partie déjà agrégée (voir rollups.py).
+        """
+        sections = self._stats_sections()
+        plans = {}
+        for data_type in DATA_TYPES:
+            if data_type == 'consommation':
+                plans[data_type] = self.rollups.statistics_plan()
+                continue
+            body, format_response = sections[data_type]
+            plans[data_type] = (
+                [{"index": f"iot-{data_type}"}, body()],
+                lambda responses, format_response=format_response: format_response(responses[0])
+            )
+        return plans
+    
+    def _run_plan(self, plan: Plan) -> Dict[str, Any]:
+        searches, format_responses = plan
+        return format_responses(self.es.msearch(searches=searches)['responses'])
+    
+    def get_dashboard(self) -> Dict[str, Any]:
+        """
+        Statistiques des cinq types en un seul aller-retour (_msearch)
+        
+        Une section en échec (index absent, agrégation refusée...) contient
+        {'error': ...} et figure dans failed_sections, sans empêcher les autres.
+        """
+        plans = self._stats_plans()
+        try:
+            responses = self.es.msearch(searches=self._dashboard_searches(plans))['responses']
+        except Exception as e:
+            logger.error(f"Erreur dashboard: {e}")
+            return {'error': str(e)}
+        return self._dashboard_response(plans, responses)
+    
+    def _dashboard_searches(self, plans: Dict[str, Plan]) -> List[Dict[str, Any]]:
+        return [search for searches, _ in plans.values() for search in searches]
+    
+    def _dashboard_response(self, plans: Dict[str, Plan], responses: List[Dict[str, Any]]) -> Dict[str, Any]:
+        dashboard = {}
+        failed_sections = []
+        position = 0
+        for data_type, (searches, format_responses) in plans.items():
+            # Deux lignes (en-tête, corps) par recherche
+            section = responses[position:position + len(searches) // 2]
+            position += len(searches) // 2
+            reason = next(filter(None, map(response_error, section)), None)
+            if reason:
+                logger.error(f"Erreur dashboard {data_type}: {reason}")
+                dashboard[data_type] = {'error': reason}
+                failed_sections.append(data_type)
+                continue
+            try:
+                dashboard[data_type] = format_responses(section)
+            except Exception as e:
+                logger.error(f"Erreur dashboard {data_type}: {e}")
+                dashboard[data_type] = {'error': str(e)}
+                failed_sections.append(data_type)
+        
+        dashboard['failed_sections'] = failed_sections
+        return dashboard
+    
+    def get_alertes_statistics(self) -> Dict[str, Any]:
+        """Statistiques pour les alertes"""
+        try:
+            result = self.es.search(index="iot-alertes", body=self._alertes_stats_body())
+            return self._alertes_stats_response(result)
         except Exception as e:
             logger.error(f"Erreur stats alertes: {e}")
             return {'error': str(e)}
     
+    def _alertes_stats_body(self) -> Dict[str, Any]:
+        return {
+            "size": 0,
+            "track_total_hits": True,
+            "aggs": {
+                "by_severite": {"terms": {"field": keyword_field("severite", "iot-alertes")}},
+                "by_statut": {"terms": {"field": keyword_field("statut", "iot-alertes")}},
+                "by_categorie": {"terms": {"field": keyword_field("categorie", "iot-alertes")}},
+                "by_batiment": {"terms": {"field": keyword_field("batiment", "iot-alertes")}},
+                "count_non_resolue": {
+                    "filter": {"term": {keyword_field("statut", "iot-alertes"): "non_resolue"}}
+                }
+            }
+        }
+    
+    def _alertes_stats_response(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        aggs = result['aggregations']
+        return {
+            'total': result['hits']['total']['value'],
+            'by_severite': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_severite']['buckets']],
+            'by_statut': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_statut']['buckets']],
+            'by_categorie': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_categorie']['buckets']],
+            'by_batiment': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_batiment']['buckets']],
+            'non_resolues': aggs['count_non_resolue']['doc_count']
+        }
+    
     def get_capteurs_statistics(self) -> Dict[str, Any]:
         """Statistiques pour les capteurs"""
         try:
-            body = {
-                "size": 0,
-                "aggs": {
-                    "by_type": {"terms": {"field": "type.keyword"}},
-                    "by_statut": {"terms": {"field": "statut_capteur.keyword"}},
-                    "by_batiment": {"terms": {"field": "batiment.keyword"}},
-                    "batterie_stats": {"stats": {"field": "batterie"}},
-                    "valeur_stats": {"stats": {"field": "valeur"}}
-                }
-            }
-            result = self.es.search(index="iot-capteurs", body=body)
-            aggs = result['aggregations']
-            
-            return {
-                'total': self.count_documents("iot-capteurs"),
-                'by_type': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_type']['buckets']],
-                'by_statut': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_statut']['buckets']],
-                'by_batiment': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_batiment']['buckets']],
-                'batterie_stats': aggs['batterie_stats'],
-                'valeur_stats': aggs['valeur_stats']
-            }
+            result = self.es.search(index="iot-capteurs", body=self._capteurs_stats_body())
+            return self._capteurs_stats_response(result)
         except Exception as e:
             logger.error(f"Erreur stats capteurs: {e}")
             return {'error': str(e)}
     
-    def get_consommation_statistics(self) -> Dict[str, Any]:
-        """Statistiques pour la consommation"""
-        try:
-            body = {
-                "size": 0,
-                "aggs": {
-                    "by_type_energie": {"terms": {"field": "type_energie.keyword"}},
-                    "by_sous_type": {"terms": {"field": "sous_type.keyword"}},
-                    "by_batiment": {"terms": {"field": "batiment.keyword"}},
-                    "consommation_stats": {"stats": {"field": "valeur_consommation"}},
-                    "cout_total": {"sum": {"field": "cout_estime"}},
-                    "empreinte_carbone_total": {"sum": {"field": "empreinte_carbone"}}
-                }
-            }
-            result = self.es.search(index="iot-consommation", body=body)
-            aggs = result['aggregations']
-            
-            return {
-                'total': self.count_documents("iot-consommation"),
-                'by_type_energie': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_type_energie']['buckets']],
-                'by_sous_type': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_sous_type']['buckets']],
-                'by_batiment': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_batiment']['buckets']],
-                'consommation_stats': aggs['consommation_stats'],
-                'cout_total': aggs['cout_total']['value'],
-                'empreinte_carbone_total': aggs['empreinte_carbone_total']['value']
+    def _capteurs_stats_body(self) -> Dict[str, Any]:
+        return {
+            "size": 0,
+            "track_total_hits": True,
+            "aggs": {
+                "by_type": {"terms": {"field": keyword_field("type", "iot-capteurs")}},
+                "by_statut": {"terms": {"field": keyword_field("statut_capteur", "iot-capteurs")}},
+                "by_batiment": {"terms": {"field": keyword_field("batiment", "iot-capteurs")}},
+                "batterie_stats": {"stats": {"field": "batterie"}},
+                "valeur_stats": {"stats": {"field": "valeur"}}
             }
+        }
+    
+    def _capteurs_stats_response(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        aggs = result['aggregations']
+        return {
+            'total': result['hits']['total']['value'],
+            'by_type': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_type']['buckets']],
+            'by_statut': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_statut']['buckets']],
+            'by_batiment': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_batiment']['buckets']],
+            'batterie_stats': aggs['batterie_stats'],
+            'valeur_stats': aggs['valeur_stats']
+        }
+    
+    def get_consommation_statistics(
+        self,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        filters: Optional[Dict] = None
+    ) -> Dict[str, Any]:
+        """
+        Statistiques pour la consommation
+        
+        Lues dans les rollups horaires et journaliers pour la partie de la
+        période déjà agrégée, en un seul _msearch (voir rollups.py).
+        
+        Args:
+            date_from: Début de la période (incluse), None = depuis le premier relevé
+            date_to: Fin de la période (exclue), None = jusqu'au dernier relevé
+            filters: Valeurs exactes de batiment, zone, type_energie, sous_type
+        """
+        try:
+            return self._run_plan(self.rollups.statistics_plan(date_from, date_to, filters))
         except Exception as e:
             logger.error(f"Erreur stats consommation: {e}")
             return {'error': str(e)}
     
+    def get_consommation_histogram(
+        self,
+        interval: str = 'day',
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        filters: Optional[Dict] = None
+    ) -> Dict[str, Any]:
+        """
+        Consommation, coût et empreinte carbone par intervalle (hour, day, week, month, year)
+        
+        Mêmes paramètres que get_consommation_statistics ; rollups
+        journaliers utilisés à partir de l'intervalle day.
+        """
+        try:
+            return self._run_plan(self.rollups.histogram_plan(interval, date_from, date_to, filters))
+        except Exception as e:
+            logger.error(f"Erreur histogramme consommation: {e}")
+            return {'error': str(e)}
+    
     def get_occupation_statistics(self) -> Dict[str, Any]:
         """Statistiques pour l'occupation"""
         try:
-            body = {
-                "size": 0,
-                "aggs": {
-                    "by_type_salle": {"terms": {"field": "type_salle.keyword"}},
-                    "by_statut": {"terms": {"field": "statut_occupation.keyword"}},
-                    "by_batiment": {"terms": {"field": "batiment.keyword"}},
-                    "taux_occupation_moyen": {"avg": {"script": {
-                        "source": "doc['nombre_personnes'].value / doc['capacite_max'].value * 100"
-                    }}},
-                    "personnes_total": {"sum": {"field": "nombre_personnes"}}
-                }
-            }
-            result = self.es.search(index="iot-occupation", body=body)
-            aggs = result['aggregations']
-            
-            return {
-                'total': self.count_documents("iot-occupation"),
-                'by_type_salle': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_type_salle']['buckets']],
-                'by_statut': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_statut']['buckets']],
-                'by_batiment': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_batiment']['buckets']],
-                'taux_occupation_moyen': aggs['taux_occupation_moyen']['value'],
-                'personnes_total': aggs['personnes_total']['value']
-            }
+            result = self.es.search(index="iot-occupation", body=self._occupation_stats_body())
+            return self._occupation_stats_response(result)
         except Exception as e:
             logger.error(f"Erreur stats occupation: {e}")
             return {'error': str(e)}
     
+    def _occupation_stats_body(self) -> Dict[str, Any]:
+        return {
+            "size": 0,
+            "track_total_hits": True,
+            "aggs": {
+                "by_type_salle": {"terms": {"field": keyword_field("type_salle", "iot-occupation")}},
+                "by_statut": {"terms": {"field": keyword_field("statut_occupation", "iot-occupation")}},
+                "by_batiment": {"terms": {"field": keyword_field("batiment", "iot-occupation")}},
+                "taux_occupation_moyen": {"avg": {"script": {
+                    "source": "doc['nombre_personnes'].value / doc['capacite_max'].value * 100"
+                }}},
+                "personnes_total": {"sum": {"field": "nombre_personnes"}}
+            }
+        }
+    
+    def _occupation_stats_response(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        aggs = result['aggregations']
+        return {
+            'total': result['hits']['total']['value'],
+            'by_type_salle': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_type_salle']['buckets']],
+            'by_statut': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_statut']['buckets']],
+            'by_batiment': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_batiment']['buckets']],
+            'taux_occupation_moyen': aggs['taux_occupation_moyen']['value'],
+            'personnes_total': aggs['personnes_total']['value']
+        }
+    
     def get_maintenance_statistics(self) -> Dict[str, Any]:
         """Statistiques pour la maintenance"""
         try:
-            body = {
-                "size": 0,
-                "aggs": {
-                    "by_type_equipement": {"terms": {"field": "type_equipement.keyword"}},
-                    "by_type_maintenance": {"terms": {"field": "type_maintenance.keyword"}},
-                    "by_severite": {"terms": {"field": "severite.keyword"}},
-                    "by_batiment": {"terms": {"field": "batiment.keyword"}},
-                    "cout_total": {"sum": {"field": "cout_estime"}},
-                    "vie_restante_stats": {"stats": {"field": "vie_restante"}},
-                    "duree_moyenne": {"avg": {"field": "duree_intervention_estimee"}}
-                }
-            }
-            result = self.es.search(index="iot-maintenance", body=body)
-            aggs = result['aggregations']
-            
-            return {
-                'total': self.count_documents("iot-maintenance"),
-                'by_type_equipement': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_type_equipement']['buckets']],
-                'by_type_maintenance': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_type_maintenance']['buckets']],
-                'by_severite': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_severite']['buckets']],
-                'by_batiment': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_batiment']['buckets']],
-                'cout_total': aggs['cout_total']['value'],
-                'vie_restante_stats': aggs['vie_restante_stats'],
-                'duree_moyenne': aggs['duree_moyenne']['value']
-            }
+            result = self.es.search(index="iot-maintenance", body=self._maintenance_stats_body())
+            return self._maintenance_stats_response(result)
         except Exception as e:
             logger.error(f"Erreur stats maintenance: {e}")
             return {'error': str(e)}
+    
+    def _maintenance_stats_body(self) -> Dict[str, Any]:
+        return {
+            "size": 0,
+            "track_total_hits": True,
+            "aggs": {
+                "by_type_equipement": {"terms": {"field": keyword_field("type_equipement", "iot-maintenance")}},
+                "by_type_maintenance": {"terms": {"field": keyword_field("type_maintenance", "iot-maintenance")}},
+                "by_severite": {"terms": {"field": keyword_field("severite", "iot-maintenance")}},
+                "by_batiment": {"terms": {"field": keyword_field("batiment", "iot-maintenance")}},
+                "cout_total": {"sum": {"field": "cout_estime"}},
+                "vie_restante_stats": {"stats": {"field": "vie_restante"}},
+                "duree_moyenne": {"avg": {"field": "duree_intervention_estimee"}}
+            }
+        }
+    
+    def _maintenance_stats_response(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        aggs = result['aggregations']
+        return {
+            'total': result['hits']['total']['value'],
+            'by_type_equipement': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_type_equipement']['buckets']],
+            'by_type_maintenance': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_type_maintenance']['buckets']],
+            'by_severite': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_severite']['buckets']],
+            'by_batiment': [{'key': b['key'], 'count': b['doc_count']} for b in aggs['by_batiment']['buckets']],
+            'cout_total': aggs['cout_total']['value'],
+            'vie_restante_stats': aggs['vie_restante_stats'],
+            'duree_moyenne': aggs['duree_moyenne']['value']
+        }
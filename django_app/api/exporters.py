@@ -0,0 +1,214 @@
+"""
+Export en flux des documents Elasticsearch (NDJSON ou CSV, gzip optionnel)
+
+Pendant inverse de upload_parsers.py : les documents arrivent un par un
+(ElasticsearchService.iter_documents) et sont produits en blocs d'octets
+d'environ DEFAULT_CHUNK_SIZE, prêts pour un StreamingHttpResponse. Ni la
+liste des documents ni le fichier complet ne sont gardés en mémoire.
+
+aiter_export produit les mêmes blocs depuis un flux asynchrone
+(AsyncElasticsearchService.iter_documents) : sous ASGI, Django ne
+parcourt un StreamingHttpResponse synchrone qu'après l'avoir lu en entier.
+
+Ce module n'importe pas Django.
+"""
+import csv
+import io
+import itertools
+import json
+import zlib
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+from .schemas import data_type_for, fields_for
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def export_columns(index: Optional[str], first: Dict[str, Any]) -> List[str]:
+    """
+    Colonnes CSV : champs du registre pour un alias iot-<type>, sinon clés
+    du premier document
+    
+    Les champs absents d'un document donnent une cellule vide, les champs
+    hors colonnes sont ignorés.
+    """
+    data_type = data_type_for(index)
+    if data_type is not None:
+        return ['_id'] + [name for name in fields_for(data_type) if name != '_id']
+    return [name for name in first if name != '_score']
+
+
+def _cell(value: Any) -> Any:
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return value
+
+
+def _ndjson_line(document: Dict[str, Any]) -> str:
+    document.pop('_score', None)
+    return json.dumps(document, ensure_ascii=False, default=str) + '\n'
+
+
+class _CsvRows:
+    """Lignes CSV une à une (en-tête puis documents)"""
+    
+    def __init__(self, columns: List[str]):
+        self.buffer = io.StringIO()
+        self.writer = csv.DictWriter(self.buffer, fieldnames=columns, extrasaction='ignore')
+    
+    def _flush(self) -> str:
+        text = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return text
+    
+    def header(self) -> str:
+        self.writer.writeheader()
+        return self._flush()
+    
+    def row(self, document: Dict[str, Any]) -> str:
+        self.writer.writerow({name: _cell(value) for name, value in document.items()})
+        return self._flush()
+
+
+def iter_ndjson(documents: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    for document in documents:
+        yield _ndjson_line(document)
+
+
+def iter_csv(
+    documents: Iterable[Dict[str, Any]],
+    index: Optional[str] = None,
+    columns: Optional[List[str]] = None
+) -> Iterator[str]:
+    """Lignes CSV, en-tête compris (colonnes données, sinon export_columns)"""
+    documents = iter(documents)
+    first = next(documents, None)
+    if first is None:
+        return
+    
+    rows = _CsvRows(columns or export_columns(index, first))
+    yield rows.header()
+    for document in itertools.chain([first], documents):
+        yield rows.row(document)
+
+
+def iter_chunks(lines: Iterable[str], chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Regrouper les lignes en blocs d'environ chunk_size octets"""
+    parts = []
+    length = 0
+    for line in lines:
+        data = line.encode('utf-8')
+        parts.append(data)
+        length += len(data)
+        if length >= chunk_size:
+            yield b''.join(parts)
+            parts = []
+            length = 0
+    if parts:
+        yield b''.join(parts)
+
+
+def iter_gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Compresser un flux de blocs au format gzip"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_export(
+    documents: Iterable[Dict[str, Any]],
+    export_format: str,
+    index: Optional[str] = None,
+    compress: bool = False,
+    columns: Optional[List[str]] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[bytes]:
+    """
+    Blocs d'octets du fichier exporté
+    
+    Args:
+        documents: Documents à exporter (itérés une seule fois)
+        export_format: 'ndjson' ou 'csv'
+        index: Index interrogé (colonnes CSV, voir export_columns)
+        compress: Compresser en gzip
+        columns: Colonnes CSV (par défaut export_columns)
+    """
+    if export_format == 'csv':
+        lines = iter_csv(documents, index, columns)
+    else:
+        lines = iter_ndjson(documents)
+    chunks = iter_chunks(lines, chunk_size)
+    return iter_gzip(chunks) if compress else chunks
+
+
+async def aiter_ndjson(documents: AsyncIterable[Dict[str, Any]]) -> AsyncIterator[str]:
+    async for document in documents:
+        yield _ndjson_line(document)
+
+
+async def aiter_csv(
+    documents: AsyncIterable[Dict[str, Any]],
+    index: Optional[str] = None,
+    columns: Optional[List[str]] = None
+) -> AsyncIterator[str]:
+    """Comme iter_csv, pour un flux asynchrone"""
+    rows = None
+    async for document in documents:
+        if rows is None:
+            rows = _CsvRows(columns or export_columns(index, document))
+            yield rows.header()
+        yield rows.row(document)
+
+
+async def aiter_chunks(lines: AsyncIterable[str], chunk_size: int = DEFAULT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Comme iter_chunks, pour un flux asynchrone"""
+    parts = []
+    length = 0
+    async for line in lines:
+        data = line.encode('utf-8')
+        parts.append(data)
+        length += len(data)
+        if length >= chunk_size:
+            yield b''.join(parts)
+            parts = []
+            length = 0
+    if parts:
+        yield b''.join(parts)
+
+
+async def aiter_gzip(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Comme iter_gzip, pour un flux asynchrone"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def aiter_export(
+    documents: AsyncIterable[Dict[str, Any]],
+    export_format: str,
+    index: Optional[str] = None,
+    compress: bool = False,
+    columns: Optional[List[str]] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    """Comme iter_export, pour un flux de documents asynchrone (vues ASGI)"""
+    if export_format == 'csv':
+        lines = aiter_csv(documents, index, columns)
+    else:
+        lines = aiter_ndjson(documents)
+    chunks = aiter_chunks(lines, chunk_size)
+    return aiter_gzip(chunks) if compress else chunks
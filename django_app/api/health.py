@@ -0,0 +1,193 @@
+"""
+Santé de l'API : instantané des dépendances rafraîchi en arrière-plan
+
+Un thread par processus (démarré au premier accès, donc dans chaque
+worker après un fork) exécute les vérifications toutes les interval
+secondes, en parallèle, et remplace l'instantané en mémoire. Les
+endpoints de santé ne font que lire cet instantané : sondes Kubernetes et
+tableau de bord Angular n'ajoutent aucun appel Redis ou Elasticsearch,
+quelle que soit leur fréquence.
+
+- liveness : le processus répond, sans regarder les dépendances (un
+  Elasticsearch en panne ne doit pas faire redémarrer les pods de l'API) ;
+- readiness : les dépendances requises répondent et l'instantané est
+  récent (moins de stale_after secondes).
+
+Pour chaque dépendance : état, latence de la dernière vérification,
+dernier succès, dernière erreur ; pour les files, longueur et tendance
+(messages par seconde sur trend_window secondes).
+
+Ce module n'importe pas Django.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 5.0
+DEFAULT_STALE_AFTER = 30.0
+DEFAULT_TREND_WINDOW = 300.0
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp is not None else None
+
+
+class HealthMonitor:
+    """
+    Vérifications périodiques des dépendances, lues depuis la mémoire
+    
+    checks associe un nom à une fonction sans argument : une exception ou
+    un retour False marque la dépendance indisponible, toute autre valeur
+    (longueur de file...) est conservée dans l'instantané.
+    """
+    
+    def __init__(
+        self,
+        checks: Dict[str, Callable[[], Any]],
+        required: Iterable[str] = (),
+        trends: Iterable[str] = (),
+        interval: float = DEFAULT_INTERVAL,
+        stale_after: float = DEFAULT_STALE_AFTER,
+        trend_window: float = DEFAULT_TREND_WINDOW
+    ):
+        self.checks = checks
+        self.required = tuple(required)
+        self.trends = tuple(trends)
+        self.interval = interval
+        self.stale_after = stale_after
+        self.trend_window = trend_window
+        self._states = {name: {
+            'up': None,
+            'value': None,
+            'latency_ms': None,
+            'checked_at': None,
+            'last_success': None,
+            'last_error': None,
+        } for name in checks}
+        self._history = {name: deque() for name in self.trends}
+        self._refreshed_at = None
+        self._after_fork()
+        os.register_at_fork(after_in_child=self._after_fork)
+    
+    def _after_fork(self):
+        # Le thread et le pool du parent n'existent pas dans l'enfant
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = None
+    
+    def start(self) -> None:
+        """Démarrer le rafraîchissement en arrière-plan (sans effet s'il tourne déjà)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='health-monitor', daemon=True)
+            self._thread.start()
+    
+    def stop(self) -> None:
+        self._stop.set()
+    
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except RuntimeError:
+                # Arrêt de l'interpréteur : le pool n'accepte plus de vérifications
+                return
+            except Exception as e:
+                logger.error(f"❌ Rafraîchissement de la santé impossible: {e}")
+            if self._stop.wait(self.interval):
+                return
+    
+    def refresh(self) -> None:
+        """Exécuter toutes les vérifications (en parallèle) et mettre à jour l'instantané"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=len(self.checks), thread_name_prefix='health-check')
+        futures = {name: self._executor.submit(self._check, check) for name, check in self.checks.items()}
+        for name, future in futures.items():
+            self._record(name, *future.result())
+        self._refreshed_at = time.time()
+    
+    @staticmethod
+    def _check(check: Callable[[], Any]) -> Tuple[Any, Optional[str], float]:
+        start = time.perf_counter()
+        try:
+            value = check()
+            error = "échec de la vérification" if value is False else None
+        except Exception as e:
+            value, error = None, str(e)
+        return value, error, time.perf_counter() - start
+    
+    def _record(self, name: str, value: Any, error: Optional[str], latency: float):
+        now = time.time()
+        with self._lock:
+            state = self._states[name]
+            state.update(up=error is None, value=value, latency_ms=round(latency * 1000, 2), checked_at=now)
+            if error is None:
+                state['last_success'] = now
+            else:
+                state['last_error'] = error
+            
+            history = self._history.get(name)
+            if history is not None and error is None:
+                history.append((now, value))
+                while history and now - history[0][0] > self.trend_window:
+                    history.popleft()
+    
+    def _trend(self, name: str) -> Optional[Dict[str, Any]]:
+        history = self._history[name]
+        if len(history) < 2:
+            return None
+        (first_at, first), (last_at, last) = history[0], history[-1]
+        rate = (last - first) / (last_at - first_at)
+        return {
+            'per_second': round(rate, 3),
+            'window_seconds': round(last_at - first_at),
+            'direction': 'growing' if rate > 0 else 'shrinking' if rate < 0 else 'stable',
+        }
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """État de chaque dépendance (démarre le rafraîchissement au premier appel)"""
+        self.start()
+        refreshed_at = self._refreshed_at
+        age = time.time() - refreshed_at if refreshed_at is not None else None
+        with self._lock:
+            dependencies = {}
+            for name, state in self._states.items():
+                dependencies[name] = {
+                    **state,
+                    'checked_at': _isoformat(state['checked_at']),
+                    'last_success': _isoformat(state['last_success']),
+                }
+                if name in self._history:
+                    dependencies[name]['trend'] = self._trend(name)
+        return {
+            'refreshed_at': _isoformat(refreshed_at),
+            'age_seconds': round(age, 3) if age is not None else None,
+            'stale': age is None or age > self.stale_after,
+            'dependencies': dependencies,
+        }
+    
+    def readiness(self, snapshot: Optional[Dict[str, Any]] = None) -> Tuple[bool, List[str]]:
+        """(prêt, raisons) : dépendances requises disponibles et instantané récent"""
+        snapshot = snapshot or self.snapshot()
+        reasons = []
+        if snapshot['refreshed_at'] is None:
+            reasons.append("première vérification en cours")
+        elif snapshot['stale']:
+            reasons.append(f"instantané de plus de {self.stale_after:g} s")
+        for name in self.required:
+            if snapshot['dependencies'][name]['up'] is False:
+                reasons.append(f"{name} indisponible")
+        return not reasons, reasons
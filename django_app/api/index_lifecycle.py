@@ -0,0 +1,300 @@
+"""
+Index iot-* partitionnés dans le temps (rollover)
+
+Chaque type de données est écrit et lu via l'alias iot-<type>. Derrière
+l'alias, les index iot-<type>-000001, iot-<type>-000002... sont créés par
+la politique ILM iot-rollover dès que l'index courant dépasse une taille ou
+un âge ; seul le dernier reçoit les écritures (is_write_index). Une
+politique de rétention optionnelle supprime les index les plus anciens.
+
+Les chemins d'ingestion (indexeur, Logstash, scripts ingest_all) écrivent
+dans iot-<type>. L'_id déterministe (document_ids.py) ne dédoublonne qu'au
+sein d'un même index : avant d'écrire, ils cherchent donc les _id dans
+tous les index du type et remplacent un document déjà indexé dans son index
+de stockage, même si l'alias a basculé depuis. Seuls les nouveaux documents
+vont dans l'index d'écriture courant. L'indexeur et les scripts cherchent
+par paquet (locate_documents) ; Logstash, qui traite les événements un par
+un, ne cherche que pour les messages marqués redelivery (rejeu DLQ, upload
+repris ou renvoyé, voir redis_queue.build_metadata).
+
+Ce module n'importe pas Django (voir manage.py setup_elasticsearch).
+"""
+import logging
+from typing import Any, Dict, List, Optional
+
+from .schemas import (
+    DATA_TYPES,
+    DATE,
+    FIELD_MAPPINGS,
+    INDEX_PREFIX,
+    INDEX_TYPES,
+    INGEST_PIPELINE,
+    INGESTED_FIELD,
+    LIFECYCLE_POLICY,
+    SEARCH_ALL_FIELD,
+    alias_name,
+    install_templates,
+    search_mapping,
+    set_legacy_types,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROLLOVER_MAX_SIZE = '50gb'
+DEFAULT_ROLLOVER_MAX_AGE = '30d'
+
+REINDEX_TIMEOUT = 3600
+
+# _id cherchés par requête de locate_documents
+LOOKUP_CHUNK_SIZE = 1000
+
+# État de l'alias d'un type après setup_indices
+ALIAS_READY = 'ready'
+ALIAS_CREATED = 'created'
+ALIAS_LEGACY = 'legacy'      # index concret iot-<type> d'avant le rollover, à migrer
+
+
+def first_index(data_type: str) -> str:
+    return f'{alias_name(data_type)}-000001'
+
+
+def lifecycle_policy(
+    max_size: str = DEFAULT_ROLLOVER_MAX_SIZE,
+    max_age: str = DEFAULT_ROLLOVER_MAX_AGE,
+    retention: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Politique ILM : rollover par taille de shard primaire ou par âge
+    
+    Args:
+        max_size: Taille maximale d'un shard primaire (ex: '50gb')
+        max_age: Âge maximal de l'index d'écriture (ex: '30d')
+        retention: Durée de conservation après rollover (ex: '365d'), None = illimitée
+    """
+    phases = {
+        'hot': {
+            'actions': {
+                'rollover': {'max_primary_shard_size': max_size, 'max_age': max_age},
+            }
+        }
+    }
+    if retention:
+        phases['delete'] = {'min_age': retention, 'actions': {'delete': {}}}
+    return {'phases': phases}
+
+
+def ensure_policy(es, policy: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Installer la politique ILM
+    
+    Sans politique explicite, une politique existante est conservée (les
+    scripts d'ingestion n'écrasent pas celle installée par setup_elasticsearch).
+    """
+    if policy is None:
+        try:
+            es.ilm.get_lifecycle(name=LIFECYCLE_POLICY)
+            return
+        except Exception:
+            policy = lifecycle_policy()
+    es.ilm.put_lifecycle(name=LIFECYCLE_POLICY, policy=policy)
+
+
+def bootstrap(es, data_type: str) -> str:
+    """Créer le premier index d'un type et son alias d'écriture si besoin"""
+    alias = alias_name(data_type)
+    if es.indices.exists_alias(name=alias):
+        return ALIAS_READY
+    if es.indices.exists(index=alias):
+        logger.warning(f"Index concret {alias} : lancer manage.py setup_elasticsearch --reindex")
+        return ALIAS_LEGACY
+    es.indices.create(index=first_index(data_type), aliases={alias: {'is_write_index': True}})
+    logger.info(f"Index {first_index(data_type)} créé (alias {alias})")
+    return ALIAS_CREATED
+
+
+def setup_indices(es, policy: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+    """
+    Politique ILM, templates et premiers index de chaque type
+    
+    À lancer avant toute écriture : un document écrit dans iot-<type> sans
+    alias créerait un index concret à ce nom, hors rollover.
+    
+    Returns:
+        {type de données: 'ready' | 'created' | 'legacy'}
+    """
+    ensure_policy(es, policy)
+    install_templates(es)
+    states = {data_type: bootstrap(es, data_type) for data_type in INDEX_TYPES}
+    set_legacy_types(data_type for data_type, state in states.items() if state == ALIAS_LEGACY)
+    for data_type, state in states.items():
+        if state == ALIAS_READY:
+            update_search_mapping(es, data_type)
+        if state != ALIAS_CREATED:
+            update_ingest_pipeline(es, data_type)
+    return states
+
+
+def detect_legacy_types(es) -> List[str]:
+    """
+    Types dont iot-<type> est encore un index concret (une requête, sans rien créer)
+    
+    Met à jour l'état lu par schemas.keyword_field : sur ces index, les
+    champs keyword du registre sont encore des champs texte (.keyword).
+    """
+    indices = es.indices.get_alias(index=f'{INDEX_PREFIX}-*')
+    legacy = [data_type for data_type in INDEX_TYPES if alias_name(data_type) in indices]
+    set_legacy_types(legacy)
+    return legacy
+
+
+def locate_documents(es, actions: List[Dict[str, Any]], chunk_size: int = LOOKUP_CHUNK_SIZE) -> int:
+    """
+    Rediriger vers leur index de stockage les actions bulk dont l'_id existe déjà
+    
+    Chaque _id est cherché dans tous les index derrière l'alias _index de
+    l'action (un seul msearch pour tout le lot). Un document trouvé dans un
+    index plus ancien que l'index d'écriture y est remplacé au lieu d'être
+    dupliqué dans l'index courant. Les actions sont modifiées sur place.
+    
+    Returns:
+        Nombre d'actions redirigées
+    """
+    by_alias: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+    for action in actions:
+        by_alias.setdefault(action['_index'], {}).setdefault(action['_id'], []).append(action)
+    
+    searches = []
+    targets = []
+    for alias, by_id in by_alias.items():
+        ids = list(by_id)
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            targets.append((alias, by_id))
+            searches.append({'index': alias, 'ignore_unavailable': True})
+            searches.append({'query': {'ids': {'values': chunk}}, '_source': False, 'size': len(chunk)})
+    if not searches:
+        return 0
+    
+    moved = 0
+    responses = es.msearch(searches=searches)['responses']
+    for (alias, by_id), response in zip(targets, responses):
+        if 'error' in response:
+            # Le lot est écrit quand même, dans l'index d'écriture
+            logger.warning(f"Recherche des documents existants dans {alias} en échec: {response['error']}")
+            continue
+        for hit in response['hits']['hits']:
+            for action in by_id.get(hit['_id'], ()):
+                # Un _id déjà dupliqué (plusieurs index) ne redirige l'action qu'une fois
+                if action['_index'] == alias and hit['_index'] != alias:
+                    action['_index'] = hit['_index']
+                    moved += 1
+    return moved
+
+
+def update_search_mapping(es, data_type: str) -> bool:
+    """
+    Ajouter le champ search_all et les copy_to aux index existants d'un type
+    
+    Les templates ne s'appliquent qu'aux index créés ensuite. Les documents
+    déjà indexés n'alimentent search_all qu'après backfill_search_field.
+    
+    Returns:
+        False si le mapping existant est incompatible (index à réindexer)
+    """
+    try:
+        es.indices.put_mapping(
+            index=alias_name(data_type),
+            properties=search_mapping(data_type if data_type in DATA_TYPES else None)
+        )
+        return True
+    except Exception as e:
+        logger.warning(f"Mapping de recherche non appliqué à {alias_name(data_type)}: {e}")
+        return False
+
+
+def update_ingest_pipeline(es, data_type: str) -> bool:
+    """
+    Brancher le pipeline d'ingestion (date d'indexation) sur les index existants d'un type
+    
+    Les documents indexés avant n'ont pas de date d'indexation : un import
+    ancien arrivé avant ce réglage se rattrape avec rollup_consommation --since.
+    
+    Returns:
+        False si les index n'ont pas pu être mis à jour
+    """
+    alias = alias_name(data_type)
+    try:
+        es.indices.put_mapping(index=alias, properties={INGESTED_FIELD: FIELD_MAPPINGS[DATE]})
+        es.indices.put_settings(index=alias, settings={'index.final_pipeline': INGEST_PIPELINE})
+        return True
+    except Exception as e:
+        logger.warning(f"Pipeline d'ingestion non appliqué à {alias}: {e}")
+        return False
+
+
+def backfill_search_field(es, data_type: str) -> str:
+    """
+    Réindexer en place les documents sans search_all (update_by_query)
+    
+    Lancé en tâche de fond Elasticsearch, sans bloquer les écritures.
+    
+    Returns:
+        Identifiant de la tâche (GET _tasks/<id>)
+    """
+    result = es.update_by_query(
+        index=alias_name(data_type),
+        query={'bool': {'must_not': {'exists': {'field': SEARCH_ALL_FIELD}}}},
+        conflicts='proceed',
+        wait_for_completion=False,
+    )
+    return result['task']
+
+
+def migrate_legacy_index(es, data_type: str) -> Dict[str, Any]:
+    """
+    Migrer l'index concret iot-<type> vers iot-<type>-000001 + alias
+    
+    L'index est recopié puis remplacé par l'alias en une seule opération
+    atomique : les lectures ne sont jamais interrompues. Les écritures
+    arrivées pendant la copie sont perdues : arrêter l'ingestion avant.
+    
+    Returns:
+        Réponse du reindex ('total', 'failures'...) ; l'ancien index est
+        conservé en cas d'échec
+    """
+    alias = alias_name(data_type)
+    target = first_index(data_type)
+    if not es.indices.exists(index=target):
+        es.indices.create(index=target)
+    
+    result = es.options(request_timeout=REINDEX_TIMEOUT).reindex(
+        source={'index': alias},
+        dest={'index': target},
+        wait_for_completion=True,
+        refresh=True,
+    )
+    if result.get('failures'):
+        logger.error(f"Migration {alias}: {len(result['failures'])} documents non copiés, index conservé")
+        return result
+    
+    es.indices.update_aliases(actions=[
+        {'remove_index': {'index': alias}},
+        {'add': {'index': target, 'alias': alias, 'is_write_index': True}},
+    ])
+    # L'étape de rollover a pu échouer tant que l'alias n'existait pas
+    try:
+        es.ilm.retry(index=target)
+    except Exception:
+        pass
+    logger.info(f"Index {alias} migré vers {target} ({result.get('total', 0)} documents)")
+    return result
+
+
+def delete_indices(es, data_type: str) -> List[str]:
+    """Supprimer tous les index d'un type (alias iot-<type> ou index concret)"""
+    alias = alias_name(data_type)
+    names = list(es.indices.get(index=f'{alias},{alias}-*', ignore_unavailable=True, allow_no_indices=True))
+    if names:
+        # Noms explicites : la suppression par motif est refusée par défaut
+        es.indices.delete(index=','.join(names))
+    return names
@@ -0,0 +1,446 @@
+"""
+Indexation dans Elasticsearch des messages produits par les uploads
+
+Reprend en Python le traitement du pipeline Logstash
+redis-to-elasticsearch.conf : aplatissement de [data] au premier niveau,
+conversion des champs numériques (registre schemas.py), calcul de @timestamp et routage vers
+iot-<data_type>, avec un _id déterministe par enregistrement. Un document
+déjà indexé est remplacé dans son index de stockage, même après un
+rollover de l'alias (index_lifecycle.locate_documents).
+
+BulkIndexer vide la file Redis (liste iot:data ou stream) par gros lots
+et les indexe avec l'API bulk (streaming_bulk, ou parallel_bulk sur
+plusieurs threads). Un lot part dès qu'il atteint batch_size messages ou
+que flush_interval secondes se sont écoulées. Les refus temporaires sont
+réessayés avec une attente exponentielle, les refus définitifs partent dans
+la DLQ (dead_letters.py). Les documents indexés sont ensuite publiés pour
+le flux temps réel /api/stream/ (live_stream.py).
+
+Ce module n'importe pas Django (voir manage.py run_indexer).
+"""
+import json
+import logging
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import redis
+from elasticsearch import helpers
+
+from .dead_letters import DeadLetterQueue, build_dead_letter, bulk_error_reason
+from .document_ids import document_id
+from .index_lifecycle import locate_documents
+from .redis_queue import DEFAULT_QUEUE_KEY
+from .redis_streams import StreamConsumer
+from .schemas import DATA_TYPES, coerce
+
+logger = logging.getLogger(__name__)
+
+METADATA_FIELDS = ('source_file', 'file_type', 'data_type', 'upload_timestamp')
+
+TIMESTAMP_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%dT%H:%M:%S.%fZ')
+
+DEFAULT_INDEX_PREFIX = 'iot'
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_BULK_CHUNK_SIZE = 1000
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_INITIAL_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 60.0
+
+# Refus temporaires d'Elasticsearch : le document sera réessayé
+RETRYABLE_STATUSES = (429, 502, 503, 504)
+
+def parse_timestamp(value: Any):
+    """Convertir un timestamp des fichiers de logs en ISO 8601 (None si invalide)"""
+    if not isinstance(value, str) or not value:
+        return None
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).isoformat()
+        except ValueError:
+            continue
+    try:
+        return datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        return None
+
+
+def flatten_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Construire le document à indexer depuis un message de la file"""
+    document = {field: message[field] for field in METADATA_FIELDS if field in message}
+    data = message.get('data')
+    if isinstance(data, dict):
+        document.update(data)
+    coerce(document, document.get('data_type'))
+    
+    timestamp = parse_timestamp(document.get('timestamp')) or parse_timestamp(document.get('upload_timestamp'))
+    if timestamp:
+        document['@timestamp'] = timestamp
+    return document
+
+
+def index_for(document: Dict[str, Any], prefix: str = DEFAULT_INDEX_PREFIX) -> str:
+    """Alias cible selon data_type (iot-unknown sinon, comme Logstash)"""
+    data_type = document.get('data_type')
+    if data_type in DATA_TYPES:
+        return f"{prefix}-{data_type}"
+    return f"{prefix}-unknown"
+
+
+def build_actions(messages: Iterable[Dict[str, Any]], prefix: str = DEFAULT_INDEX_PREFIX) -> Iterable[Dict[str, Any]]:
+    """
+    Actions bulk pour une suite de messages
+    
+    L'_id déterministe (voir document_ids.py) fait d'une nouvelle livraison
+    du même enregistrement un remplacement et non un doublon.
+    """
+    for message in messages:
+        record = message.get('data')
+        document = flatten_message(message)
+        yield {
+            "_index": index_for(document, prefix),
+            "_id": document_id(record if isinstance(record, dict) else message, message.get('data_type')),
+            "_source": document,
+        }
+
+
+def backoff_delay(attempt: int, initial: float = DEFAULT_INITIAL_BACKOFF, maximum: float = DEFAULT_MAX_BACKOFF) -> float:
+    """Attente avant la tentative n° attempt : exponentielle, plafonnée, avec jitter"""
+    delay = min(maximum, initial * 2 ** (attempt - 1))
+    # Le jitter évite que plusieurs indexeurs relancent Elasticsearch en même temps
+    return random.uniform(delay / 2, delay)
+
+
+def index_messages(
+    es,
+    messages: List[Dict[str, Any]],
+    workers: int = 1,
+    chunk_size: int = DEFAULT_BULK_CHUNK_SIZE,
+    prefix: str = DEFAULT_INDEX_PREFIX
+) -> Tuple[int, List[Tuple[int, Dict]]]:
+    """
+    Indexer un lot de messages
+    
+    Les _id déjà présents derrière l'alias sont d'abord cherchés (un
+    msearch) pour remplacer ces documents là où ils sont stockés. Avec
+    workers > 1, les requêtes bulk de chunk_size documents sont envoyées en
+    parallèle (parallel_bulk). Un document rejeté est rapporté dans les
+    erreurs ; une erreur de connexion à Elasticsearch est levée.
+    
+    Returns:
+        (nombre de documents indexés, [(position du message, erreur bulk)])
+    """
+    actions = list(build_actions(messages, prefix))
+    locate_documents(es, actions)
+    if workers > 1:
+        results = helpers.parallel_bulk(
+            es, actions, thread_count=workers, chunk_size=chunk_size, raise_on_error=False
+        )
+    else:
+        results = helpers.streaming_bulk(es, actions, chunk_size=chunk_size, raise_on_error=False)
+    
+    # Les deux helpers rendent les résultats dans l'ordre des actions
+    success = 0
+    errors = []
+    for position, (ok, item) in enumerate(results):
+        if ok:
+            success += 1
+        else:
+            # {'index': {'_index': ..., 'status': 400, 'error': {...}}}
+            errors.append((position, next(iter(item.values()))))
+    return success, errors
+
+
+class ListSource:
+    """
+    Lecture de la liste iot:data
+    
+    Un BRPOP attend le premier message, puis un RPOP count dépile le reste
+    du lot sans attente (Redis >= 6.2). Les messages sont lus du plus ancien
+    au plus récent (les uploads poussent par LPUSH). Les messages illisibles
+    sont déposés dans la DLQ.
+    """
+    
+    def __init__(self, client, key: str = DEFAULT_QUEUE_KEY, dlq: Optional[DeadLetterQueue] = None):
+        self.client = client
+        self.key = key
+        self.dlq = dlq
+    
+    def read(self, count: int, timeout: float) -> List[Tuple[str, Dict[str, Any]]]:
+        """Lire jusqu'à count messages en attendant au plus timeout secondes"""
+        popped = self.client.brpop(self.key, timeout=timeout)
+        if not popped:
+            return []
+        raw_messages = [popped[1]]
+        if count > 1:
+            raw_messages.extend(self.client.rpop(self.key, count - 1) or [])
+        
+        entries = []
+        unreadable = []
+        for raw in raw_messages:
+            try:
+                entries.append((raw, json.loads(raw)))
+            except ValueError as e:
+                logger.error(f"Message illisible sur {self.key}: {e}")
+                unreadable.append(build_dead_letter(raw, f"JSON invalide: {e}", source=self.key))
+        if unreadable and self.dlq is not None:
+            self.dlq.push(unreadable)
+        return entries
+    
+    def ack(self, entries):
+        """Les messages dépilés ne sont plus dans la liste : rien à acquitter"""
+    
+    def release(self, entries):
+        """Remettre en tête de file des messages non indexés"""
+        if entries:
+            self.client.rpush(self.key, *[raw for raw, _ in reversed(entries)])
+
+
+class StreamSource:
+    """Lecture du Redis Stream par groupe de consommateurs (voir redis_streams.py)"""
+    
+    def __init__(self, consumer: StreamConsumer):
+        self.consumer = consumer
+        self.key = consumer.key
+        consumer.ensure_group()
+    
+    def read(self, count: int, timeout: float) -> List[Tuple[str, Dict[str, Any]]]:
+        self.consumer.batch_size = count
+        # block=0 signifie « sans limite » pour XREADGROUP
+        self.consumer.block_ms = max(1, int(timeout * 1000))
+        return self.consumer.read_batch()
+    
+    def ack(self, entries):
+        self.consumer.ack([entry_id for entry_id, _ in entries])
+    
+    def release(self, entries):
+        """Les entrées restent en attente (PEL) et seront relues"""
+        self.consumer.retry_pending()
+
+
+class BulkIndexer:
+    """
+    Boucle d'indexation : file Redis -> Elasticsearch
+    
+    Les messages sont accumulés jusqu'à batch_size ou jusqu'à flush_interval
+    secondes après le premier message du lot, puis indexés.
+    
+    Sous la pression d'Elasticsearch (429, 5xx, délai dépassé), les documents
+    concernés sont réessayés avec une attente exponentielle ; au-delà de
+    max_retries ils sont rendus à la source et la lecture est ralentie
+    jusqu'au retour à la normale : la file Redis absorbe le surplus. Les
+    documents refusés définitivement (mapping, document invalide) partent
+    dans la DLQ.
+    
+    Un message pour lequel urgent(message) est vrai (alerte critique) clôt
+    le lot sans attendre flush_interval.
+    """
+    
+    def __init__(
+        self,
+        es,
+        source,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        workers: int = 1,
+        chunk_size: int = DEFAULT_BULK_CHUNK_SIZE,
+        prefix: str = DEFAULT_INDEX_PREFIX,
+        dlq: Optional[DeadLetterQueue] = None,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        initial_backoff: float = DEFAULT_INITIAL_BACKOFF,
+        max_backoff: float = DEFAULT_MAX_BACKOFF,
+        cache=None,
+        publisher=None,
+        urgent: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    ):
+        self.es = es
+        self.source = source
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.prefix = prefix
+        self.dlq = dlq
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        # Cache des statistiques (stats_cache.StatsCache) invalidé après chaque
+        # lot, une fois les index touchés rafraîchis
+        self.cache = cache
+        # Flux temps réel (live_stream.LivePublisher) alimenté après chaque lot
+        self.publisher = publisher
+        self.urgent = urgent
+        self.stats = {
+            'indexed': 0, 'failed': 0, 'retried': 0, 'released': 0,
+            'batches': 0, 'seconds': 0.0,
+        }
+        # Lots consécutifs rendus à la source (ralentissement de la lecture)
+        self._failures = 0
+        self._stop_event = threading.Event()
+    
+    def stop(self):
+        """Terminer le lot en cours puis sortir de run()"""
+        self._stop_event.set()
+    
+    @property
+    def stopped(self) -> bool:
+        return self._stop_event.is_set()
+    
+    def collect(self) -> List[Tuple[Any, Dict[str, Any]]]:
+        """Accumuler un lot (batch_size messages ou flush_interval écoulé)"""
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size and not self.stopped:
+            if deadline is None:
+                timeout = self.flush_interval
+            else:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+            entries = self.source.read(min(self.chunk_size, self.batch_size - len(batch)), timeout)
+            if not entries and deadline is None:
+                # File vide : rendre la main pour vérifier l'arrêt
+                break
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+            batch.extend(entries)
+            if self.urgent is not None and any(self.urgent(message) for _, message in entries):
+                break
+        return batch
+    
+    def flush(self, batch: List[Tuple[Any, Dict[str, Any]]]) -> int:
+        """
+        Indexer un lot, avec nouvelles tentatives et DLQ
+        
+        Returns:
+            Nombre de documents indexés
+        """
+        start = time.perf_counter()
+        pending = batch
+        indexed = 0
+        dead_letters = []
+        rejected = set()
+        attempt = 0
+        while True:
+            retry = []
+            try:
+                success, errors = index_messages(
+                    self.es, [message for _, message in pending],
+                    workers=self.workers, chunk_size=self.chunk_size, prefix=self.prefix
+                )
+            except Exception as e:
+                # Requête entière en échec (connexion, délai, 429 global...)
+                logger.warning(f"Requête bulk en échec pour {len(pending)} messages: {e}")
+                retry = pending
+            else:
+                indexed += success
+                for position, error in errors:
+                    entry = pending[position]
+                    if error.get('status') in RETRYABLE_STATUSES:
+                        retry.append(entry)
+                    else:
+                        rejected.add(id(entry))
+                        dead_letters.append(build_dead_letter(
+                            entry[1], bulk_error_reason(error), error.get('status'),
+                            error.get('_index'), self.source.key
+                        ))
+            
+            if not retry:
+                break
+            attempt += 1
+            if attempt > self.max_retries or self.stopped:
+                break
+            delay = backoff_delay(attempt, self.initial_backoff, self.max_backoff)
+            logger.warning(f"{len(retry)} documents réessayés dans {delay:.1f}s "
+                           f"(tentative {attempt}/{self.max_retries})")
+            self.stats['retried'] += len(retry)
+            self._stop_event.wait(delay)
+            pending = retry
+        
+        self._dead_letter(dead_letters)
+        released = {id(entry) for entry in retry}
+        if retry:
+            # Elasticsearch ne suit pas : les messages restants retournent dans la file
+            logger.error(f"{len(retry)} messages rendus à {self.source.key} après {attempt - 1} nouvelles tentatives")
+            self.source.ack([entry for entry in batch if id(entry) not in released])
+            self.source.release(retry)
+            self.stats['released'] += len(retry)
+            self._failures += 1
+        else:
+            self.source.ack(batch)
+            self._failures = 0
+        if indexed:
+            self._invalidate(batch)
+            unindexed = released | rejected
+            self._publish([entry[1] for entry in batch if id(entry) not in unindexed])
+        
+        elapsed = time.perf_counter() - start
+        self.stats['indexed'] += indexed
+        self.stats['failed'] += len(dead_letters)
+        self.stats['batches'] += 1
+        self.stats['seconds'] += elapsed
+        rate = indexed / elapsed if elapsed else 0
+        logger.info(f"{indexed} documents indexés en {elapsed:.2f}s ({rate:,.0f} docs/s), "
+                    f"{len(dead_letters)} rejetés, {len(retry)} rendus")
+        return indexed
+    
+    def _invalidate(self, batch: List[Tuple[Any, Dict[str, Any]]]):
+        if self.cache is None:
+            return
+        indices = sorted({index_for(message, self.prefix) for _, message in batch})
+        # Rendre le lot visible avant de changer de génération : sinon une
+        # réponse calculée avant le prochain refresh serait mise en cache
+        # sans ces documents pour toute la durée STATS_CACHE_TTL
+        try:
+            self.es.indices.refresh(index=','.join(indices), ignore_unavailable=True)
+        except Exception as e:
+            logger.warning(f"Rafraîchissement de {', '.join(indices)} impossible: {e}")
+        try:
+            self.cache.bump(indices)
+        except redis.RedisError as e:
+            logger.warning(f"Invalidation du cache des statistiques impossible: {e}")
+    
+    def _publish(self, messages: List[Dict[str, Any]]):
+        if self.publisher is None or not messages:
+            return
+        try:
+            self.publisher.publish(build_actions(messages, self.prefix))
+        except redis.RedisError as e:
+            logger.warning(f"Publication du flux temps réel impossible: {e}")
+    
+    def _dead_letter(self, letters: List[Dict[str, Any]]):
+        if not letters:
+            return
+        logger.warning(f"{len(letters)} documents rejetés par Elasticsearch: {letters[0]['reason']}")
+        if self.dlq is not None:
+            self.dlq.push(letters)
+    
+    def run(self, drain: bool = False) -> Dict[str, Any]:
+        """
+        Indexer jusqu'à stop()
+        
+        Avec drain=True, s'arrête dès que la file est vide (benchmarks).
+        """
+        logger.info(f"Indexeur démarré sur {self.source.key} (lots de {self.batch_size}, "
+                    f"{self.workers} workers, flush {self.flush_interval}s)")
+        while not self.stopped:
+            if self._failures:
+                delay = backoff_delay(self._failures, self.initial_backoff, self.max_backoff)
+                logger.warning(f"Lecture ralentie : reprise dans {delay:.1f}s")
+                self._stop_event.wait(delay)
+                if self.stopped:
+                    break
+            try:
+                batch = self.collect()
+                if batch:
+                    self.flush(batch)
+                elif drain:
+                    break
+            except redis.RedisError as e:
+                logger.error(f"Redis indisponible: {e}")
+                self._failures += 1
+        logger.info(f"Indexeur arrêté: {self.stats['indexed']} documents indexés, {self.stats['failed']} rejetés")
+        return self.stats
@@ -0,0 +1,303 @@
+"""
+Flux temps réel des documents indexés (Server-Sent Events, /api/stream/)
+
+Les tableaux de bord n'ont plus à interroger les listes et statistiques en
+boucle pour découvrir les nouvelles alertes : l'indexeur publie chaque lot
+indexé sur un canal Redis pub/sub (LivePublisher), et chaque worker ASGI
+relaie ce canal à ses clients SSE (LiveStreamHub) :
+
+    indexeur --PUBLISH iot:live--> worker ASGI (un abonnement Redis)
+                                     |-> client 1 (filtres, tampon borné)
+                                     |-> client 2 ...
+
+Un worker n'ouvre qu'un abonnement Redis, quel que soit le nombre de
+clients, et seulement tant qu'un client est connecté. Chaque message est
+décodé une fois puis filtré par client (data_type, batiment, severite).
+
+Chaque client a un tampon borné : un client lent ne retient ni le worker
+ni les autres clients. Un document réindexé (même _id) remplace sa version
+en attente. Au-delà de la taille du tampon, selon la politique du client :
+
+- drop : les documents les plus anciens sont abandonnés, le client reçoit
+  un événement « dropped » avec leur nombre ;
+- merge : les documents les plus anciens sont résumés en un compteur par
+  type de données (événement « summary »), à recharger par l'API REST.
+
+Le pub/sub Redis ne garde rien : un client (re)connecté ne reçoit que les
+lots suivants, et après une coupure Redis un événement « resync » signale
+que des documents ont pu être manqués. Le client s'abonne d'abord, puis
+charge l'état courant par l'API REST.
+
+Ce module n'importe pas Django.
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import redis
+
+from .schemas import PROJECTION_EXCLUDED_FIELDS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHANNEL = 'iot:live'
+DEFAULT_BUFFER_SIZE = 500
+DEFAULT_MAX_SUBSCRIBERS = 1000
+# Documents par message publié (un gros lot est découpé)
+DEFAULT_MESSAGE_DOCUMENTS = 500
+
+POLICY_DROP = 'drop'
+POLICY_MERGE = 'merge'
+POLICIES = (POLICY_DROP, POLICY_MERGE)
+
+# Champs filtrables par les clients
+FILTER_FIELDS = ('data_type', 'batiment', 'severite')
+
+# Alertes à indexer (et publier) sans attendre la fin du lot
+URGENT_SEVERITIES = ('critique',)
+
+
+class StreamLimitReached(Exception):
+    """Nombre maximal de clients du worker atteint"""
+
+
+def is_urgent(message: Dict[str, Any]) -> bool:
+    """Message de la file d'ingestion à ne pas retenir dans un lot (alerte critique)"""
+    data = message.get('data')
+    return message.get('data_type') == 'alertes' and isinstance(data, dict) \
+        and data.get('severite') in URGENT_SEVERITIES
+
+
+def live_document(action: Dict[str, Any]) -> Dict[str, Any]:
+    """Document diffusé depuis une action bulk : _id, _index et _source sans les champs volumineux"""
+    document = {name: value for name, value in action['_source'].items() if name not in PROJECTION_EXCLUDED_FIELDS}
+    document['_id'] = action['_id']
+    document['_index'] = action['_index']
+    return document
+
+
+class LivePublisher:
+    """Publication des documents indexés sur le canal pub/sub (côté indexeur)"""
+    
+    def __init__(self, client, channel: str = DEFAULT_CHANNEL, message_documents: int = DEFAULT_MESSAGE_DOCUMENTS):
+        self.client = client
+        self.channel = channel
+        self.message_documents = message_documents
+    
+    def publish(self, actions: Iterable[Dict[str, Any]]) -> int:
+        """
+        Publier les actions bulk d'un lot indexé (un aller-retour Redis)
+        
+        Returns:
+            Nombre de documents publiés
+        """
+        documents = [live_document(action) for action in actions]
+        if not documents:
+            return 0
+        pipe = self.client.pipeline(transaction=False)
+        for start in range(0, len(documents), self.message_documents):
+            chunk = documents[start:start + self.message_documents]
+            pipe.publish(self.channel, json.dumps({'documents': chunk}, separators=(',', ':'), default=str))
+        pipe.execute()
+        return len(documents)
+
+
+def parse_filters(values: Dict[str, Any]) -> Dict[str, frozenset]:
+    """Filtres d'un client : {champ: 'a,b'} -> {champ: {'a', 'b'}} (champs vides ignorés)"""
+    filters = {}
+    for field in FILTER_FIELDS:
+        raw = values.get(field)
+        if not raw:
+            continue
+        accepted = frozenset(value.strip() for value in str(raw).split(',') if value.strip())
+        if accepted:
+            filters[field] = accepted
+    return filters
+
+
+class Subscription:
+    """Un client SSE : filtres, tampon borné et signalement des pertes"""
+    
+    def __init__(self, filters: Dict[str, frozenset], buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 policy: str = POLICY_DROP):
+        self.filters = filters
+        self.buffer_size = max(1, buffer_size)
+        self.policy = policy
+        # Clé _index/_id : un document réindexé remplace sa version en attente
+        self._buffer: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._dropped = 0
+        self._merged = Counter()
+        self._resync = False
+        self._wakeup = asyncio.Event()
+    
+    def matches(self, document: Dict[str, Any]) -> bool:
+        return all(str(document.get(field)) in accepted for field, accepted in self.filters.items())
+    
+    def offer(self, documents: List[Dict[str, Any]]) -> int:
+        """
+        Ajouter au tampon les documents qui passent les filtres
+        
+        Returns:
+            Nombre de documents abandonnés ou résumés faute de place
+        """
+        overflow = 0
+        for document in documents:
+            if not self.matches(document):
+                continue
+            key = f"{document.get('_index')}/{document.get('_id')}"
+            self._buffer.pop(key, None)
+            self._buffer[key] = document
+            if len(self._buffer) > self.buffer_size:
+                _, oldest = self._buffer.popitem(last=False)
+                overflow += 1
+                if self.policy == POLICY_MERGE:
+                    self._merged[oldest.get('data_type') or 'unknown'] += 1
+                else:
+                    self._dropped += 1
+        if self._buffer or overflow:
+            self._wakeup.set()
+        return overflow
+    
+    def resync(self) -> None:
+        """Des messages ont pu être manqués (coupure Redis)"""
+        self._resync = True
+        self._wakeup.set()
+    
+    def drain(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Événements en attente, dans l'ordre : resync, pertes, documents"""
+        events = []
+        if self._resync:
+            events.append(('resync', {}))
+        if self._dropped:
+            events.append(('dropped', {'count': self._dropped}))
+        if self._merged:
+            events.append(('summary', {'counts': dict(self._merged)}))
+        if self._buffer:
+            events.append(('documents', {'documents': list(self._buffer.values())}))
+        self._buffer.clear()
+        self._dropped = 0
+        self._merged.clear()
+        self._resync = False
+        self._wakeup.clear()
+        return events
+    
+    async def next_events(self, timeout: float) -> List[Tuple[str, Dict[str, Any]]]:
+        """Attendre des événements au plus timeout secondes ([] : rien de nouveau)"""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        return self.drain()
+
+
+def format_event(event: str, data: Dict[str, Any]) -> str:
+    """Événement SSE (une ligne data JSON)"""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'), default=str)}\n\n"
+
+
+class LiveStreamHub:
+    """
+    Relais du canal pub/sub vers les clients SSE d'un worker
+    
+    L'abonnement Redis est ouvert au premier client et fermé au départ du
+    dernier. Il vit dans la boucle d'événements du worker (client redis.asyncio).
+    """
+    
+    def __init__(
+        self,
+        client,
+        channel: str = DEFAULT_CHANNEL,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+        policy: str = POLICY_DROP,
+        max_subscribers: int = DEFAULT_MAX_SUBSCRIBERS,
+        reconnect_delay: float = 1.0,
+        max_reconnect_delay: float = 30.0,
+    ):
+        self.client = client
+        self.channel = channel
+        self.buffer_size = buffer_size
+        self.policy = policy
+        self.max_subscribers = max_subscribers
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self._after_fork()
+        os.register_at_fork(after_in_child=self._after_fork)
+    
+    def _after_fork(self):
+        # Clients et tâche d'écoute appartiennent à la boucle de ce processus
+        self._subscribers = set()
+        self._task: Optional[asyncio.Task] = None
+        self._counters = Counter()
+    
+    def subscribe(self, filters: Dict[str, frozenset], buffer_size: Optional[int] = None,
+                  policy: Optional[str] = None) -> Subscription:
+        """Nouveau client (à appeler depuis la boucle d'événements)"""
+        if len(self._subscribers) >= self.max_subscribers:
+            self._counters['rejected'] += 1
+            raise StreamLimitReached(f"{self.max_subscribers} clients déjà connectés à ce worker")
+        subscription = Subscription(
+            filters,
+            min(buffer_size or self.buffer_size, self.buffer_size),
+            policy or self.policy
+        )
+        self._subscribers.add(subscription)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._listen())
+        return subscription
+    
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+        if not self._subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+    
+    def dispatch(self, payload: str) -> None:
+        """Répartir un message publié entre les clients"""
+        try:
+            documents = json.loads(payload)['documents']
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Message illisible sur {self.channel}: {e}")
+            return
+        self._counters['messages'] += 1
+        self._counters['documents'] += len(documents)
+        for subscription in self._subscribers:
+            overflow = subscription.offer(documents)
+            if overflow:
+                self._counters[subscription.policy] += overflow
+    
+    async def _listen(self):
+        delay = self.reconnect_delay
+        while self._subscribers:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                logger.info(f"Abonné à {self.channel} ({len(self._subscribers)} clients)")
+                delay = self.reconnect_delay
+                while True:
+                    # Délai explicite : un canal silencieux n'est pas une erreur de lecture
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message is not None and message['type'] == 'message':
+                        self.dispatch(message['data'])
+            except redis.RedisError as e:
+                self._counters['errors'] += 1
+                logger.warning(f"Abonnement à {self.channel} interrompu: {e} (reprise dans {delay:.0f}s)")
+                for subscription in self._subscribers:
+                    subscription.resync()
+            finally:
+                try:
+                    await pubsub.aclose()
+                except redis.RedisError:
+                    pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+    
+    def counters(self) -> Dict[str, int]:
+        """Clients connectés et documents relayés, abandonnés ou résumés par ce worker"""
+        counters = {name: self._counters[name] for name in (
+            'messages', 'documents', POLICY_DROP, POLICY_MERGE, 'rejected', 'errors'
+        )}
+        counters['subscribers'] = len(self._subscribers)
+        return counters
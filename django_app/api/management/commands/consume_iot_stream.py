@@ -0,0 +1,22 @@
+"""
+Consommateur du Redis Stream d'ingestion vers Elasticsearch
+
+Usage:
+    python manage.py consume_iot_stream
+    python manage.py consume_iot_stream --consumer worker-2 --batch-size 1000
+
+Équivaut à run_indexer --transport stream. Plusieurs instances peuvent
+tourner en parallèle : elles appartiennent au même groupe et se partagent
+les entrées du stream.
+"""
+from api.redis_queue import TRANSPORT_STREAM
+
+from .run_indexer import Command as RunIndexerCommand
+
+
+class Command(RunIndexerCommand):
+    help = "Indexe dans Elasticsearch les entrées du Redis Stream d'ingestion (groupe de consommateurs)"
+    
+    def handle(self, *args, **options):
+        options['transport'] = TRANSPORT_STREAM
+        super().handle(*args, **options)
@@ -0,0 +1,39 @@
+"""
+Reprise des uploads abandonnés (voir api/upload_jobs.py)
+
+Usage:
+    python manage.py recover_uploads
+    python manage.py recover_uploads --stale-after 60
+    python manage.py recover_uploads --fail
+
+Les uploads sont traités par un pool de threads du processus web : après
+un redémarrage ou un déploiement, ceux qui étaient en attente ou en cours
+restent 'pending'/'processing'. Cette commande, lancée au démarrage du
+conteneur, les retraite depuis leur fichier stocké (ou les marque en échec
+avec --fail, ou si le fichier a disparu).
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.upload_jobs import process_upload, recover_uploads
+
+
+class Command(BaseCommand):
+    help = "Reprend ou marque en échec les uploads abandonnés par un processus arrêté"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--stale-after', type=float, default=settings.UPLOAD_STALE_AFTER,
+                            help="Secondes sans progression au-delà desquelles un upload est abandonné")
+        parser.add_argument('--fail', action='store_true', help="Marquer en échec au lieu de retraiter")
+    
+    def handle(self, *args, **options):
+        recovered = recover_uploads(options['stale_after'], resubmit=not options['fail'])
+        for upload_id in recovered['failed']:
+            self.stdout.write(self.style.WARNING(f"❌ Upload {upload_id} marqué en échec"))
+        # Traitement dans ce processus : le pool du processus web ne connaît pas ces uploads
+        for upload_id in recovered['resubmitted']:
+            self.stdout.write(f"🔄 Reprise de l'upload {upload_id}")
+            process_upload(upload_id)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(recovered['resubmitted'])} uploads repris, {len(recovered['failed'])} en échec"
+        ))
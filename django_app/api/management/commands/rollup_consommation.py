@@ -0,0 +1,75 @@
+"""
+Rollups horaires et journaliers de la consommation (voir api/rollups.py)
+
+Usage:
+    python manage.py rollup_consommation
+    python manage.py rollup_consommation --every 300
+    python manage.py rollup_consommation --since 2024-01-01
+    python manage.py rollup_consommation --since 2024-01-01 --until 2024-03-31
+    python manage.py rollup_consommation --reset
+
+Sans option, agrège les relevés de iot-consommation depuis le dernier
+point de contrôle, ainsi que les jours déjà agrégés qui ont reçu des
+relevés depuis le passage précédent, puis s'arrête (tâche planifiée).
+--every relance le job toutes les N secondes. --since recalcule une
+période déjà agrégée (relevés indexés avant le pipeline d'ingestion de
+manage.py setup_elasticsearch). --reset supprime les rollups : les
+statistiques reviennent aux relevés bruts jusqu'au prochain job.
+"""
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.clients import elasticsearch_client
+from api.rollups import delete_rollups, run_rollup
+
+
+def parse_date(value):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Date invalide: {value} (format AAAA-MM-JJ[THH:MM])")
+
+
+class Command(BaseCommand):
+    help = "Agrège la consommation en rollups horaires et journaliers"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=parse_date, help="Recalculer depuis cette date (UTC)")
+        parser.add_argument('--until', type=parse_date, help="Recalculer jusqu'à cette date incluse (UTC)")
+        parser.add_argument('--delay', type=int, default=settings.ROLLUP_DELAY_MINUTES,
+                            help="Minutes laissées à l'ingestion avant d'agréger une heure")
+        parser.add_argument('--every', type=int, nargs='?', const=settings.ROLLUP_INTERVAL, default=0,
+                            help="Relancer le job toutes les N secondes")
+        parser.add_argument('--reset', action='store_true', help="Supprimer les rollups et le point de contrôle")
+    
+    def handle(self, *args, **options):
+        es = elasticsearch_client
+        
+        if options['reset']:
+            deleted = delete_rollups(es)
+            self.stdout.write(self.style.SUCCESS(f"🗑️  Rollups supprimés: {', '.join(deleted) or 'aucun'}"))
+            return
+        
+        since, until = options['since'], options['until']
+        while True:
+            try:
+                summary = run_rollup(es, since=since, until=until, delay=timedelta(minutes=options['delay']))
+            except Exception as e:
+                if not options['every']:
+                    raise CommandError(f"Rollup impossible: {e}")
+                self.stderr.write(f"❌ Rollup impossible: {e}")
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"✅ {summary['days']} jour(s) agrégé(s) depuis {summary['start']} "
+                    f"(dont {summary['late_days']} recalculé(s) pour des relevés tardifs): "
+                    f"{summary['hourly']} rollups horaires, {summary['daily']} journaliers, "
+                    f"point de contrôle {summary['checkpoint']}"
+                ))
+                # Les passages suivants reprennent au point de contrôle
+                since = until = None
+            if not options['every']:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,107 @@
+"""
+Indexeur Redis -> Elasticsearch (remplace le pipeline Logstash)
+
+Usage:
+    python manage.py run_indexer
+    python manage.py run_indexer --batch-size 10000 --workers 4 --flush-interval 2
+    python manage.py run_indexer --transport stream --consumer worker-2
+
+Plusieurs instances peuvent tourner en parallèle : chaque message de la
+liste n'est dépilé qu'une fois, et les consommateurs du stream appartiennent
+au même groupe.
+
+Chaque lot indexé est publié sur le canal du flux temps réel
+(LIVE_STREAM_CHANNEL, /api/stream/), sauf avec --no-publish ; une alerte
+critique clôt alors son lot sans attendre --flush-interval.
+"""
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.clients import elasticsearch_client, redis_client
+from api.dead_letters import DeadLetterQueue
+from api.index_lifecycle import ALIAS_LEGACY, setup_indices
+from api.indexer import BulkIndexer, ListSource, StreamSource
+from api.live_stream import LivePublisher, is_urgent
+from api.redis_queue import TRANSPORT_LIST, TRANSPORT_STREAM
+from api.redis_streams import StreamConsumer
+from api.stats_cache import StatsCache
+
+
+class Command(BaseCommand):
+    help = "Indexe dans Elasticsearch les messages de la file Redis d'ingestion"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--transport', choices=[TRANSPORT_LIST, TRANSPORT_STREAM],
+                            default=settings.REDIS_TRANSPORT)
+        parser.add_argument('--batch-size', type=int, default=settings.INDEXER_BATCH_SIZE)
+        parser.add_argument('--flush-interval', type=float, default=settings.INDEXER_FLUSH_INTERVAL)
+        parser.add_argument('--workers', type=int, default=settings.INDEXER_WORKERS)
+        parser.add_argument('--chunk-size', type=int, default=settings.INDEXER_CHUNK_SIZE,
+                            help="Documents par requête bulk")
+        parser.add_argument('--max-retries', type=int, default=settings.INDEXER_MAX_RETRIES,
+                            help="Nouvelles tentatives des documents refusés temporairement (429, 5xx)")
+        parser.add_argument('--consumer', help="Nom du consommateur du stream (défaut: hôte-pid)")
+        parser.add_argument('--claim-idle-ms', type=int, default=settings.REDIS_STREAM_CLAIM_IDLE_MS)
+        parser.add_argument('--allow-legacy', action='store_true',
+                            help="Écrire dans les index d'avant le registre (mapping dynamique) sans les migrer")
+        parser.add_argument('--no-publish', dest='publish', action='store_false', default=settings.LIVE_STREAM_PUBLISH,
+                            help="Ne pas publier les documents indexés sur le flux temps réel")
+    
+    def handle(self, *args, **options):
+        # Clients du registre : pools, délais et reprises de settings.py
+        client = redis_client
+        es = elasticsearch_client
+        # Alias iot-<type> en place avant la première écriture (sinon un index
+        # concret serait créé hors rollover) ; en cas d'échec le conteneur redémarre
+        try:
+            states = setup_indices(es)
+        except Exception as e:
+            raise CommandError(f"Initialisation des index Elasticsearch impossible: {e}")
+        legacy = [data_type for data_type, state in states.items() if state == ALIAS_LEGACY]
+        if legacy and not options['allow_legacy']:
+            raise CommandError(
+                f"Index d'avant le registre ({', '.join(legacy)}) : lancer manage.py setup_elasticsearch "
+                f"--reindex, ou relancer avec --allow-legacy"
+            )
+        dlq = DeadLetterQueue(client, key=settings.REDIS_DLQ_KEY)
+        
+        if options['transport'] == TRANSPORT_STREAM:
+            source = StreamSource(StreamConsumer(
+                client,
+                key=settings.REDIS_STREAM_KEY,
+                group=settings.REDIS_STREAM_GROUP,
+                consumer=options['consumer'],
+                claim_idle_ms=options['claim_idle_ms'],
+                dlq=dlq,
+            ))
+        else:
+            source = ListSource(client, key=settings.REDIS_QUEUE_KEY, dlq=dlq)
+        publish = options['publish']
+        
+        indexer = BulkIndexer(
+            es,
+            source,
+            batch_size=options['batch_size'],
+            flush_interval=options['flush_interval'],
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+            dlq=dlq,
+            max_retries=options['max_retries'],
+            initial_backoff=settings.INDEXER_INITIAL_BACKOFF,
+            max_backoff=settings.INDEXER_MAX_BACKOFF,
+            cache=StatsCache(client, prefix=settings.STATS_CACHE_PREFIX, ttl=settings.STATS_CACHE_TTL),
+            publisher=LivePublisher(client, channel=settings.LIVE_STREAM_CHANNEL) if publish else None,
+            urgent=is_urgent if publish else None,
+        )
+        
+        # Arrêt propre : le lot en cours est indexé avant de sortir
+        signal.signal(signal.SIGTERM, lambda *_: indexer.stop())
+        signal.signal(signal.SIGINT, lambda *_: indexer.stop())
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexeur sur {source.key} ({options['transport']}) -> {settings.ELASTICSEARCH_URL}"
+        ))
+        stats = indexer.run()
+        self.stdout.write(f"{stats['indexed']} documents indexés, {stats['failed']} rejetés")
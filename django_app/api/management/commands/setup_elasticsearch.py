@@ -0,0 +1,93 @@
+"""
+Installation des index iot-* : politique de rollover, templates et alias
+
+Usage:
+    python manage.py setup_elasticsearch
+    python manage.py setup_elasticsearch --reindex
+    python manage.py setup_elasticsearch --wait 120
+    python manage.py setup_elasticsearch --print
+    python manage.py setup_elasticsearch --backfill-search
+
+Crée pour chaque type l'index iot-<type>-000001 derrière l'alias iot-<type>
+(voir api/index_lifecycle.py). --reindex migre les index concrets iot-<type>
+créés avant le rollover ; arrêter l'ingestion pendant la migration.
+--backfill-search alimente le champ de recherche search_all des documents
+indexés avant son ajout (update_by_query en tâche de fond).
+"""
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.clients import elasticsearch_client
+from api.index_lifecycle import (
+    ALIAS_LEGACY,
+    backfill_search_field,
+    lifecycle_policy,
+    migrate_legacy_index,
+    setup_indices,
+)
+from api.schemas import index_templates
+
+
+class Command(BaseCommand):
+    help = "Installe la politique de rollover, les templates et les alias des index iot-*"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--reindex', action='store_true',
+                            help="Migrer les index concrets iot-<type> vers iot-<type>-000001 + alias")
+        parser.add_argument('--backfill-search', action='store_true',
+                            help="Alimenter search_all pour les documents déjà indexés")
+        parser.add_argument('--wait', type=int, default=0,
+                            help="Attendre Elasticsearch jusqu'à N secondes")
+        parser.add_argument('--print', action='store_true', dest='print_only',
+                            help="Afficher la politique et les templates sans contacter Elasticsearch")
+    
+    def handle(self, *args, **options):
+        policy = lifecycle_policy(
+            max_size=settings.ELASTICSEARCH_ROLLOVER_MAX_SIZE,
+            max_age=settings.ELASTICSEARCH_ROLLOVER_MAX_AGE,
+            retention=settings.ELASTICSEARCH_RETENTION,
+        )
+        if options['print_only']:
+            self.stdout.write(json.dumps({'policy': policy, **index_templates()}, indent=2, ensure_ascii=False))
+            return
+        
+        es = elasticsearch_client
+        deadline = time.monotonic() + options['wait']
+        while not es.ping():
+            if time.monotonic() >= deadline:
+                raise CommandError(f"Elasticsearch injoignable: {settings.ELASTICSEARCH_URL}")
+            time.sleep(2)
+        
+        states = setup_indices(es, policy)
+        for data_type, state in states.items():
+            self.stdout.write(f"   iot-{data_type}: {state}")
+        self.stdout.write(self.style.SUCCESS("✅ Politique de rollover, templates et alias installés"))
+        
+        legacy = [data_type for data_type, state in states.items() if state == ALIAS_LEGACY]
+        if legacy and not options['reindex']:
+            self.stdout.write(self.style.WARNING(
+                f"⚠️  Index concrets à migrer ({', '.join(legacy)}) : relancer avec --reindex"
+            ))
+        if options['reindex']:
+            for data_type in legacy:
+                self.stdout.write(f"🔄 Migration de iot-{data_type}...")
+                result = migrate_legacy_index(es, data_type)
+                failures = result.get('failures') or []
+                if failures:
+                    self.stdout.write(self.style.WARNING(
+                        f"⚠️  iot-{data_type}: {len(failures)} documents non copiés, index conservé"
+                    ))
+                else:
+                    self.stdout.write(self.style.SUCCESS(
+                        f"✅ iot-{data_type}: {result.get('total', 0)} documents migrés"
+                    ))
+        
+        if options['backfill_search']:
+            for data_type, state in states.items():
+                if state == ALIAS_LEGACY:
+                    continue
+                task = backfill_search_field(es, data_type)
+                self.stdout.write(f"🔄 iot-{data_type}: search_all en cours d'alimentation (tâche {task})")
@@ -0,0 +1,436 @@
+"""
+Métriques de performance de l'API, au format texte Prometheus
+
+Chaque processus (worker gunicorn) accumule ses mesures en mémoire, puis
+les ajoute toutes les flush_interval secondes à un hash Redis commun
+(HINCRBYFLOAT, une seule requête pipeline) : /metrics lit ce hash et
+additionne donc les mesures de tous les workers, quel que soit celui qui
+répond. Si Redis est indisponible, les mesures restent en mémoire jusqu'à
+l'envoi suivant ; sans client Redis, elles restent locales au processus.
+Chaque instance qui partage le même Redis renvoie le même total : une
+seule cible de scrape suffit (le Service, pas chaque pod).
+
+Les histogrammes sont cumulatifs dès l'enregistrement (un compteur par
+borne le="..."), comme l'attend le format Prometheus.
+
+Les compteurs et jauges propres à un worker (cache des recherches, flux
+temps réel, pools clients) sont relevés à chaque envoi (process_collector),
+par un thread par processus : la progression des compteurs rejoint le hash
+commun, les jauges vont dans un hash par processus qui expire si le worker
+disparaît. /metrics additionne les jauges de tous les processus vivants,
+sans label pid.
+
+Le temps Elasticsearch d'une requête HTTP est suivi par contexte
+(request_context) : InstrumentedElasticsearch y ajoute chaque appel, le
+middleware (middleware.py) le lit en fin de requête.
+
+Ce module n'importe pas Django.
+"""
+import contextvars
+import inspect
+import logging
+import math
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METRICS_KEY = 'iot:metrics'
+DEFAULT_FLUSH_INTERVAL = 5.0
+# Durée de vie des jauges d'un processus, en envois manqués
+GAUGE_TTL_FLUSHES = 3
+
+# Bornes des histogrammes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024, 100 * 1024 * 1024)
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+# Familles de métriques : nom -> (type, description, bornes)
+FAMILIES = {
+    'iot_http_request_duration_seconds': (
+        HISTOGRAM, "Durée des requêtes HTTP par endpoint", LATENCY_BUCKETS),
+    'iot_http_response_bytes': (
+        HISTOGRAM, "Taille des réponses HTTP par endpoint", SIZE_BUCKETS),
+    'iot_http_es_seconds_total': (
+        COUNTER, "Temps passé dans Elasticsearch (aller-retour) par endpoint", None),
+    'iot_es_request_duration_seconds': (
+        HISTOGRAM, "Durée aller-retour des appels Elasticsearch", LATENCY_BUCKETS),
+    'iot_es_took_seconds': (
+        HISTOGRAM, "Temps de traitement côté Elasticsearch (took)", LATENCY_BUCKETS),
+    'iot_es_errors_total': (
+        COUNTER, "Appels Elasticsearch en erreur", None),
+    'iot_query_cache_requests_total': (
+        COUNTER, "Recherches Elasticsearch par issue (cache des recherches)", None),
+    'iot_query_cache_evictions_total': (
+        COUNTER, "Réponses évincées du cache des recherches", None),
+    'iot_query_cache_entries': (
+        GAUGE, "Réponses dans le cache des recherches", None),
+    'iot_live_stream_subscribers': (
+        GAUGE, "Clients connectés au flux temps réel", None),
+    'iot_live_stream_documents_total': (
+        COUNTER, "Documents reçus du canal du flux temps réel", None),
+    'iot_live_stream_overflow_total': (
+        COUNTER, "Documents abandonnés ou résumés faute de place", None),
+    'iot_live_stream_rejected_total': (
+        COUNTER, "Connexions refusées (LIVE_STREAM_MAX_CLIENTS)", None),
+    'iot_client_pool_connections': (
+        GAUGE, "Connexions des pools clients", None),
+    'iot_client_pool_max_connections': (
+        GAUGE, "Taille maximale des pools clients", None),
+}
+
+# Contexte de la requête HTTP en cours (temps Elasticsearch, échantillonnage)
+_request = contextvars.ContextVar('iot_request_metrics', default=None)
+
+
+class RequestContext:
+    """Mesures d'une requête HTTP, partagées entre middleware et client Elasticsearch"""
+    
+    __slots__ = ('endpoint', 'sampled', 'es_seconds', 'es_took', 'es_calls')
+    
+    def __init__(self, sampled: bool = False):
+        self.endpoint = 'unmatched'
+        self.sampled = sampled
+        self.es_seconds = 0.0
+        self.es_took = 0.0
+        self.es_calls = 0
+
+
+def request_context() -> Optional[RequestContext]:
+    return _request.get()
+
+
+def start_request(sampled: bool = False) -> Tuple[RequestContext, contextvars.Token]:
+    context = RequestContext(sampled)
+    return context, _request.set(context)
+
+
+def end_request(token: contextvars.Token) -> None:
+    _request.reset(token)
+
+
+def debug_sampled() -> bool:
+    """La requête en cours est-elle échantillonnée pour les logs détaillés ?"""
+    context = _request.get()
+    return context is not None and context.sampled
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_le(bound: float) -> str:
+    if math.isinf(bound):
+        return '+Inf'
+    return repr(float(bound)) if isinstance(bound, float) else str(bound)
+
+
+def process_name() -> str:
+    """Identifiant du processus courant (hôte-pid), partagé entre pods"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def sample_name(name: str, labels: Dict[str, Any]) -> str:
+    """Nom d'échantillon Prometheus : nom{label="valeur",...}"""
+    if not labels:
+        return name
+    pairs = ','.join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items()))
+    return f'{name}{{{pairs}}}'
+
+
+def _sort_key(sample: str):
+    # Bornes le dans l'ordre numérique, +Inf en dernier
+    name, _, rest = sample.partition('{')
+    if 'le="' in rest:
+        before, _, after = rest.partition('le="')
+        bound, _, tail = after.partition('"')
+        value = math.inf if bound == '+Inf' else float(bound)
+        return name, before + tail, value
+    return name, rest, 0.0
+
+
+class Metrics:
+    """Registre de compteurs et d'histogrammes, agrégé dans Redis"""
+    
+    def __init__(
+        self,
+        client=None,
+        key: str = DEFAULT_METRICS_KEY,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL
+    ):
+        self.client = client
+        self.key = key
+        self.flush_interval = flush_interval
+        self._pending = defaultdict(float)
+        self._local = defaultdict(float)
+        self._last_flush = time.monotonic()
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Dict[str, Any], float]]]] = []
+        self._process_collectors: List[Callable[[], Iterable[Tuple[str, Dict[str, Any], float]]]] = []
+        self._after_fork()
+        os.register_at_fork(after_in_child=self._after_fork)
+    
+    def _after_fork(self):
+        # Le thread du parent n'existe pas dans l'enfant, qui publie ses propres jauges
+        self._lock = threading.Lock()
+        self._collect_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._reported = {}
+        self._gauges = {}
+    
+    @property
+    def gauges_key(self) -> str:
+        return f'{self.key}:process:{process_name()}'
+    
+    def start(self) -> None:
+        """Envoyer les mesures toutes les flush_interval secondes, même sans requête"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='metrics-flush', daemon=True)
+            self._thread.start()
+    
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Envoi des métriques impossible: {e}")
+    
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        with self._lock:
+            self._pending[sample_name(name, labels)] += value
+        self._maybe_flush()
+    
+    def observe(self, name: str, value: float, **labels) -> None:
+        buckets = FAMILIES[name][2]
+        with self._lock:
+            for bound in buckets:
+                if value <= bound:
+                    self._pending[sample_name(f'{name}_bucket', {**labels, 'le': _format_le(bound)})] += 1
+            self._pending[sample_name(f'{name}_bucket', {**labels, 'le': '+Inf'})] += 1
+            self._pending[sample_name(f'{name}_sum', labels)] += value
+            self._pending[sample_name(f'{name}_count', labels)] += 1
+        self._maybe_flush()
+    
+    def collector(self, collect: Callable[[], Iterable[Tuple[str, str, str, Dict[str, Any], float]]]):
+        """
+        Ajouter des métriques lues à chaque rendu de /metrics
+        
+        collect() produit des tuples (nom, type, description, labels, valeur),
+        par exemple la longueur de la file Redis.
+        """
+        self._collectors.append(collect)
+        return collect
+    
+    def process_collector(self, collect: Callable[[], Iterable[Tuple[str, Dict[str, Any], float]]]):
+        """
+        Ajouter des mesures propres au processus, relevées à chaque envoi
+        
+        collect() produit des tuples (nom, labels, valeur) d'une famille de
+        FAMILIES : un compteur (valeur cumulée du processus) est ajouté au
+        total commun pour sa progression depuis le relevé précédent, une
+        jauge est publiée pour ce processus et additionnée à la lecture.
+        """
+        self._process_collectors.append(collect)
+        return collect
+    
+    def _collect_process(self) -> Dict[str, float]:
+        """Relever les collecteurs du processus : progression des compteurs en attente, jauges retournées"""
+        gauges = {}
+        # Un relevé à la fois : la progression d'un compteur n'est comptée qu'une fois
+        with self._collect_lock:
+            for collect in self._process_collectors:
+                try:
+                    collected = list(collect())
+                except Exception as e:
+                    logger.warning(f"Collecte de métriques impossible: {e}")
+                    continue
+                for name, labels, value in collected:
+                    sample = sample_name(name, labels)
+                    if FAMILIES[name][0] == GAUGE:
+                        gauges[sample] = gauges.get(sample, 0.0) + value
+                        continue
+                    previous = self._reported.get(sample, 0.0)
+                    # Compteur remis à zéro dans le processus : tout est nouveau
+                    delta = value - previous if value >= previous else value
+                    self._reported[sample] = value
+                    if delta:
+                        with self._lock:
+                            self._pending[sample] += delta
+        return gauges
+    
+    def _maybe_flush(self) -> None:
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+    
+    def flush(self) -> None:
+        """Ajouter les mesures en attente au hash Redis (ou au total local)"""
+        gauges = self._collect_process()
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(float)
+            self._last_flush = time.monotonic()
+            self._gauges = gauges
+        if not pending and not gauges:
+            return
+        if self.client is None:
+            with self._lock:
+                for sample, value in pending.items():
+                    self._local[sample] += value
+            return
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for sample, value in pending.items():
+                pipe.hincrbyfloat(self.key, sample, value)
+            if gauges:
+                key = self.gauges_key
+                pipe.delete(key)
+                pipe.hset(key, mapping=gauges)
+                pipe.expire(key, math.ceil(self.flush_interval * GAUGE_TTL_FLUSHES))
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Envoi des métriques impossible: {e}")
+            with self._lock:
+                for sample, value in pending.items():
+                    self._pending[sample] += value
+    
+    def samples(self) -> Dict[str, float]:
+        """Toutes les mesures enregistrées (tous workers si Redis est configuré)"""
+        self.flush()
+        if self.client is None:
+            with self._lock:
+                return {**self._local, **self._gauges}
+        samples = {sample: float(value) for sample, value in self.client.hgetall(self.key).items()}
+        # Jauges des processus vivants (les hash des processus arrêtés ont expiré)
+        keys = list(self.client.scan_iter(match=f'{self.key}:process:*', count=100))
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.hgetall(key)
+        for gauges in pipe.execute() if keys else []:
+            for sample, value in gauges.items():
+                samples[sample] = samples.get(sample, 0.0) + float(value)
+        return samples
+    
+    def reset(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self._local.clear()
+        if self.client is not None:
+            self.client.delete(self.key, *self.client.scan_iter(match=f'{self.key}:process:*', count=100))
+    
+    def render(self) -> str:
+        """Exposition au format texte Prometheus (version 0.0.4)"""
+        lines = []
+        samples = self.samples()
+        for family, (kind, description, _) in FAMILIES.items():
+            names = {family} if kind != HISTOGRAM else {f'{family}_bucket', f'{family}_sum', f'{family}_count'}
+            family_samples = sorted(
+                (sample for sample in samples if sample.partition('{')[0] in names), key=_sort_key
+            )
+            lines.append(f'# HELP {family} {description}')
+            lines.append(f'# TYPE {family} {kind}')
+            lines.extend(f'{sample} {_format_value(samples[sample])}' for sample in family_samples)
+        
+        for collect in self._collectors:
+            try:
+                collected = list(collect())
+            except Exception as e:
+                logger.warning(f"Collecte de métriques impossible: {e}")
+                continue
+            described = set()
+            for name, kind, description, labels, value in collected:
+                if name not in described:
+                    lines.append(f'# HELP {name} {description}')
+                    lines.append(f'# TYPE {name} {kind}')
+                    described.add(name)
+                lines.append(f'{sample_name(name, labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _format_value(value: Optional[float]) -> str:
+    if value is None:
+        return 'NaN'
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class InstrumentedElasticsearch:
+    """
+    Client Elasticsearch mesuré : durée aller-retour et took de chaque appel
+    
+    Enveloppe un client elasticsearch-py, synchrone ou AsyncElasticsearch
+    (les appels renvoient alors une coroutine, mesurée jusqu'à sa fin). Les
+    appels de premier niveau (search, msearch, count, open_point_in_time...)
+    sont mesurés, les espaces de noms (indices, cat, ilm...) et options()
+    sont transmis tels quels.
+    """
+    
+    def __init__(self, client, metrics: Metrics):
+        self._client = client
+        self._metrics = metrics
+    
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if name == 'options' or not callable(attribute):
+            return attribute
+        
+        def timed(*args, **kwargs):
+            context = _request.get()
+            start = time.perf_counter()
+            try:
+                result = attribute(*args, **kwargs)
+            except Exception:
+                self._record(name, context, start, error=True)
+                raise
+            if inspect.isawaitable(result):
+                return self._timed_await(name, context, start, result)
+            self._record(name, context, start, result)
+            return result
+        
+        return timed
+    
+    async def _timed_await(self, name, context, start, awaitable):
+        try:
+            result = await awaitable
+        except Exception:
+            self._record(name, context, start, error=True)
+            raise
+        self._record(name, context, start, result)
+        return result
+    
+    def _record(self, name: str, context: Optional[RequestContext], start: float, result=None, error: bool = False):
+        elapsed = time.perf_counter() - start
+        endpoint = context.endpoint if context is not None else 'none'
+        if error:
+            self._metrics.inc('iot_es_errors_total', operation=name, endpoint=endpoint)
+        self._metrics.observe('iot_es_request_duration_seconds', elapsed, operation=name, endpoint=endpoint)
+        if context is not None:
+            context.es_seconds += elapsed
+            context.es_calls += 1
+        
+        took = _took(result)
+        if took is not None:
+            self._metrics.observe('iot_es_took_seconds', took, operation=name, endpoint=endpoint)
+            if context is not None:
+                context.es_took += took
+
+
+def _took(result) -> Optional[float]:
+    """took (ms) d'une réponse Elasticsearch, en secondes"""
+    try:
+        took = result['took']
+    except (KeyError, TypeError, IndexError, AttributeError):
+        return None
+    return took / 1000 if isinstance(took, (int, float)) else None
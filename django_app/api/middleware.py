@@ -0,0 +1,115 @@
+"""
+Middleware de mesure des requêtes HTTP (voir metrics.py)
+
+Pour chaque requête : durée par endpoint (nom de route Django, pas le
+chemin brut), taille de la réponse, temps passé dans Elasticsearch, et un
+en-tête Server-Timing (es, app) lisible dans les outils de développement
+du navigateur. Une fraction REQUEST_DEBUG_SAMPLE_RATE des requêtes est
+journalisée en détail.
+
+Synchrone sous WSGI, asynchrone sous ASGI (config/asgi.py).
+"""
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import end_request, start_request
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsMiddleware:
+    """Mesure la durée, la taille et le temps Elasticsearch de chaque requête"""
+    
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Sous ASGI, la chaîne est asynchrone : pas de passage par un thread
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        # Import tardif : les vues ouvrent les connexions Redis/Elasticsearch
+        from .views import health, metrics
+        self.metrics = metrics
+        self.health = health
+    
+    def __call__(self, request):
+        # Santé et état des index vérifiés en arrière-plan dans chaque worker, même sans sonde
+        self.health.start()
+        # Mesures propres au worker (jauges, compteurs) publiées même sans requête
+        self.metrics.start()
+        if self.async_mode:
+            return self.__acall__(request)
+        sampled = random.random() < settings.REQUEST_DEBUG_SAMPLE_RATE
+        context, token = start_request(sampled)
+        request.metrics_context = context
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request(token)
+        return self._record(request, response, context, time.perf_counter() - start)
+    
+    async def __acall__(self, request):
+        sampled = random.random() < settings.REQUEST_DEBUG_SAMPLE_RATE
+        context, token = start_request(sampled)
+        request.metrics_context = context
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_request(token)
+        return self._record(request, response, context, time.perf_counter() - start)
+    
+    def _record(self, request, response, context, elapsed):
+        labels = {'endpoint': context.endpoint, 'method': request.method}
+        self.metrics.observe('iot_http_request_duration_seconds', elapsed,
+                             status=response.status_code, **labels)
+        if context.es_calls:
+            self.metrics.inc('iot_http_es_seconds_total', context.es_seconds, endpoint=context.endpoint)
+        response['Server-Timing'] = (
+            f'es;dur={context.es_seconds * 1000:.1f};desc="{context.es_calls} appel(s)", '
+            f'app;dur={(elapsed - context.es_seconds) * 1000:.1f}'
+        )
+        
+        if response.streaming:
+            # Taille connue à la fin du flux seulement (exports)
+            if response.is_async:
+                response.streaming_content = self._acount_bytes(response.streaming_content, labels)
+            else:
+                response.streaming_content = self._count_bytes(response.streaming_content, labels)
+        else:
+            self.metrics.observe('iot_http_response_bytes', len(response.content), **labels)
+        
+        if context.sampled:
+            logger.info(
+                f"⏱️  {request.method} {request.path} -> {response.status_code} en {elapsed * 1000:.1f} ms "
+                f"(Elasticsearch {context.es_seconds * 1000:.1f} ms dont took {context.es_took * 1000:.1f} ms, "
+                f"{context.es_calls} appel(s))"
+            )
+        return response
+    
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Nom de route : cardinalité bornée, contrairement au chemin (/api/devices/<id>/)
+        match = request.resolver_match
+        request.metrics_context.endpoint = match.url_name or match.route or 'unnamed'
+        return None
+    
+    def _count_bytes(self, content, labels):
+        size = 0
+        for chunk in content:
+            size += len(chunk)
+            yield chunk
+        self.metrics.observe('iot_http_response_bytes', size, **labels)
+    
+    async def _acount_bytes(self, content, labels):
+        size = 0
+        async for chunk in content:
+            size += len(chunk)
+            yield chunk
+        self.metrics.observe('iot_http_response_bytes', size, **labels)
@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 07:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='fileuploadhistory',
+            name='file_type',
+            field=models.CharField(choices=[('csv', 'CSV'), ('json', 'JSON'), ('ndjson', 'NDJSON')], max_length=10),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1 on 2026-10-18 07:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_alter_fileuploadhistory_file_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileuploadhistory',
+            name='bytes_processed',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='fileuploadhistory',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='fileuploadhistory',
+            name='data_type',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='fileuploadhistory',
+            name='file_size',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='fileuploadhistory',
+            name='records_processed',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='fileuploadhistory',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='fileuploadhistory',
+            name='stored_file',
+            field=models.FileField(blank=True, null=True, upload_to='uploads/'),
+        ),
+    ]
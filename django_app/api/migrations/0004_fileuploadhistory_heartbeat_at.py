@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_fileuploadhistory_async_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileuploadhistory',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
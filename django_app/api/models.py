@@ -9,7 +9,7 @@ class FileUploadHistory(models.Model):
     """Historique des fichiers uploadés"""
     
     filename = models.CharField(max_length=255)
-    file_type = models.CharField(max_length=10, choices=[('csv', 'CSV'), ('json', 'JSON')])
+    file_type = models.CharField(max_length=10, choices=[('csv', 'CSV'), ('json', 'JSON'), ('ndjson', 'NDJSON')])
     records_count = models.IntegerField()
     uploaded_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(
@@ -24,6 +24,17 @@ class FileUploadHistory(models.Model):
     )
     error_message = models.TextField(blank=True, null=True)
     
+    # Traitement asynchrone : fichier stocké en attente et progression
+    data_type = models.CharField(max_length=50, blank=True, default='')
+    stored_file = models.FileField(upload_to='uploads/', blank=True, null=True)
+    file_size = models.BigIntegerField(default=0)
+    bytes_processed = models.BigIntegerField(default=0)
+    records_processed = models.IntegerField(default=0)
+    started_at = models.DateTimeField(blank=True, null=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+    # Dernier signe de vie du traitement (voir upload_jobs.recover_uploads)
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    
     class Meta:
         db_table = 'file_upload_history'
         ordering = ['-uploaded_at']
@@ -32,6 +43,15 @@ class FileUploadHistory(models.Model):
     
     def __str__(self):
         return f"{self.filename} - {self.uploaded_at}"
+    
+    @property
+    def progress_percent(self):
+        """Avancement en pourcentage des octets lus (None si taille inconnue)"""
+        if self.status == 'completed':
+            return 100.0
+        if not self.file_size:
+            return None
+        return round(min(self.bytes_processed / self.file_size, 1.0) * 100, 1)
 
 
 class ElasticsearchQuery(models.Model):
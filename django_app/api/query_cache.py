@@ -0,0 +1,182 @@
+"""
+Coalescence et cache court des recherches Elasticsearch identiques
+
+Quand une alerte se déclenche, des dizaines d'écrans envoient la même
+requête dans la même seconde. QueryCache, propre à chaque processus, se
+place devant l'appel Elasticsearch :
+
+- coalescence (single-flight) : une requête identique (même index, même
+  corps normalisé) déjà en cours n'est pas relancée, les appels suivants
+  attendent et reçoivent sa réponse ;
+- cache LRU : la réponse est gardée ttl secondes, max_entries réponses au
+  plus (les moins récemment lues sont évincées).
+
+La réponse brute d'Elasticsearch est partagée entre les appelants : elle
+ne doit pas être modifiée (ElasticsearchService construit ses propres
+dictionnaires à partir des hits). Les exceptions sont transmises à tous
+les appels coalescés et ne sont jamais mises en cache ; l'annulation d'un
+appel (client déconnecté) ne concerne que lui.
+
+Les compteurs (hits, misses, coalesced, evictions) servent à régler
+max_entries et ttl. Deux variantes partagent le cache et les compteurs :
+get_or_call (threads, vues synchrones) et aget_or_call (vues asynchrones).
+
+Ce module n'importe pas Django.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_TTL = 2.0
+
+
+class _Flight:
+    """Appel en cours, attendu par les requêtes identiques"""
+    
+    __slots__ = ('done', 'result', 'error')
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class QueryCache:
+    """
+    Coalescence des appels identiques en cours et LRU borné dans le temps
+    
+    max_entries ou ttl à 0 : coalescence seule, sans mise en cache.
+    """
+    
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._after_fork()
+        os.register_at_fork(after_in_child=self._after_fork)
+    
+    def _after_fork(self):
+        # Chaque worker a son propre cache (le verrou du parent peut être pris)
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._flights: Dict[str, _Flight] = {}
+        self._async_flights: Dict[str, asyncio.Task] = {}
+        self._counters = Counter()
+    
+    @staticmethod
+    def key(index: str, body: Dict[str, Any]) -> str:
+        """Clé d'une recherche : index et corps normalisé (clés triées)"""
+        payload = json.dumps([index, body], sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+    
+    def _lookup(self, key: str):
+        # Appelé sous self._lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires, value = entry
+        if expires <= time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        self._counters['hits'] += 1
+        return True, value
+    
+    def _store(self, key: str, value: Any):
+        # Appelé sous self._lock
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters['evictions'] += 1
+    
+    def get_or_call(self, key: str, call: Callable[[], Any]) -> Any:
+        """Réponse en cache, celle de l'appel identique en cours, ou call()"""
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                return value
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._counters['misses'] += 1
+            else:
+                self._counters['coalesced'] += 1
+        
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        
+        try:
+            flight.result = call()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                if flight.error is None:
+                    self._store(key, flight.result)
+            flight.done.set()
+        return flight.result
+    
+    async def aget_or_call(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Comme get_or_call ; call est une coroutine (même boucle d'événements)
+        
+        L'appel partagé tourne dans sa propre tâche, attendue via shield par
+        tous les appelants, le premier compris : l'annulation de l'un d'eux
+        (client déconnecté) n'annule ni l'appel ni les autres appelants.
+        """
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                return value
+            task = self._async_flights.get(key)
+            if task is None:
+                task = self._async_flights[key] = asyncio.ensure_future(call())
+                task.add_done_callback(lambda done: self._land(key, done))
+                self._counters['misses'] += 1
+            else:
+                self._counters['coalesced'] += 1
+        
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling() or not task.cancelled():
+                # Cet appelant est annulé : l'appel partagé continue
+                raise
+        # Appel partagé annulé sans que cet appelant le soit : appel direct
+        return await call()
+    
+    def _land(self, key: str, task: asyncio.Task) -> None:
+        """Fin de l'appel partagé : libérer la clé, garder une réponse réussie"""
+        with self._lock:
+            if self._async_flights.get(key) is task:
+                del self._async_flights[key]
+            # exception() marque l'erreur comme lue même si plus personne n'attend
+            if not task.cancelled() and task.exception() is None:
+                self._store(key, task.result())
+    
+    def counters(self) -> Dict[str, Any]:
+        """Compteurs de ce processus et taux de réponses sans appel Elasticsearch"""
+        with self._lock:
+            counters = {name: self._counters[name] for name in ('hits', 'misses', 'coalesced', 'evictions')}
+            counters['entries'] = len(self._entries)
+        total = counters['hits'] + counters['misses'] + counters['coalesced']
+        counters['saved_ratio'] = round((counters['hits'] + counters['coalesced']) / total, 3) if total else None
+        return counters
+    
+    def reset_counters(self) -> None:
+        with self._lock:
+            self._counters.clear()
@@ -0,0 +1,229 @@
+"""
+Couche d'envoi des enregistrements vers la file Redis consommée par Logstash
+
+Les enregistrements sont sérialisés puis poussés par paquets avec un LPUSH
+multi-valeurs, plusieurs paquets étant regroupés dans un même pipeline Redis.
+Un upload de N lignes coûte donc environ N / (chunk_size * pipeline_depth)
+allers-retours réseau au lieu de N.
+
+Avec le transport 'stream', chaque enregistrement devient une entrée d'un
+Redis Stream (XADD pipelinés, taille bornée par MAXLEN approximatif),
+consommée par groupe de consommateurs (voir redis_streams.py).
+
+Ce module n'importe pas Django : il est partagé par l'API Django et par
+l'API Flask (file_upload_api.py).
+"""
+import json
+import logging
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_KEY = "iot:data"
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_PIPELINE_DEPTH = 8
+
+TRANSPORT_LIST = 'list'
+TRANSPORT_STREAM = 'stream'
+
+# Champ de l'entrée de stream qui porte le message JSON
+STREAM_MESSAGE_FIELD = 'message'
+
+# Marque des messages peut-être déjà indexés (voir logstash/pipeline)
+REDELIVERY_FIELD = 'redelivery'
+
+
+class EnqueueError(Exception):
+    """
+    Erreur levée par la source des enregistrements pendant l'envoi
+    
+    Les paquets précédents ont déjà été poussés : report décrit ce qui a été
+    envoyé avant l'erreur, error est l'exception d'origine.
+    """
+    
+    def __init__(self, error: Exception, report: Dict[str, Any]):
+        super().__init__(str(error))
+        self.error = error
+        self.report = report
+
+
+def build_metadata(
+    filename: str,
+    file_type: str,
+    data_type: Optional[str] = None,
+    redelivery: bool = False
+) -> Dict[str, Any]:
+    """
+    Métadonnées communes à tous les enregistrements d'un même upload
+    
+    redelivery=True marque des enregistrements peut-être déjà indexés
+    (upload repris ou fichier renvoyé) : Logstash ne cherche que pour
+    ceux-là l'index qui contient déjà le document.
+    """
+    metadata = {
+        "source_file": filename,
+        "file_type": file_type,
+    }
+    if data_type is not None:
+        metadata["data_type"] = data_type
+    # Un seul horodatage par upload (et non un appel à datetime.now() par ligne)
+    metadata["upload_timestamp"] = datetime.now().isoformat()
+    if redelivery:
+        metadata[REDELIVERY_FIELD] = True
+    return metadata
+
+
+def mark_redelivery(message: Any) -> str:
+    """Message sérialisé, marqué comme nouvelle livraison s'il est un objet JSON"""
+    if isinstance(message, str):
+        try:
+            parsed = json.loads(message)
+        except ValueError:
+            return message
+        if not isinstance(parsed, dict):
+            return message
+        message = parsed
+    if isinstance(message, dict):
+        message = {**message, REDELIVERY_FIELD: True}
+    return json.dumps(message)
+
+
+def _message_prefix(metadata: Dict[str, Any]) -> str:
+    """
+    Préfixe JSON partagé par tous les messages d'un upload.
+    
+    Produit exactement la même chaîne que json.dumps({**metadata, "data": record}),
+    sans re-sérialiser les métadonnées pour chaque enregistrement.
+    """
+    return json.dumps(metadata)[:-1] + (', "data": ' if metadata else '"data": ')
+
+
+def serialize_records(records: Iterable[Dict], metadata: Dict[str, Any]) -> Iterable[str]:
+    """Sérialiser les enregistrements enrichis des métadonnées de l'upload"""
+    prefix = _message_prefix(metadata)
+    for record in records:
+        yield prefix + json.dumps(record) + "}"
+
+
+def _chunks(iterable: Iterable, size: int) -> Iterable[List]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def enqueue_records(
+    client,
+    records: Iterable[Dict],
+    metadata: Dict[str, Any],
+    key: str = DEFAULT_QUEUE_KEY,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    pipeline_depth: int = DEFAULT_PIPELINE_DEPTH,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    transport: str = TRANSPORT_LIST,
+    maxlen: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Pousser des enregistrements vers Redis par paquets pipelinés
+    
+    Args:
+        client: Client redis.Redis
+        records: Itérable de dictionnaires (consommé au fil de l'eau)
+        metadata: Métadonnées ajoutées à chaque message (voir build_metadata)
+        key: Clé de la liste (ou du stream) Redis
+        chunk_size: Nombre d'enregistrements par paquet (un LPUSH par paquet)
+        pipeline_depth: Nombre de paquets envoyés par aller-retour
+        progress: Fonction appelée avec le rapport après chaque pipeline
+        transport: 'list' (LPUSH, file historique) ou 'stream' (XADD)
+        maxlen: Taille maximale approximative du stream (transport 'stream')
+    
+    Returns:
+        Rapport d'envoi : enregistrements envoyés/en échec, nombre de paquets,
+        longueur de la file après envoi et détail des paquets en échec
+    
+    Raises:
+        EnqueueError: la source des enregistrements a levé une exception
+    """
+    if chunk_size < 1 or pipeline_depth < 1:
+        raise ValueError("chunk_size et pipeline_depth doivent être >= 1")
+    if transport not in (TRANSPORT_LIST, TRANSPORT_STREAM):
+        raise ValueError(f"Transport Redis non supporté: {transport}")
+    
+    report = {
+        'enqueued': 0,
+        'failed': 0,
+        'chunks': 0,
+        'queue_length': None,
+        'errors': [],
+    }
+    offset = 0
+    
+    messages = serialize_records(records, metadata)
+    batches = _chunks(_chunks(messages, chunk_size), pipeline_depth)
+    while True:
+        try:
+            batch = next(batches, None)
+        except Exception as e:
+            # Erreur de lecture/parsing de la source (fichier en flux)
+            raise EnqueueError(e, report) from e
+        if batch is None:
+            break
+        
+        pipe = client.pipeline(transaction=False)
+        for chunk in batch:
+            if transport == TRANSPORT_STREAM:
+                for message in chunk:
+                    pipe.xadd(key, {STREAM_MESSAGE_FIELD: message}, maxlen=maxlen, approximate=True)
+            else:
+                pipe.lpush(key, *chunk)
+        
+        command_count = len(pipe)
+        try:
+            results = pipe.execute(raise_on_error=False)
+        except Exception as e:
+            # Erreur de connexion : tout le pipeline est perdu
+            results = [e] * command_count
+        
+        position = 0
+        for chunk in batch:
+            if transport == TRANSPORT_STREAM:
+                chunk_results = results[position:position + len(chunk)]
+            else:
+                chunk_results = results[position:position + 1]
+            position += len(chunk_results)
+            
+            errors = [r for r in chunk_results if isinstance(r, Exception)]
+            if errors:
+                # En LPUSH le paquet est perdu en entier ; en XADD seules les entrées en erreur
+                failed = len(chunk) if transport == TRANSPORT_LIST else len(errors)
+                report['failed'] += failed
+                report['enqueued'] += len(chunk) - failed
+                report['errors'].append({
+                    'chunk': report['chunks'],
+                    'offset': offset,
+                    'size': failed,
+                    'error': str(errors[0]),
+                })
+                logger.error(f"Échec envoi paquet {report['chunks']} ({failed} enregistrements): {errors[0]}")
+            else:
+                report['enqueued'] += len(chunk)
+                if transport == TRANSPORT_LIST:
+                    # LPUSH renvoie la longueur de la liste : pas besoin d'un LLEN
+                    report['queue_length'] = chunk_results[0]
+            report['chunks'] += 1
+            offset += len(chunk)
+        
+        if progress is not None:
+            progress(report)
+    
+    if transport == TRANSPORT_STREAM and report['enqueued']:
+        try:
+            report['queue_length'] = client.xlen(key)
+        except Exception as e:
+            logger.warning(f"XLEN {key} impossible: {e}")
+    
+    return report
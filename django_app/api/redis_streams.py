@@ -0,0 +1,184 @@
+"""
+Consommation du Redis Stream d'ingestion par groupe de consommateurs
+
+Contrairement à la liste iot:data (dont les messages dépilés sont perdus si
+le consommateur s'arrête en cours de traitement), une entrée de stream lue
+avec XREADGROUP reste en attente (PEL) tant qu'elle n'a pas été acquittée
+par XACK. Les entrées restées trop longtemps en attente chez un consommateur
+arrêté sont récupérées par XAUTOCLAIM. Plusieurs consommateurs d'un même
+groupe se partagent le stream sans doublons.
+
+La boucle de consommation est celle de l'indexeur (indexer.BulkIndexer,
+via indexer.StreamSource) : ce module ne fait que lire et acquitter.
+
+Ce module n'importe pas Django.
+"""
+import json
+import logging
+import os
+import socket
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis
+
+from .dead_letters import DeadLetterQueue, build_dead_letter
+from .redis_queue import STREAM_MESSAGE_FIELD
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STREAM_KEY = "iot:stream"
+DEFAULT_GROUP = "iot-ingest"
+
+# (id de l'entrée, message JSON décodé)
+StreamEntry = Tuple[str, Dict[str, Any]]
+
+
+def default_consumer_name() -> str:
+    """Nom de consommateur unique par processus (hôte-pid)"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def stream_backlog(client, key: str = DEFAULT_STREAM_KEY, group: str = DEFAULT_GROUP) -> int:
+    """
+    Entrées du stream restant à traiter par le groupe
+    
+    XLEN compterait aussi les entrées déjà acquittées que MAXLEN conserve :
+    le retard est lag (entrées jamais lues par le groupe) + pending (lues,
+    non acquittées), d'après XINFO GROUPS. Sans groupe, tout le stream est à
+    traiter ; si Redis ne connaît pas lag (Redis < 7, entrées supprimées),
+    XLEN sert de borne haute.
+    """
+    try:
+        groups = client.xinfo_groups(key)
+    except redis.ResponseError:
+        # Stream inexistant
+        return 0
+    info = next((info for info in groups if info['name'] == group), None)
+    if info is None or info.get('lag') is None:
+        return client.xlen(key)
+    return info['lag'] + info['pending']
+
+
+class StreamConsumer:
+    """Lecteur d'un Redis Stream au sein d'un groupe de consommateurs"""
+    
+    def __init__(
+        self,
+        client,
+        key: str = DEFAULT_STREAM_KEY,
+        group: str = DEFAULT_GROUP,
+        consumer: Optional[str] = None,
+        batch_size: int = 500,
+        block_ms: int = 5000,
+        claim_idle_ms: int = 60000,
+        dlq: Optional[DeadLetterQueue] = None,
+    ):
+        self.client = client
+        self.key = key
+        self.group = group
+        self.consumer = consumer or default_consumer_name()
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.claim_idle_ms = claim_idle_ms
+        self.dlq = dlq
+        # Au démarrage, relire d'abord nos propres entrées non acquittées
+        self._pending_backlog = True
+        # Position dans nos entrées en attente : chaque lecture reprend après la dernière rendue
+        self._pending_cursor = '0'
+        self._claim_cursor = '0-0'
+        self._last_claim = 0.0
+    
+    def ensure_group(self):
+        """Créer le groupe (et le stream) s'ils n'existent pas"""
+        try:
+            self.client.xgroup_create(self.key, self.group, id='0', mkstream=True)
+            logger.info(f"Groupe {self.group} créé sur {self.key}")
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+    
+    def read_batch(self) -> List[StreamEntry]:
+        """
+        Lire le prochain lot d'entrées
+        
+        Ordre de priorité : entrées en attente de ce consommateur (après un
+        redémarrage ou un échec de traitement), entrées inactives réclamées
+        aux consommateurs arrêtés, puis nouvelles entrées (lecture bloquante).
+        """
+        while self._pending_backlog:
+            messages = self._read_messages(self._pending_cursor, block=None)
+            if not messages:
+                self._pending_backlog = False
+                self._pending_cursor = '0'
+                break
+            # Sans acquittement entre deux lectures (lot en cours de constitution),
+            # relire depuis '0' rendrait les mêmes entrées
+            self._pending_cursor = messages[-1][0]
+            entries = self._decode(messages)
+            if entries:
+                return entries
+        
+        # Un XAUTOCLAIM par demi-période d'inactivité suffit (sauf parcours en cours)
+        now = time.monotonic()
+        if self._claim_cursor != '0-0' or now - self._last_claim >= self.claim_idle_ms / 2000:
+            self._last_claim = now
+            entries = self.reclaim()
+            if entries:
+                return entries
+        
+        return self._read('>', block=self.block_ms)
+    
+    def reclaim(self) -> List[StreamEntry]:
+        """Récupérer les entrées inactives depuis claim_idle_ms (XAUTOCLAIM)"""
+        result = self.client.xautoclaim(
+            self.key, self.group, self.consumer,
+            min_idle_time=self.claim_idle_ms,
+            start_id=self._claim_cursor,
+            count=self.batch_size
+        )
+        self._claim_cursor, messages = result[0], result[1]
+        if messages:
+            logger.warning(f"{len(messages)} entrées réclamées sur {self.key} par {self.consumer}")
+        return self._decode(messages)
+    
+    def ack(self, entry_ids: List[str]) -> int:
+        """Acquitter des entrées traitées"""
+        if not entry_ids:
+            return 0
+        return self.client.xack(self.key, self.group, *entry_ids)
+    
+    def retry_pending(self):
+        """Relire nos entrées non acquittées au prochain lot (après un échec)"""
+        self._pending_backlog = True
+        self._pending_cursor = '0'
+    
+    def _read(self, start_id: str, block: Optional[int]) -> List[StreamEntry]:
+        return self._decode(self._read_messages(start_id, block))
+    
+    def _read_messages(self, start_id: str, block: Optional[int]):
+        response = self.client.xreadgroup(
+            self.group, self.consumer, {self.key: start_id},
+            count=self.batch_size, block=block
+        )
+        if not response:
+            return []
+        _, messages = response[0]
+        return messages
+    
+    def _decode(self, messages) -> List[StreamEntry]:
+        entries = []
+        for entry_id, fields in messages:
+            if not fields:
+                # Entrée supprimée par MAXLEN alors qu'elle était en attente
+                self.ack([entry_id])
+                continue
+            try:
+                entries.append((entry_id, json.loads(fields[STREAM_MESSAGE_FIELD])))
+            except (KeyError, ValueError) as e:
+                logger.error(f"Entrée {entry_id} illisible: {e}")
+                if self.dlq is not None:
+                    raw = fields.get(STREAM_MESSAGE_FIELD) or json.dumps(fields)
+                    self.dlq.push([build_dead_letter(raw, f"Entrée illisible: {e}", source=self.key)])
+                self.ack([entry_id])
+        return entries
@@ -0,0 +1,672 @@
+"""
+Rollups horaires et journaliers de la consommation d'énergie
+
+Les statistiques de consommation parcouraient tous les relevés bruts de
+iot-consommation. Le job de rollup (manage.py rollup_consommation) les
+agrège par heure et par jour, en un document par
+batiment/zone/type_energie/sous_type : nombre de relevés (_doc_count,
+compté par les agrégations comme autant de documents) et, pour
+valeur_consommation, cout_estime et empreinte_carbone, somme, nombre,
+minimum et maximum.
+
+Le job est incrémental : il reprend au début du jour du point de contrôle
+(checkpoint, fin de la dernière heure agrégée) et s'arrête à l'heure
+entière précédant now - delay, pour laisser l'ingestion en cours se
+terminer. Les documents ont un _id déterministe : relancer le job sur une
+période réécrit les mêmes documents.
+
+Des relevés peuvent arriver après coup pour une période déjà agrégée
+(import d'historique, rejeu de la DLQ, upload tardif). Chaque relevé porte
+sa date d'indexation (ingested_at, posée par le pipeline d'ingestion de
+schemas.py) et le checkpoint garde la date d'indexation jusqu'à laquelle
+les relevés ont été vus (ingested). Chaque passage recalcule d'abord les
+jours antérieurs au checkpoint qui ont reçu des relevés depuis : les
+statistiques les manquent au plus jusqu'au passage suivant du job. Les
+relevés indexés avant l'installation du pipeline se rattrapent avec since.
+
+RollupPlanner répond aux statistiques et histogrammes en découpant la
+période demandée :
+
+- rollups journaliers pour les jours entiers avant le checkpoint ;
+- rollups horaires pour les heures entières restantes avant le checkpoint ;
+- relevés bruts pour le reste (bornes non alignées sur l'heure, données
+  postérieures au checkpoint).
+
+Le résultat est celui d'un calcul sur les seuls relevés bruts. Tant
+qu'aucun checkpoint n'est connu, tout est lu sur les relevés bruts.
+
+Les index de rollups (rollup-iot-consommation-*) sont hors du motif
+iot-* : ils n'apparaissent pas dans les recherches et statistiques
+globales.
+
+Ce module n'importe pas Django (voir manage.py rollup_consommation).
+"""
+import hashlib
+import json
+import logging
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from elasticsearch import NotFoundError, helpers
+
+from .schemas import INGESTED_FIELD, alias_name, keyword_field
+
+logger = logging.getLogger(__name__)
+
+SOURCE_INDEX = alias_name('consommation')
+DIMENSIONS = ('batiment', 'zone', 'type_energie', 'sous_type')
+METRICS = ('valeur_consommation', 'cout_estime', 'empreinte_carbone')
+
+# Granularités des rollups, et RAW pour les relevés bruts
+HOUR = 'hour'
+DAY = 'day'
+RAW = 'raw'
+GRANULARITIES = {HOUR: timedelta(hours=1), DAY: timedelta(days=1)}
+
+ROLLUP_PREFIX = 'rollup'
+CHECKPOINT_INDEX = f'{ROLLUP_PREFIX}-{SOURCE_INDEX}-checkpoint'
+CHECKPOINT_ID = SOURCE_INDEX
+
+DEFAULT_DELAY = timedelta(minutes=15)
+# Délai maximal entre la date d'indexation d'un relevé et sa visibilité en
+# recherche (requête bulk en cours, refresh) : relu au passage suivant
+INGEST_MARGIN = timedelta(minutes=5)
+COMPOSITE_PAGE_SIZE = 1000
+
+# Buckets des répartitions (by_batiment...) renvoyés, et lus dans chaque
+# segment avant fusion (la fusion doit voir toutes les valeurs)
+TERMS_SIZE = 10
+MERGE_TERMS_SIZE = 1000
+
+# Intervalles des histogrammes : paramètres date_histogram et granularité
+# de rollup la plus grossière dont les buckets tombent entiers dans un intervalle
+HISTOGRAM_INTERVALS = {
+    'hour': ({'fixed_interval': '1h'}, HOUR),
+    'day': ({'calendar_interval': '1d'}, DAY),
+    'week': ({'calendar_interval': '1w'}, DAY),
+    'month': ({'calendar_interval': '1M'}, DAY),
+    'year': ({'calendar_interval': '1y'}, DAY),
+}
+
+# Répartitions des statistiques : {nom de la réponse: dimension}
+STATS_TERMS = {
+    'by_type_energie': 'type_energie',
+    'by_sous_type': 'sous_type',
+    'by_batiment': 'batiment',
+}
+
+
+def rollup_index(granularity: str) -> str:
+    return f'{ROLLUP_PREFIX}-{SOURCE_INDEX}-{granularity}'
+
+
+def rollup_indices() -> List[str]:
+    return [rollup_index(HOUR), rollup_index(DAY), CHECKPOINT_INDEX]
+
+
+# === Dates (UTC) ===
+
+def to_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Date en UTC ; une date sans fuseau est considérée en UTC (comme Elasticsearch)"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def floor(value: datetime, granularity: str) -> datetime:
+    value = value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0) if granularity == DAY else value
+
+
+def ceil(value: datetime, granularity: str) -> datetime:
+    floored = floor(value, granularity)
+    return floored if floored == value else floored + GRANULARITIES[granularity]
+
+
+def from_millis(value: float) -> datetime:
+    return datetime.fromtimestamp(value / 1000, timezone.utc)
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+# === Index de rollups ===
+
+def _metric_mapping() -> Dict[str, Any]:
+    return {'properties': {
+        'sum': {'type': 'double'},
+        'count': {'type': 'long'},
+        'min': {'type': 'double'},
+        'max': {'type': 'double'},
+    }}
+
+
+def rollup_mapping() -> Dict[str, Any]:
+    """Mapping des index horaire et journalier"""
+    return {
+        'dynamic': 'strict',
+        'properties': {
+            '@timestamp': {'type': 'date'},
+            'documents': {'type': 'long'},
+            'run_id': {'type': 'keyword'},
+            **{name: {'type': 'keyword', 'ignore_above': 256} for name in DIMENSIONS},
+            **{name: _metric_mapping() for name in METRICS},
+        },
+    }
+
+
+def ensure_rollup_indices(es) -> None:
+    """Créer les index de rollups et du checkpoint s'ils n'existent pas"""
+    mappings = {
+        rollup_index(HOUR): rollup_mapping(),
+        rollup_index(DAY): rollup_mapping(),
+        CHECKPOINT_INDEX: {'properties': {
+            'checkpoint': {'type': 'date'},
+            'ingested': {'type': 'date'},
+            'updated_at': {'type': 'date'},
+        }},
+    }
+    for index, mapping in mappings.items():
+        if not es.indices.exists(index=index):
+            es.indices.create(index=index, mappings=mapping, settings={'number_of_shards': 1})
+            logger.info(f"Index {index} créé")
+
+
+def delete_rollups(es) -> List[str]:
+    """Supprimer les rollups et le checkpoint (le prochain job repart du premier relevé)"""
+    names = [index for index in rollup_indices() if es.indices.exists(index=index)]
+    if names:
+        es.indices.delete(index=','.join(names))
+    return names
+
+
+def read_state(es) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """
+    (checkpoint, ingested) : fin de la dernière heure agrégée et date
+    d'indexation jusqu'à laquelle les relevés ont été vus, None si inconnus
+    """
+    try:
+        source = es.get(index=CHECKPOINT_INDEX, id=CHECKPOINT_ID)['_source']
+    except NotFoundError:
+        return None, None
+    ingested = source.get('ingested')
+    return (
+        to_utc(datetime.fromisoformat(source['checkpoint'])),
+        to_utc(datetime.fromisoformat(ingested)) if ingested else None,
+    )
+
+
+def read_checkpoint(es) -> Optional[datetime]:
+    """Fin de la dernière heure agrégée, None si le job n'a jamais tourné"""
+    return read_state(es)[0]
+
+
+def write_checkpoint(es, checkpoint: datetime, ingested: Optional[datetime] = None) -> None:
+    es.index(
+        index=CHECKPOINT_INDEX,
+        id=CHECKPOINT_ID,
+        document={
+            'checkpoint': checkpoint.isoformat(),
+            'ingested': _isoformat(ingested),
+            'updated_at': datetime.now(timezone.utc).isoformat(),
+        },
+        refresh=True,
+    )
+
+
+# === Job de rollup ===
+
+def run_rollup(
+    es,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    delay: timedelta = DEFAULT_DELAY,
+    now: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """
+    Agréger les relevés bruts, jour par jour, depuis le checkpoint
+    
+    Args:
+        since: Reprendre à cette date plutôt qu'au checkpoint (relevés arrivés
+            après coup) ; sans checkpoint ni since, depuis le premier relevé
+        until: S'arrêter à la fin du jour de cette date (reconstruction partielle)
+        delay: Marge laissée à l'ingestion : rien n'est agrégé après now - delay
+        now: Date courante (tests)
+    
+    Les jours antérieurs qui ont reçu des relevés depuis le passage
+    précédent (late_days) sont recalculés d'abord.
+    
+    Returns:
+        {'start', 'end', 'days', 'late_days', 'hourly', 'daily', 'checkpoint'} ;
+        le checkpoint n'avance qu'après l'écriture de chaque jour et ne recule
+        jamais, la date d'indexation vue n'avance qu'à la fin du passage
+    """
+    ensure_rollup_indices(es)
+    checkpoint, ingested = read_state(es)
+    started = to_utc(now) or datetime.now(timezone.utc)
+    end = floor(started - delay, HOUR)
+    if until is not None:
+        # Jours entiers : un rollup journalier partiel ne serait plus recalculé
+        end = min(end, floor(to_utc(until), DAY) + GRANULARITIES[DAY])
+    start = to_utc(since) or checkpoint or first_reading(es)
+    summary = {'start': None, 'end': end.isoformat(), 'days': 0, 'late_days': 0, 'hourly': 0, 'daily': 0,
+               'checkpoint': _isoformat(checkpoint)}
+    if start is None:
+        logger.info(f"Aucun relevé dans {SOURCE_INDEX}")
+        return summary
+    
+    day = floor(start, DAY)
+    summary['start'] = day.isoformat()
+    windows = [(day, min(day + GRANULARITIES[DAY], end)) for day in _days(day, end)]
+    if checkpoint is not None and ingested is not None:
+        late = [(late_day, min(late_day + GRANULARITIES[DAY], end)) for late_day in late_days(es, ingested, day)]
+        if late:
+            logger.info(f"{len(late)} jour(s) déjà agrégé(s) ont reçu des relevés depuis {ingested.isoformat()}")
+        summary['late_days'] = len(late)
+        windows = late + windows
+    
+    for window_start, window_end in windows:
+        hourly, daily = rollup_window(es, window_start, window_end)
+        summary['days'] += 1
+        summary['hourly'] += hourly
+        summary['daily'] += daily
+        if checkpoint is None or window_end > checkpoint:
+            write_checkpoint(es, window_end, ingested)
+            checkpoint = window_end
+            summary['checkpoint'] = checkpoint.isoformat()
+    if checkpoint is not None:
+        # Relevés indexés pendant ce passage (ou pas encore visibles) : relus au suivant
+        write_checkpoint(es, checkpoint, started - INGEST_MARGIN)
+    return summary
+
+
+def _days(start: datetime, end: datetime) -> Iterator[datetime]:
+    day = start
+    while day < end:
+        yield day
+        day += GRANULARITIES[DAY]
+
+
+def late_days(es, ingested: datetime, before: datetime) -> List[datetime]:
+    """Jours avant before ayant reçu des relevés indexés depuis ingested (une agrégation)"""
+    result = es.search(
+        index=SOURCE_INDEX,
+        size=0,
+        query={'bool': {'filter': [
+            {'range': {INGESTED_FIELD: {'gte': ingested.isoformat()}}},
+            {'range': {'@timestamp': {'lt': before.isoformat()}}},
+        ]}},
+        aggs={'days': {'date_histogram': {'field': '@timestamp', 'calendar_interval': '1d', 'min_doc_count': 1}}},
+    )
+    return [from_millis(bucket['key']) for bucket in result['aggregations']['days']['buckets']]
+
+
+def first_reading(es) -> Optional[datetime]:
+    """Date du plus ancien relevé brut"""
+    result = es.search(index=SOURCE_INDEX, size=0, aggs={'first': {'min': {'field': '@timestamp'}}})
+    value = result['aggregations']['first']['value']
+    return from_millis(value) if value is not None else None
+
+
+def rollup_window(es, start: datetime, end: datetime) -> Tuple[int, int]:
+    """
+    Recalculer les rollups d'une période d'au plus un jour, alignée sur le jour
+    
+    Les documents de la période qui n'ont pas été réécrits (combinaison de
+    dimensions disparue des relevés) sont supprimés ensuite : la période
+    reste lisible pendant le recalcul.
+    
+    Returns:
+        (documents horaires, documents journaliers)
+    """
+    run_id = uuid.uuid4().hex
+    hourly = {}
+    for bucket in _hour_buckets(es, start, end):
+        key = bucket['key']
+        dimensions = tuple(key[name] for name in DIMENSIONS)
+        hourly[(from_millis(key['hour']), dimensions)] = (
+            bucket['doc_count'],
+            {name: _metric(bucket[name]) for name in METRICS},
+        )
+    
+    daily = {}
+    for (hour, dimensions), (count, metrics) in hourly.items():
+        key = (floor(hour, DAY), dimensions)
+        if key in daily:
+            total, merged = daily[key]
+            daily[key] = (total + count, {name: _merge_metric(merged[name], metrics[name]) for name in METRICS})
+        else:
+            daily[key] = (count, metrics)
+    
+    actions = [
+        _rollup_action(granularity, timestamp, dimensions, count, metrics, run_id)
+        for granularity, documents in ((HOUR, hourly), (DAY, daily))
+        for (timestamp, dimensions), (count, metrics) in documents.items()
+    ]
+    if actions:
+        helpers.bulk(es, actions)
+    for granularity in GRANULARITIES:
+        es.delete_by_query(
+            index=rollup_index(granularity),
+            query={'bool': {
+                'filter': [{'range': {'@timestamp': {'gte': start.isoformat(), 'lt': end.isoformat()}}}],
+                'must_not': [{'term': {'run_id': run_id}}],
+            }},
+            conflicts='proceed',
+            refresh=True,
+        )
+    es.indices.refresh(index=f'{rollup_index(HOUR)},{rollup_index(DAY)}')
+    logger.info(f"Rollups {start.isoformat()} -> {end.isoformat()}: {len(hourly)} horaires, {len(daily)} journaliers")
+    return len(hourly), len(daily)
+
+
+def _hour_buckets(es, start: datetime, end: datetime) -> Iterator[Dict[str, Any]]:
+    """Buckets heure x dimensions des relevés bruts (agrégation composite paginée)"""
+    sources = [{'hour': {'date_histogram': {'field': '@timestamp', 'fixed_interval': '1h'}}}]
+    sources += [
+        {name: {'terms': {'field': keyword_field(name, SOURCE_INDEX), 'missing_bucket': True}}}
+        for name in DIMENSIONS
+    ]
+    composite = {'size': COMPOSITE_PAGE_SIZE, 'sources': sources}
+    while True:
+        result = es.search(
+            index=SOURCE_INDEX,
+            size=0,
+            query={'range': {'@timestamp': {'gte': start.isoformat(), 'lt': end.isoformat()}}},
+            aggs={'buckets': {
+                'composite': composite,
+                'aggs': {name: {'stats': {'field': name}} for name in METRICS},
+            }},
+        )
+        aggregation = result['aggregations']['buckets']
+        yield from aggregation['buckets']
+        if 'after_key' not in aggregation or not aggregation['buckets']:
+            return
+        composite = {**composite, 'after': aggregation['after_key']}
+
+
+def _metric(stats: Dict[str, Any]) -> Dict[str, Any]:
+    return {'sum': stats['sum'] or 0.0, 'count': stats['count'], 'min': stats['min'], 'max': stats['max']}
+
+
+def _merge_metric(first: Dict[str, Any], second: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'sum': (first['sum'] or 0.0) + (second['sum'] or 0.0),
+        'count': first['count'] + second['count'],
+        'min': _bound(min, first['min'], second['min']),
+        'max': _bound(max, first['max'], second['max']),
+    }
+
+
+def _bound(choose: Callable, first: Optional[float], second: Optional[float]) -> Optional[float]:
+    values = [value for value in (first, second) if value is not None]
+    return choose(values) if values else None
+
+
+def _rollup_action(granularity, timestamp, dimensions, count, metrics, run_id) -> Dict[str, Any]:
+    identity = json.dumps([granularity, timestamp.isoformat(), dimensions])
+    return {
+        '_index': rollup_index(granularity),
+        '_id': hashlib.sha1(identity.encode('utf-8')).hexdigest(),
+        '_source': {
+            '@timestamp': timestamp.isoformat(),
+            # Compté comme count documents par les agrégations (terms, date_histogram)
+            '_doc_count': count,
+            'documents': count,
+            'run_id': run_id,
+            **dict(zip(DIMENSIONS, dimensions)),
+            **metrics,
+        },
+    }
+
+
+# === Lecture : statistiques et histogrammes ===
+
+Segment = Tuple[str, Optional[datetime], Optional[datetime]]
+Plan = Tuple[List[Dict[str, Any]], Callable[[List[Dict[str, Any]]], Dict[str, Any]]]
+
+
+def response_error(response: Dict[str, Any]) -> Optional[str]:
+    """Raison de l'échec d'une réponse de _msearch, None si elle a réussi"""
+    error = response.get('error')
+    if not error:
+        return None
+    return error.get('reason', error.get('type')) if isinstance(error, dict) else str(error)
+
+
+class RollupPlanner:
+    """
+    Requêtes _msearch des statistiques et histogrammes de consommation
+    
+    Chaque plan commence par la lecture du checkpoint, qui sert au plan
+    suivant : une seule requête Elasticsearch par appel. Un checkpoint en
+    retard reste exact (moins de rollups, plus de relevés bruts) ; il ne
+    recule que si les rollups sont supprimés (manage.py rollup_consommation
+    --reset), et la requête suivante échoue alors une fois.
+    """
+    
+    def __init__(self):
+        self.checkpoint: Optional[datetime] = None
+    
+    def segments(self, start: Optional[datetime], end: Optional[datetime], coarsest: str = DAY) -> List[Segment]:
+        """
+        Découpage de [start, end[ en (source, début, fin) : DAY, HOUR ou RAW
+        
+        None pour une borne ouverte. Les jours entiers avant le checkpoint
+        sont lus dans les rollups journaliers (si coarsest vaut DAY), les
+        heures entières restantes dans les rollups horaires.
+        """
+        start, end, checkpoint = to_utc(start), to_utc(end), self.checkpoint
+        if checkpoint is None:
+            return [(RAW, start, end)]
+        covered_end = checkpoint if end is None else min(end, checkpoint)
+        first_hour = ceil(start, HOUR) if start is not None else None
+        last_hour = floor(covered_end, HOUR)
+        if first_hour is not None and first_hour >= last_hour:
+            return [(RAW, start, end)]
+        
+        segments = []
+        if start is not None and start < first_hour:
+            segments.append((RAW, start, first_hour))
+        first_day = ceil(first_hour, DAY) if first_hour is not None else None
+        last_day = floor(last_hour, DAY)
+        if coarsest == DAY and (first_day is None or first_day < last_day):
+            if first_hour is not None and first_hour < first_day:
+                segments.append((HOUR, first_hour, first_day))
+            segments.append((DAY, first_day, last_day))
+            if last_day < last_hour:
+                segments.append((HOUR, last_day, last_hour))
+        else:
+            segments.append((HOUR, first_hour, last_hour))
+        if end is None or last_hour < end:
+            segments.append((RAW, last_hour, end))
+        return segments
+    
+    def _checkpoint_search(self) -> List[Dict[str, Any]]:
+        return [
+            {'index': CHECKPOINT_INDEX, 'ignore_unavailable': True},
+            {'size': 1, 'query': {'ids': {'values': [CHECKPOINT_ID]}}},
+        ]
+    
+    def _update_checkpoint(self, response: Dict[str, Any]) -> None:
+        if response_error(response):
+            return
+        hits = response['hits']['hits']
+        self.checkpoint = to_utc(datetime.fromisoformat(hits[0]['_source']['checkpoint'])) if hits else None
+    
+    def _query(self, segment: Segment, filters: Optional[Dict[str, Any]], unbounded: bool) -> Dict[str, Any]:
+        source, start, end = segment
+        clauses = [
+            {'term': {keyword_field(name, SOURCE_INDEX) if source == RAW else name: value}}
+            for name, value in (filters or {}).items()
+            if name in DIMENSIONS and value
+        ]
+        bounds = {key: value.isoformat() for key, value in (('gte', start), ('lt', end)) if value is not None}
+        if bounds:
+            period = {'range': {'@timestamp': bounds}}
+            if source == RAW and unbounded and end is None:
+                # Période entière : relevés sans @timestamp compris, comme sans rollups
+                period = {'bool': {'should': [period, {'bool': {'must_not': {'exists': {'field': '@timestamp'}}}}]}}
+            clauses.append(period)
+        return {'bool': {'filter': clauses}} if clauses else {'match_all': {}}
+    
+    def _searches(self, segments: List[Segment], filters, unbounded: bool, aggregations: Callable) -> List[Dict]:
+        searches = self._checkpoint_search()
+        for segment in segments:
+            source = segment[0]
+            searches.append({'index': SOURCE_INDEX if source == RAW else rollup_index(source)})
+            searches.append({
+                'size': 0,
+                'track_total_hits': source == RAW,
+                'query': self._query(segment, filters, unbounded),
+                'aggs': aggregations(source),
+            })
+        return searches
+    
+    def _responses(self, responses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Réponses des segments, après mise à jour du checkpoint ; ValueError si un segment a échoué"""
+        self._update_checkpoint(responses[0])
+        for response in responses[1:]:
+            error = response_error(response)
+            if error:
+                raise ValueError(error)
+        return responses[1:]
+    
+    # --- Statistiques (format de get_consommation_statistics) ---
+    
+    def statistics_plan(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Plan:
+        """
+        Statistiques de consommation sur [start, end[ : (recherches _msearch, mise en forme des réponses)
+        
+        filters : valeurs exactes de batiment, zone, type_energie, sous_type
+        """
+        segments = self.segments(start, end)
+        searches = self._searches(segments, filters, start is None and end is None, self._statistics_aggs)
+        
+        def format_responses(responses):
+            parts = [self._statistics_part(source, response)
+                     for (source, _, _), response in zip(segments, self._responses(responses))]
+            return self._statistics_response(parts)
+        
+        return searches, format_responses
+    
+    @staticmethod
+    def _statistics_aggs(source: str) -> Dict[str, Any]:
+        if source == RAW:
+            return {
+                **{name: {'terms': {'field': keyword_field(dimension, SOURCE_INDEX), 'size': MERGE_TERMS_SIZE}}
+                   for name, dimension in STATS_TERMS.items()},
+                'consommation_stats': {'stats': {'field': 'valeur_consommation'}},
+                'cout_total': {'sum': {'field': 'cout_estime'}},
+                'empreinte_carbone_total': {'sum': {'field': 'empreinte_carbone'}},
+            }
+        return {
+            **{name: {'terms': {'field': dimension, 'size': MERGE_TERMS_SIZE}}
+               for name, dimension in STATS_TERMS.items()},
+            'documents': {'sum': {'field': 'documents'}},
+            'consommation_count': {'sum': {'field': 'valeur_consommation.count'}},
+            'consommation_sum': {'sum': {'field': 'valeur_consommation.sum'}},
+            'consommation_min': {'min': {'field': 'valeur_consommation.min'}},
+            'consommation_max': {'max': {'field': 'valeur_consommation.max'}},
+            'cout_total': {'sum': {'field': 'cout_estime.sum'}},
+            'empreinte_carbone_total': {'sum': {'field': 'empreinte_carbone.sum'}},
+        }
+    
+    @staticmethod
+    def _statistics_part(source: str, response: Dict[str, Any]) -> Dict[str, Any]:
+        aggs = response['aggregations']
+        part = {name: Counter({b['key']: b['doc_count'] for b in aggs[name]['buckets']}) for name in STATS_TERMS}
+        if source == RAW:
+            stats = aggs['consommation_stats']
+            part['total'] = response['hits']['total']['value']
+            part['consommation_stats'] = _metric(stats)
+        else:
+            part['total'] = int(aggs['documents']['value'] or 0)
+            part['consommation_stats'] = {
+                'sum': aggs['consommation_sum']['value'] or 0.0,
+                'count': int(aggs['consommation_count']['value'] or 0),
+                'min': aggs['consommation_min']['value'],
+                'max': aggs['consommation_max']['value'],
+            }
+        part['cout_total'] = aggs['cout_total']['value']
+        part['empreinte_carbone_total'] = aggs['empreinte_carbone_total']['value']
+        return part
+    
+    @staticmethod
+    def _statistics_response(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        response = {'total': sum(part['total'] for part in parts)}
+        for name in STATS_TERMS:
+            counts = sum((part[name] for part in parts), Counter())
+            # Même ordre qu'une agrégation terms : nombre décroissant, puis clé
+            ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:TERMS_SIZE]
+            response[name] = [{'key': key, 'count': count} for key, count in ranked]
+        stats = {'sum': 0.0, 'count': 0, 'min': None, 'max': None}
+        for part in parts:
+            stats = _merge_metric(stats, part['consommation_stats'])
+        response['consommation_stats'] = {
+            'count': stats['count'],
+            'min': stats['min'],
+            'max': stats['max'],
+            'avg': stats['sum'] / stats['count'] if stats['count'] else None,
+            'sum': stats['sum'],
+        }
+        for name in ('cout_total', 'empreinte_carbone_total'):
+            values = [part[name] for part in parts if part[name] is not None]
+            response[name] = sum(values) if values else None
+        return response
+    
+    # --- Histogrammes ---
+    
+    def histogram_plan(
+        self,
+        interval: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Plan:
+        """
+        Consommation par intervalle (hour, day, week, month, year, en UTC) sur [start, end[
+        
+        Returns:
+            (recherches _msearch, mise en forme : {'interval', 'buckets', 'sources'})
+        """
+        histogram, coarsest = HISTOGRAM_INTERVALS[interval]
+        segments = self.segments(start, end, coarsest)
+        
+        def aggregations(source):
+            field = (lambda name: name) if source == RAW else (lambda name: f'{name}.sum')
+            return {'histogram': {
+                'date_histogram': {'field': '@timestamp', 'min_doc_count': 1, **histogram},
+                'aggs': {name: {'sum': {'field': field(name)}} for name in METRICS},
+            }}
+        
+        searches = self._searches(segments, filters, False, aggregations)
+        
+        def format_responses(responses):
+            buckets = {}
+            for response in self._responses(responses):
+                for bucket in response['aggregations']['histogram']['buckets']:
+                    merged = buckets.setdefault(bucket['key'], {'count': 0, **{name: 0.0 for name in METRICS}})
+                    merged['count'] += bucket['doc_count']
+                    for name in METRICS:
+                        merged[name] += bucket[name]['value'] or 0.0
+            return {
+                'interval': interval,
+                'buckets': [{'key': from_millis(key).isoformat(), **values} for key, values in sorted(buckets.items())],
+                'sources': [
+                    {'source': source, 'from': _isoformat(segment_start), 'to': _isoformat(segment_end)}
+                    for source, segment_start, segment_end in segments
+                ],
+            }
+        
+        return searches, format_responses
@@ -0,0 +1,535 @@
+"""
+Registre des schémas des index iot-*
+
+Liste chaque champ connu des cinq types de données (alertes, capteurs,
+consommation, occupation, maintenance) avec son type. Ce registre est la
+source unique pour :
+
+- les templates d'index Elasticsearch (component + index templates,
+  voir index_lifecycle.py et manage.py setup_elasticsearch) ;
+- la conversion des champs numériques à l'ingestion (indexeur, scripts
+  ingest_all) ;
+- le nom du champ à utiliser pour un filtre exact ou une agrégation
+  terms (champ keyword, ou sous-champ .keyword d'un champ texte) ;
+- la projection par défaut des vues tableau (champs volumineux exclus
+  du _source) ;
+- les profils de recherche plein texte : champs boostés de chaque type et
+  champ catch-all search_all, rempli à l'indexation (copy_to) par les
+  champs textuels et identifiants.
+
+Un même nom de champ a le même type dans tous les index : le registre
+est un dictionnaire unique, chaque type de données en sélectionnant une
+partie. Les champs inconnus restent indexés dynamiquement (texte +
+sous-champ .keyword, comme avant).
+
+Ce module n'importe que la bibliothèque standard.
+"""
+import fnmatch
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+
+# Types de champ
+KEYWORD = 'keyword'    # identifiants, valeurs énumérées : filtres exacts et agrégations
+LABEL = 'label'        # libellé recherché par mots et agrégé (texte + sous-champ .keyword)
+TEXT = 'text'          # texte libre, recherche plein texte uniquement
+INTEGER = 'integer'
+DOUBLE = 'double'
+DATE = 'date'
+BOOLEAN = 'boolean'
+DISPLAY = 'display'    # affiché seulement : conservé dans _source, ni indexé ni agrégeable
+
+DATE_FORMAT = 'yyyy-MM-dd HH:mm:ss||yyyy-MM-dd||strict_date_optional_time||epoch_millis'
+
+INDEX_PREFIX = 'iot'
+
+# Mapping Elasticsearch de chaque type de champ
+FIELD_MAPPINGS = {
+    KEYWORD: {'type': 'keyword', 'ignore_above': 256},
+    LABEL: {'type': 'text', 'fields': {'keyword': {'type': 'keyword', 'ignore_above': 256}}},
+    TEXT: {'type': 'text'},
+    INTEGER: {'type': 'integer'},
+    DOUBLE: {'type': 'double'},
+    DATE: {'type': 'date', 'format': DATE_FORMAT},
+    BOOLEAN: {'type': 'boolean'},
+    DISPLAY: {'type': 'keyword', 'index': False, 'doc_values': False},
+}
+
+# Champ texte rempli à l'indexation par tous les champs textuels et
+# identifiants (copy_to) : la recherche plein texte n'interroge qu'un champ
+# au lieu de développer '*' sur tout le mapping
+SEARCH_ALL_FIELD = 'search_all'
+SEARCHABLE_TYPES = (KEYWORD, LABEL, TEXT)
+
+# Pipeline final de tous les index iot-* : date d'indexation de chaque
+# document, quel que soit le chemin d'ingestion (relevés arrivés après
+# coup, voir rollups.py)
+INGEST_PIPELINE = 'iot-ingested'
+INGESTED_FIELD = 'ingested_at'
+
+# Tous les champs connus et leur type
+FIELDS = {
+    # Métadonnées d'ingestion
+    '@timestamp': DATE,
+    'timestamp': DATE,
+    'source_file': KEYWORD,
+    'file_type': KEYWORD,
+    'data_type': KEYWORD,
+    'upload_timestamp': DATE,
+    # Date d'indexation, posée par Elasticsearch (INGEST_PIPELINE)
+    'ingested_at': DATE,
+    
+    # Localisation
+    'batiment': LABEL,
+    'salle': LABEL,
+    'zone': LABEL,
+    'etage': INTEGER,
+    
+    # Identifiants
+    'id_alerte': KEYWORD,
+    'capteur_id': KEYWORD,
+    'id_capteur': KEYWORD,
+    'device_id': KEYWORD,
+    'equipement_id': KEYWORD,
+    'id_consommation': KEYWORD,
+    'salle_id': KEYWORD,
+    'intervention_id': KEYWORD,
+    'code_erreur': KEYWORD,
+    'organisateur': KEYWORD,
+    'technicien': KEYWORD,
+    'technicien_assigne': KEYWORD,
+    'technicien_assigné': KEYWORD,
+    
+    # Valeurs énumérées
+    'type_alerte': KEYWORD,
+    'categorie': KEYWORD,
+    'severite': KEYWORD,
+    'priorite': KEYWORD,
+    'statut': KEYWORD,
+    'impact': KEYWORD,
+    'type': KEYWORD,
+    'type_capteur': KEYWORD,
+    'statut_capteur': KEYWORD,
+    'status': KEYWORD,
+    'unite': KEYWORD,
+    'periode_mesure': KEYWORD,
+    'type_energie': KEYWORD,
+    'sous_type': KEYWORD,
+    'tendance': KEYWORD,
+    'tarif': KEYWORD,
+    'type_salle': KEYWORD,
+    'evenement': KEYWORD,
+    'statut_occupation': KEYWORD,
+    'type_equipement': KEYWORD,
+    'marque': KEYWORD,
+    'modele': KEYWORD,
+    'type_maintenance': KEYWORD,
+    'prediction_panne': KEYWORD,
+    
+    # Texte libre
+    'description': TEXT,
+    'resolution': TEXT,
+    
+    # Mesures
+    'valeur_actuelle': DOUBLE,
+    'valeur_attendue': DOUBLE,
+    'ecart_type': DOUBLE,
+    'seuil': DOUBLE,
+    'duree_depassement': INTEGER,
+    'temps_reponse_minutes': INTEGER,
+    'valeur': DOUBLE,
+    'batterie': DOUBLE,
+    'precision': DOUBLE,
+    'seuil_min': DOUBLE,
+    'seuil_max': DOUBLE,
+    'temperature': DOUBLE,
+    'humidity': DOUBLE,
+    'battery_level': INTEGER,
+    'signal_strength': INTEGER,
+    'co2_level': DOUBLE,
+    'motion_detected': BOOLEAN,
+    'valeur_consommation': DOUBLE,
+    'cout_estime': DOUBLE,
+    'cout_unitaire': DOUBLE,
+    'empreinte_carbone': DOUBLE,
+    'comparaison_mois_precedent': DOUBLE,
+    'facteur_charge': DOUBLE,
+    'consommation_kwh': DOUBLE,
+    'cout_euro': DOUBLE,
+    'puissance_instantanee': DOUBLE,
+    'facteur_puissance': DOUBLE,
+    'capacite_max': INTEGER,
+    'nombre_personnes': INTEGER,
+    'personnes_presentes': INTEGER,
+    'taux_utilisation': DOUBLE,
+    'taux_occupation': DOUBLE,
+    'temperature_moyenne': DOUBLE,
+    'co2_moyen': INTEGER,
+    'consommation_elec': DOUBLE,
+    'vie_restante': INTEGER,
+    'duree_intervention_estimee': INTEGER,
+    'historique_pannes': INTEGER,
+    
+    # Dates secondaires
+    'date_creation': DATE,
+    'date_modification': DATE,
+    'derniere_calibration': DATE,
+    
+    # Affichage seulement
+    'actions_requises': DISPLAY,
+    'pointes_consommation': DISPLAY,
+    'duree_prevue': DISPLAY,
+    'equipements_utilises': DISPLAY,
+    'composants_affectes': DISPLAY,
+    'pieces_requises': DISPLAY,
+}
+
+# Champs présents dans tous les index
+COMMON_FIELDS = (
+    '@timestamp', 'timestamp', 'source_file', 'file_type', 'data_type', 'upload_timestamp', 'ingested_at',
+    'batiment', 'salle', 'zone', 'etage',
+)
+
+# Champs propres à chaque type de données
+DATA_TYPE_FIELDS = {
+    'alertes': (
+        'id_alerte', 'type_alerte', 'categorie', 'severite', 'priorite', 'statut', 'impact',
+        'capteur_id', 'equipement_id', 'code_erreur', 'technicien_assigne', 'technicien_assigné',
+        'valeur_actuelle', 'valeur_attendue', 'ecart_type', 'seuil', 'duree_depassement',
+        'temps_reponse_minutes', 'description', 'resolution', 'date_creation', 'date_modification',
+        'actions_requises',
+    ),
+    'capteurs': (
+        'capteur_id', 'id_capteur', 'device_id', 'type', 'type_capteur', 'statut_capteur', 'status',
+        'unite', 'valeur', 'batterie', 'precision', 'seuil_min', 'seuil_max', 'temperature',
+        'humidity', 'battery_level', 'signal_strength', 'co2_level', 'motion_detected',
+        'derniere_calibration',
+    ),
+    'consommation': (
+        'equipement_id', 'id_consommation', 'periode_mesure', 'type_energie', 'sous_type', 'unite',
+        'tendance', 'tarif', 'valeur_consommation', 'cout_estime', 'cout_unitaire',
+        'empreinte_carbone', 'comparaison_mois_precedent', 'facteur_charge', 'consommation_kwh',
+        'cout_euro', 'puissance_instantanee', 'facteur_puissance', 'pointes_consommation',
+    ),
+    'occupation': (
+        'salle_id', 'type_salle', 'evenement', 'organisateur', 'statut_occupation', 'capacite_max',
+        'nombre_personnes', 'personnes_presentes', 'taux_utilisation', 'taux_occupation',
+        'temperature_moyenne', 'co2_moyen', 'consommation_elec', 'duree_prevue',
+        'equipements_utilises',
+    ),
+    'maintenance': (
+        'intervention_id', 'equipement_id', 'type_equipement', 'marque', 'modele',
+        'type_maintenance', 'severite', 'prediction_panne', 'technicien', 'vie_restante',
+        'cout_estime', 'duree_intervention_estimee', 'historique_pannes', 'description',
+        'composants_affectes', 'pieces_requises',
+    ),
+}
+
+DATA_TYPES = tuple(DATA_TYPE_FIELDS)
+
+# Champs recherchés en priorité par type de données, avec leur boost ; le
+# reste du document est couvert par SEARCH_ALL_FIELD
+SEARCH_PROFILES = {
+    'alertes': {
+        'id_alerte': 4, 'capteur_id': 3, 'equipement_id': 3, 'code_erreur': 3, 'type_alerte': 3,
+        'categorie': 2, 'severite': 2, 'description': 2, 'batiment': 2, 'salle': 1.5, 'zone': 1.5,
+    },
+    'capteurs': {
+        'capteur_id': 4, 'id_capteur': 4, 'device_id': 4, 'type': 3, 'type_capteur': 3,
+        'statut_capteur': 2, 'batiment': 2, 'salle': 1.5, 'zone': 1.5,
+    },
+    'consommation': {
+        'equipement_id': 4, 'id_consommation': 4, 'type_energie': 3, 'sous_type': 2,
+        'batiment': 2, 'salle': 1.5, 'zone': 1.5,
+    },
+    'occupation': {
+        'salle_id': 4, 'type_salle': 3, 'evenement': 3, 'organisateur': 2, 'statut_occupation': 2,
+        'batiment': 2, 'salle': 2, 'zone': 1.5,
+    },
+    'maintenance': {
+        'intervention_id': 4, 'equipement_id': 4, 'type_equipement': 3, 'type_maintenance': 3,
+        'marque': 2, 'modele': 2, 'technicien': 2, 'severite': 2, 'description': 2,
+        'batiment': 2, 'zone': 1.5,
+    },
+}
+
+# Index de chaque type de données, plus iot-unknown pour les types non reconnus
+INDEX_TYPES = DATA_TYPES + ('unknown',)
+
+COMMON_COMPONENT = f'{INDEX_PREFIX}-common'
+TEMPLATE_PRIORITY = 200
+
+# Politique ILM de rollover des index iot-<type>-NNNNNN (index_lifecycle.py)
+LIFECYCLE_POLICY = f'{INDEX_PREFIX}-rollover'
+
+
+def fields_for(data_type: Optional[str]) -> Dict[str, str]:
+    """Champs (nom -> type) d'un type de données ; tous les champs si inconnu"""
+    names = COMMON_FIELDS + DATA_TYPE_FIELDS.get(data_type, tuple(FIELDS))
+    return {name: FIELDS[name] for name in names}
+
+
+# === Conversion à l'ingestion ===
+
+def _to_integer(value: str):
+    try:
+        return int(value)
+    except ValueError:
+        # "94.0" : Elasticsearch tronque à l'indexation
+        return float(value)
+
+
+CASTS = {
+    INTEGER: _to_integer,
+    DOUBLE: float,
+}
+
+
+def coerce(document: Dict[str, Any], data_type: Optional[str]) -> Dict[str, Any]:
+    """
+    Convertir les champs numériques arrivés en texte (lignes CSV)
+    
+    Une valeur non convertible (ex: "60%") est conservée telle quelle : elle
+    est ignorée à l'indexation (ignore_malformed) mais reste dans _source.
+    """
+    for name, field_type in fields_for(data_type).items():
+        cast = CASTS.get(field_type)
+        value = document.get(name)
+        if cast is None or not isinstance(value, str) or not value or value == 'NA':
+            continue
+        try:
+            document[name] = cast(value)
+        except ValueError:
+            pass
+    return document
+
+
+# === Noms de champs pour les requêtes ===
+
+# Types dont l'alias iot-<type> est encore un index concret d'avant le
+# registre (mapping dynamique, à migrer par setup_elasticsearch --reindex),
+# tenu à jour par index_lifecycle (setup_indices, detect_legacy_types)
+_legacy_types: FrozenSet[str] = frozenset()
+
+
+def set_legacy_types(data_types: Iterable[str]) -> None:
+    global _legacy_types
+    _legacy_types = frozenset(data_types)
+
+
+def legacy_types() -> FrozenSet[str]:
+    return _legacy_types
+
+
+def _covers_legacy(index: Optional[str]) -> bool:
+    """L'index (ou motif, liste séparée par des virgules) inclut-il un index d'avant le registre ?"""
+    if not _legacy_types:
+        return False
+    patterns = (index or f'{INDEX_PREFIX}-*').split(',')
+    return any(fnmatch.fnmatchcase(alias_name(data_type), pattern.strip())
+               for data_type in _legacy_types for pattern in patterns)
+
+
+def keyword_field(field: str, index: Optional[str] = None) -> str:
+    """
+    Champ à utiliser pour un filtre exact ou une agrégation terms
+    
+    Les champs keyword du registre s'utilisent tels quels ; les champs texte
+    et les champs inconnus (mapping dynamique) via leur sous-champ .keyword.
+    Hors des index iot-*, ou sur un index d'avant le registre pas encore
+    migré, le mapping dynamique s'applique.
+    """
+    name = field[:-len('.keyword')] if field.endswith('.keyword') else field
+    if (index is None or index.startswith(INDEX_PREFIX)) and FIELDS.get(name) == KEYWORD \
+            and not _covers_legacy(index):
+        # "severite.keyword" (mapping dynamique d'avant le registre) -> "severite"
+        return name
+    return f"{name}.keyword"
+
+
+# === Projection des documents renvoyés ===
+
+# Champs exclus par défaut des vues tableau : texte libre et listes
+PROJECTION_EXCLUDED_FIELDS = (
+    'description', 'resolution', 'actions_requises', 'pointes_consommation',
+    'equipements_utilises', 'composants_affectes', 'pieces_requises',
+)
+
+
+def data_type_for(index: Optional[str]) -> Optional[str]:
+    """Type de données d'un alias iot-<type> (ou du motif iot-<type>-*), None sinon"""
+    for data_type in INDEX_TYPES:
+        if index in (alias_name(data_type), f'{alias_name(data_type)}-*'):
+            return data_type
+    return None
+
+
+def source_filter(fields: Optional[str], index: Optional[str] = None, projection: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Filtre _source Elasticsearch depuis le paramètre fields
+    
+    fields liste les champs à renvoyer séparés par des virgules ; un champ
+    préfixé par '-' est exclu, '*' renvoie le document complet. Sans
+    fields, projection=True exclut les champs volumineux du type de données
+    de l'index (tous types pour iot-*), sinon le document est complet.
+    
+    Returns:
+        Valeur de _source, None pour le document complet
+    """
+    if not fields:
+        if not projection:
+            return None
+        excludes = [name for name in fields_for(data_type_for(index)) if name in PROJECTION_EXCLUDED_FIELDS]
+        return {'excludes': excludes} if excludes else None
+    
+    names = [name.strip() for name in fields.split(',') if name.strip()]
+    # _id et _score sont toujours renvoyés, hors _source
+    includes = [name for name in names if not name.startswith('-') and name not in ('_id', '_score')]
+    excludes = [name[1:] for name in names if name.startswith('-')]
+    if includes == ['*'] and not excludes:
+        return None
+    source = {}
+    if includes:
+        source['includes'] = includes
+    if excludes:
+        source['excludes'] = excludes
+    return source or None
+
+
+# === Recherche plein texte ===
+
+def search_fields(index: Optional[str] = None) -> Optional[List[str]]:
+    """
+    Champs du multi_match de la recherche plein texte sur un index
+    
+    Profil du type de l'alias iot-<type> ; pour un motif iot-* ou plusieurs
+    alias, union des profils concernés (boost le plus élevé). Toujours
+    complété par SEARCH_ALL_FIELD. None hors des index iot-* (pas de champ
+    catch-all : l'appelant garde la recherche sur tous les champs).
+    """
+    boosts = {}
+    for pattern in (index or f'{INDEX_PREFIX}-*').split(','):
+        data_type = data_type_for(pattern.strip())
+        if data_type in SEARCH_PROFILES:
+            profiles = [SEARCH_PROFILES[data_type]]
+        elif pattern.strip().startswith(INDEX_PREFIX):
+            profiles = SEARCH_PROFILES.values()
+        else:
+            return None
+        for profile in profiles:
+            for name, boost in profile.items():
+                boosts[name] = max(boosts.get(name, 0), boost)
+    return [f'{name}^{boost:g}' for name, boost in boosts.items()] + [SEARCH_ALL_FIELD]
+
+
+# === Templates Elasticsearch ===
+
+def field_mapping(field_type: str) -> Dict[str, Any]:
+    """Mapping d'un champ ; les champs textuels et identifiants alimentent SEARCH_ALL_FIELD"""
+    if field_type in SEARCHABLE_TYPES:
+        return {**FIELD_MAPPINGS[field_type], 'copy_to': SEARCH_ALL_FIELD}
+    return FIELD_MAPPINGS[field_type]
+
+
+def properties(fields: Dict[str, str]) -> Dict[str, Any]:
+    return {name: field_mapping(field_type) for name, field_type in fields.items()}
+
+
+def search_mapping(data_type: Optional[str]) -> Dict[str, Any]:
+    """
+    Mapping à ajouter aux index existants d'un type pour la recherche
+    (SEARCH_ALL_FIELD et copy_to), voir index_lifecycle.update_search_mapping
+    """
+    searchable = {name: field_type for name, field_type in fields_for(data_type).items()
+                  if field_type in SEARCHABLE_TYPES}
+    return {SEARCH_ALL_FIELD: FIELD_MAPPINGS[TEXT], **properties(searchable)}
+
+
+def common_component_template() -> Dict[str, Any]:
+    """Réglages et champs communs à tous les index iot-*"""
+    return {
+        'settings': {
+            # Une valeur invalide (ex: "60%" pour un double) n'est pas indexée
+            # mais ne fait pas rejeter le document
+            'index.mapping.ignore_malformed': True,
+            # Segments triés du plus récent au plus ancien : une requête triée
+            # sur @timestamp desc (les N derniers documents) s'arrête dès les
+            # premiers documents de chaque segment
+            'index.sort.field': '@timestamp',
+            'index.sort.order': 'desc',
+            'index.lifecycle.name': LIFECYCLE_POLICY,
+            'index.final_pipeline': INGEST_PIPELINE,
+        },
+        'mappings': {
+            # Champs inconnus : texte + .keyword, comme le mapping dynamique
+            # par défaut, et recherchables via SEARCH_ALL_FIELD
+            'dynamic_templates': [{
+                'strings': {
+                    'match_mapping_type': 'string',
+                    'mapping': field_mapping(LABEL),
+                }
+            }],
+            'properties': {
+                SEARCH_ALL_FIELD: FIELD_MAPPINGS[TEXT],
+                **properties({name: FIELDS[name] for name in COMMON_FIELDS}),
+            },
+        },
+    }
+
+
+def component_template(data_type: Optional[str]) -> Dict[str, Any]:
+    """Champs d'un type de données (tous les champs connus pour iot-unknown-*)"""
+    return {'mappings': {'properties': properties(fields_for(data_type))}}
+
+
+def alias_name(data_type: str) -> str:
+    """Alias d'un type : écriture dans l'index courant, lecture de tous ses index"""
+    return f'{INDEX_PREFIX}-{data_type}'
+
+
+def index_templates() -> Dict[str, Dict[str, Any]]:
+    """
+    Templates composables à installer
+    
+    Les index iot-<type>-000001, -000002... créés par rollover reçoivent le
+    template de leur type ; iot-<type> est leur alias.
+    
+    Returns:
+        {'component': {nom: template}, 'index': {nom: corps de put_index_template}}
+    """
+    components = {COMMON_COMPONENT: common_component_template()}
+    templates = {}
+    for data_type in INDEX_TYPES:
+        name = alias_name(data_type)
+        component = f'{name}-mappings'
+        components[component] = component_template(data_type if data_type in DATA_TYPES else None)
+        templates[name] = {
+            'index_patterns': [f'{name}-*'],
+            'composed_of': [COMMON_COMPONENT, component],
+            'priority': TEMPLATE_PRIORITY,
+            'template': {'settings': {'index.lifecycle.rollover_alias': name}},
+            'meta': {'managed_by': 'api.schemas'},
+        }
+    return {'component': components, 'index': templates}
+
+
+def ingest_pipeline() -> Dict[str, Any]:
+    """Pipeline INGEST_PIPELINE : INGESTED_FIELD = date de l'indexation"""
+    return {
+        'description': "Date d'indexation des documents iot-* (api.schemas)",
+        'processors': [{'set': {'field': INGESTED_FIELD, 'value': '{{{_ingest.timestamp}}}'}}],
+    }
+
+
+def install_templates(es) -> Dict[str, int]:
+    """
+    Installer (ou mettre à jour) le pipeline d'ingestion et les templates sur le cluster
+    
+    Ne s'applique qu'aux indices créés ensuite (voir index_lifecycle.py
+    pour la politique de rollover et la création des premiers index).
+    """
+    es.ingest.put_pipeline(id=INGEST_PIPELINE, **ingest_pipeline())
+    templates = index_templates()
+    for name, template in templates['component'].items():
+        es.cluster.put_component_template(name=name, template=template)
+    for name, body in templates['index'].items():
+        es.indices.put_index_template(name=name, **body)
+    return {'component': len(templates['component']), 'index': len(templates['index'])}
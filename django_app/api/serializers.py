@@ -1,8 +1,14 @@
 """
 Serializers pour l'API REST
 """
+from django.conf import settings
 from rest_framework import serializers
 from .models import FileUploadHistory, ElasticsearchQuery
+from .upload_parsers import detect_format, SUPPORTED_EXTENSIONS
+from .exporters import EXPORT_FORMATS
+from .rollups import DIMENSIONS, HISTOGRAM_INTERVALS
+from .live_stream import FILTER_FIELDS, POLICIES, parse_filters
+from .schemas import DATA_TYPES
 
 
 class FileUploadHistorySerializer(serializers.ModelSerializer):
@@ -21,20 +27,20 @@ class FileUploadSerializer(serializers.Serializer):
     
     def validate_file(self, value):
         """Valider le fichier uploadé"""
-        # Vérifier l'extension
-        allowed_extensions = ['.csv', '.json']
-        file_ext = value.name.lower().split('.')[-1]
+        # Vérifier l'extension (formats compressés .gz/.zst inclus)
+        file_type, _ = detect_format(value.name)
         
-        if f'.{file_ext}' not in allowed_extensions:
+        if file_type is None:
             raise serializers.ValidationError(
-                f"Format de fichier non supporté. Formats acceptés: {', '.join(allowed_extensions)}"
+                f"Format de fichier non supporté. Formats acceptés: {', '.join(SUPPORTED_EXTENSIONS)}"
             )
         
-        # Vérifier la taille (max 16MB)
-        max_size = 16 * 1024 * 1024
-        if value.size > max_size:
+        # Vérifier la taille (le parsing se fait en flux, la limite ne
+        # dépend donc pas de la mémoire disponible)
+        max_size = settings.FILE_UPLOAD_MAX_SIZE
+        if max_size and value.size > max_size:
             raise serializers.ValidationError(
-                f"Fichier trop volumineux. Taille maximum: 16MB"
+                f"Fichier trop volumineux. Taille maximum: {max_size // (1024 * 1024)}MB"
             )
         
         return value
@@ -92,13 +98,40 @@ class ElasticsearchQuerySerializer(serializers.ModelSerializer):
         read_only_fields = ('created_at',)
 
 
-class SearchRequestSerializer(serializers.Serializer):
-    """Serializer pour les requêtes de recherche"""
+class PageRequestSerializer(serializers.Serializer):
+    """
+    Pagination des recherches
+    
+    Par offset (from_offset + size, limité à index.max_result_window) ou par
+    curseur : pagination=cursor pour la première page, puis cursor=<next_cursor>.
+    Par curseur, le total n'est compté que sur demande (total=true à la
+    première page) : sans comptage, la recherche triée sur @timestamp
+    s'arrête dès les premiers documents de chaque segment (index.sort).
+    """
     
-    query = serializers.CharField(required=False, allow_blank=True)
-    index = serializers.CharField(required=False, allow_blank=True, default=None)
     size = serializers.IntegerField(required=False, default=50, min_value=1, max_value=10000)
     from_offset = serializers.IntegerField(required=False, default=0, min_value=0)
+    pagination = serializers.ChoiceField(choices=['offset', 'cursor'], required=False, default='offset')
+    cursor = serializers.CharField(required=False, allow_blank=True)
+    total = serializers.BooleanField(required=False, default=False)
+    
+    def validate(self, attrs):
+        max_window = settings.ELASTICSEARCH_MAX_RESULT_WINDOW
+        if not attrs.get('cursor') and attrs['pagination'] == 'offset' \
+                and attrs['from_offset'] + attrs['size'] > max_window:
+            raise serializers.ValidationError(
+                f"from + size ne peut dépasser {max_window} : utiliser pagination=cursor"
+            )
+        return attrs
+
+
+class SearchCriteriaSerializer(serializers.Serializer):
+    """Critères de recherche : texte, index, filtres et tri"""
+    
+    query = serializers.CharField(required=False, allow_blank=True)
+    index = serializers.CharField(required=False, allow_blank=True, default=None)
+    # Tolérance aux fautes de frappe (fuzziness AUTO), plus coûteuse : sur demande
+    fuzzy = serializers.BooleanField(required=False, default=False)
     
     # Filtres
     device_id = serializers.CharField(required=False, allow_blank=True)
@@ -111,6 +144,9 @@ class SearchRequestSerializer(serializers.Serializer):
     date_from = serializers.DateTimeField(required=False, allow_null=True)
     date_to = serializers.DateTimeField(required=False, allow_null=True)
     
+    # Projection : champs séparés par des virgules, '-champ' pour exclure
+    fields = serializers.CharField(required=False, allow_blank=True)
+    
     # Sorting
     sort_by = serializers.CharField(required=False, default='@timestamp')
     sort_order = serializers.ChoiceField(
@@ -120,6 +156,19 @@ class SearchRequestSerializer(serializers.Serializer):
     )
 
 
+class SearchRequestSerializer(PageRequestSerializer, SearchCriteriaSerializer):
+    """Serializer pour les requêtes de recherche"""
+
+
+class ExportRequestSerializer(SearchCriteriaSerializer):
+    """Serializer pour les exports (mêmes critères que SearchRequestSerializer)"""
+    
+    # 'format' est réservé par DRF (négociation du rendu)
+    output = serializers.ChoiceField(choices=list(EXPORT_FORMATS), required=False, default='ndjson')
+    compress = serializers.BooleanField(required=False, default=False)
+    batch_size = serializers.IntegerField(required=False, default=1000, min_value=1, max_value=10000)
+
+
 class AggregationRequestSerializer(serializers.Serializer):
     """Serializer pour les requêtes d'agrégation"""
     
@@ -137,3 +186,42 @@ class AggregationRequestSerializer(serializers.Serializer):
     
     # Pour range
     ranges = serializers.ListField(required=False, allow_empty=True)
+
+
+class ConsumptionReportSerializer(serializers.Serializer):
+    """Période et filtres des statistiques et histogrammes de consommation"""
+    
+    date_from = serializers.DateTimeField(required=False, allow_null=True, default=None)
+    date_to = serializers.DateTimeField(required=False, allow_null=True, default=None)
+    batiment = serializers.CharField(required=False, allow_blank=True)
+    zone = serializers.CharField(required=False, allow_blank=True)
+    type_energie = serializers.CharField(required=False, allow_blank=True)
+    sous_type = serializers.CharField(required=False, allow_blank=True)
+    # Histogrammes (UTC) : rollups journaliers utilisés à partir de day
+    interval = serializers.ChoiceField(choices=list(HISTOGRAM_INTERVALS), required=False, default='day')
+    
+    def validate(self, attrs):
+        if attrs['date_from'] and attrs['date_to'] and attrs['date_from'] >= attrs['date_to']:
+            raise serializers.ValidationError("date_from doit précéder date_to")
+        attrs['filters'] = {name: attrs.pop(name) for name in DIMENSIONS if attrs.get(name)}
+        return attrs
+
+
+class LiveStreamSerializer(serializers.Serializer):
+    """Abonnement au flux temps réel : filtres (valeurs séparées par des virgules), tampon et politique"""
+    
+    data_type = serializers.CharField(required=False, allow_blank=True)
+    batiment = serializers.CharField(required=False, allow_blank=True)
+    severite = serializers.CharField(required=False, allow_blank=True)
+    buffer = serializers.IntegerField(required=False, default=None, min_value=1)
+    policy = serializers.ChoiceField(choices=list(POLICIES), required=False, default=None)
+    
+    def validate_data_type(self, value):
+        unknown = [name for name in value.split(',') if name.strip() and name.strip() not in DATA_TYPES]
+        if unknown:
+            raise serializers.ValidationError(f"Types de données inconnus: {', '.join(unknown)}")
+        return value
+    
+    def validate(self, attrs):
+        attrs['filters'] = parse_filters({name: attrs.pop(name, None) for name in FILTER_FIELDS})
+        return attrs
@@ -0,0 +1,194 @@
+"""
+Cache Redis des réponses statistiques (endpoints *StatsView)
+
+Une réponse est mise en cache sous une clé construite depuis l'endpoint,
+ses paramètres et le numéro de génération de chaque index interrogé :
+
+    iot:cache:<endpoint>:<hash des paramètres>:<générations>
+
+L'indexeur incrémente la génération des index qu'il vient d'alimenter
+après chaque lot (bump) : les clés suivantes changent, les anciennes
+entrées ne sont plus lues et expirent d'elles-mêmes. Le TTL couvre les
+écritures qui ne passent pas par l'indexeur (Logstash, scripts ingest_all).
+
+Le cache ne doit jamais casser un endpoint : si Redis est indisponible,
+la réponse est calculée directement.
+
+Ce module n'importe pas Django.
+"""
+import fnmatch
+import hashlib
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import redis
+
+from .schemas import INDEX_TYPES, alias_name
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PREFIX = 'iot:cache'
+DEFAULT_CACHE_TTL = 300
+
+
+def cache_indices(index: str) -> List[str]:
+    """
+    Index dont dépend une requête, au sens des générations
+    
+    'iot-*' dépend de tous les alias iot-<type> ; un index hors registre
+    (sensors-*...) n'a pas de génération et ne dépend que du TTL.
+    """
+    aliases = [alias_name(data_type) for data_type in INDEX_TYPES]
+    matched = [alias for alias in aliases if any(
+        fnmatch.fnmatchcase(alias, pattern) for pattern in index.split(',')
+    )]
+    return matched or [index]
+
+
+class StatsCache:
+    """Cache des réponses par génération d'index, avec compteurs hit/miss par endpoint"""
+    
+    def __init__(self, client, prefix: str = DEFAULT_CACHE_PREFIX, ttl: int = DEFAULT_CACHE_TTL):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+    
+    @property
+    def counters_key(self) -> str:
+        return f'{self.prefix}:counters'
+    
+    def generation_key(self, index: str) -> str:
+        return f'{self.prefix}:gen:{index}'
+    
+    def generations(self, indices: Iterable[str]) -> List[int]:
+        values = self.client.mget([self.generation_key(index) for index in indices])
+        return [int(value or 0) for value in values]
+    
+    def bump(self, indices: Iterable[str]) -> None:
+        """Nouvelles données dans ces index : invalider les réponses qui en dépendent"""
+        indices = set(indices)
+        if not indices:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for index in indices:
+            pipe.incr(self.generation_key(index))
+        pipe.execute()
+    
+    def key(self, endpoint: str, params: Dict[str, Any], indices: List[str]) -> str:
+        return self._key(endpoint, params, self.generations(indices))
+    
+    def _key(self, endpoint: str, params: Dict[str, Any], generations: List[int]) -> str:
+        payload = json.dumps(params, sort_keys=True, default=str)
+        digest = hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+        generations = '.'.join(str(generation) for generation in generations)
+        return f'{self.prefix}:{endpoint}:{digest}:{generations}'
+    
+    @staticmethod
+    def cacheable(result: Any) -> bool:
+        """Une réponse en erreur ou partielle (failed_sections) n'est pas mise en cache"""
+        return not (isinstance(result, dict) and ('error' in result or result.get('failed_sections')))
+    
+    def get_or_compute(
+        self,
+        endpoint: str,
+        index: str,
+        compute: Callable[[], Dict[str, Any]],
+        params: Optional[Dict[str, Any]] = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Réponse en cache, ou calculée puis mise en cache
+        
+        Une réponse en erreur ({'error': ...}) ou partielle (failed_sections
+        non vide) n'est pas mise en cache.
+        
+        Returns:
+            (réponse, True si lue dans le cache)
+        """
+        try:
+            key = self.key(endpoint, params or {}, cache_indices(index))
+            cached = self.client.get(key)
+        except redis.RedisError as e:
+            logger.warning(f"Cache statistiques indisponible: {e}")
+            return compute(), False
+        
+        if cached is not None:
+            self._count(endpoint, 'hits')
+            return json.loads(cached), True
+        
+        self._count(endpoint, 'misses')
+        result = compute()
+        if self.cacheable(result):
+            try:
+                self.client.set(key, json.dumps(result, default=str), ex=self.ttl)
+            except redis.RedisError as e:
+                logger.warning(f"Mise en cache impossible: {e}")
+        return result, False
+    
+    def _count(self, endpoint: str, outcome: str):
+        try:
+            self.client.hincrby(self.counters_key, f'{endpoint}:{outcome}', 1)
+        except redis.RedisError:
+            pass
+    
+    def counters(self) -> Dict[str, Dict[str, Any]]:
+        """{endpoint: {'hits', 'misses', 'hit_ratio'}}"""
+        counters = {}
+        for field, value in self.client.hgetall(self.counters_key).items():
+            endpoint, _, outcome = field.rpartition(':')
+            counters.setdefault(endpoint, {'hits': 0, 'misses': 0})[outcome] = int(value)
+        for values in counters.values():
+            total = values['hits'] + values['misses']
+            values['hit_ratio'] = round(values['hits'] / total, 3) if total else None
+        return counters
+    
+    def reset_counters(self) -> None:
+        self.client.delete(self.counters_key)
+
+
+class AsyncStatsCache(StatsCache):
+    """
+    Même cache sur un client redis.asyncio (vues asynchrones, déploiement ASGI)
+    
+    Mêmes clés et mêmes compteurs que StatsCache : les deux variantes
+    partagent les entrées et l'invalidation par l'indexeur. Seule la lecture
+    est asynchrone : bump, counters et reset_counters restent sur StatsCache.
+    """
+    
+    async def generations(self, indices: Iterable[str]) -> List[int]:
+        values = await self.client.mget([self.generation_key(index) for index in indices])
+        return [int(value or 0) for value in values]
+    
+    async def get_or_compute(
+        self,
+        endpoint: str,
+        index: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+        params: Optional[Dict[str, Any]] = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Comme StatsCache.get_or_compute ; compute est une coroutine"""
+        try:
+            key = self._key(endpoint, params or {}, await self.generations(cache_indices(index)))
+            cached = await self.client.get(key)
+        except redis.RedisError as e:
+            logger.warning(f"Cache statistiques indisponible: {e}")
+            return await compute(), False
+        
+        if cached is not None:
+            await self._count(endpoint, 'hits')
+            return json.loads(cached), True
+        
+        await self._count(endpoint, 'misses')
+        result = await compute()
+        if self.cacheable(result):
+            try:
+                await self.client.set(key, json.dumps(result, default=str), ex=self.ttl)
+            except redis.RedisError as e:
+                logger.warning(f"Mise en cache impossible: {e}")
+        return result, False
+    
+    async def _count(self, endpoint: str, outcome: str):
+        try:
+            await self.client.hincrby(self.counters_key, f'{endpoint}:{outcome}', 1)
+        except redis.RedisError:
+            pass
@@ -0,0 +1,619 @@
+"""
+Tests de l'API (python manage.py test)
+"""
+import asyncio
+import gzip
+import json
+import tempfile
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from unittest import mock
+
+import redis
+from django.core.files.base import ContentFile
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from . import async_views, rollups
+from .elasticsearch_service import ElasticsearchService
+from .exporters import aiter_export, iter_export
+from .index_lifecycle import detect_legacy_types, locate_documents
+from .indexer import BulkIndexer, StreamSource, build_actions
+from .metrics import Metrics
+from .models import FileUploadHistory
+from .query_cache import QueryCache
+from .redis_queue import REDELIVERY_FIELD, STREAM_MESSAGE_FIELD, build_metadata, mark_redelivery
+from .redis_streams import StreamConsumer, stream_backlog
+from .schemas import keyword_field, set_legacy_types
+from .upload_jobs import previously_uploaded, process_upload, recover_uploads
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class RecoverUploadsTests(TestCase):
+    """Reprise des uploads abandonnés par un processus arrêté (upload_jobs.recover_uploads)"""
+    
+    def create_upload(self, status, age, stored=True, heartbeat=True):
+        upload = FileUploadHistory.objects.create(
+            filename='logs_alertes.ndjson', file_type='ndjson', data_type='alertes',
+            records_count=0, status=status
+        )
+        if stored:
+            upload.stored_file.save('logs_alertes.ndjson', ContentFile(b'{"id_alerte": "A1"}\n'))
+        moment = timezone.now() - timedelta(seconds=age)
+        FileUploadHistory.objects.filter(pk=upload.pk).update(
+            uploaded_at=moment, heartbeat_at=moment if heartbeat and status == 'processing' else None
+        )
+        return upload.pk
+    
+    def status(self, upload_id):
+        return FileUploadHistory.objects.get(pk=upload_id).status
+    
+    def test_stale_uploads_are_put_back_in_queue(self):
+        pending = self.create_upload('pending', age=600)
+        processing = self.create_upload('processing', age=600)
+        recovered = recover_uploads(stale_after=300)
+        self.assertEqual(sorted(recovered['resubmitted']), sorted([pending, processing]))
+        self.assertEqual(self.status(processing), 'pending')
+    
+    def test_recent_and_finished_uploads_are_left_alone(self):
+        recent = self.create_upload('processing', age=10)
+        done = self.create_upload('completed', age=600)
+        recovered = recover_uploads(stale_after=300)
+        self.assertEqual(recovered, {'resubmitted': [], 'failed': []})
+        self.assertEqual(self.status(recent), 'processing')
+        self.assertEqual(self.status(done), 'completed')
+    
+    def test_upload_without_stored_file_fails(self):
+        missing = self.create_upload('processing', age=600, stored=False)
+        recovered = recover_uploads(stale_after=300)
+        self.assertEqual(recovered['failed'], [missing])
+        self.assertEqual(self.status(missing), 'failed')
+    
+    def test_fail_option_marks_uploads_failed(self):
+        upload = self.create_upload('pending', age=600)
+        recover_uploads(stale_after=300, resubmit=False)
+        self.assertEqual(self.status(upload), 'failed')
+    
+    def test_upload_claimed_elsewhere_is_not_processed_twice(self):
+        upload = self.create_upload('processing', age=10)
+        process_upload(upload)
+        self.assertEqual(self.status(upload), 'processing')
+    
+    def test_same_file_sent_again_is_a_redelivery(self):
+        upload = self.create_upload('pending', age=10)
+        self.assertFalse(previously_uploaded('logs_alertes.ndjson', 'alertes', exclude=upload))
+        self.create_upload('completed', age=600)
+        self.assertTrue(previously_uploaded('logs_alertes.ndjson', 'alertes', exclude=upload))
+        self.assertFalse(previously_uploaded('logs_alertes.ndjson', 'capteurs'))
+
+
+class PendingStream:
+    """Stream minimal : entrées en attente (PEL) d'un consommateur, sans nouvelles entrées"""
+    
+    def __init__(self, count):
+        self.pending = [
+            (f'{n}-0', {STREAM_MESSAGE_FIELD: json.dumps({'data_type': 'alertes', 'data': {'id_alerte': n}})})
+            for n in range(1, count + 1)
+        ]
+    
+    def xgroup_create(self, *args, **kwargs):
+        return True
+    
+    def xreadgroup(self, group, consumer, streams, count=None, block=None):
+        (key, start_id), = streams.items()
+        if start_id == '>':
+            return []
+        start = tuple(int(part) for part in start_id.split('-')) if '-' in start_id else (int(start_id), 0)
+        after = [entry for entry in self.pending if tuple(int(part) for part in entry[0].split('-')) > start]
+        return [(key, after[:count])] if after else []
+    
+    def xautoclaim(self, *args, **kwargs):
+        return ['0-0', [], []]
+    
+    def xack(self, key, group, *entry_ids):
+        self.pending = [entry for entry in self.pending if entry[0] not in entry_ids]
+        return len(entry_ids)
+
+
+class StreamPendingBacklogTests(TestCase):
+    """Relecture des entrées en attente pendant la constitution d'un lot (StreamConsumer.read_batch)"""
+    
+    def collect(self, source):
+        indexer = BulkIndexer(None, source, batch_size=5000, chunk_size=1000, flush_interval=0.05)
+        return indexer.collect()
+    
+    def test_pending_entries_are_read_once_per_batch(self):
+        batch = self.collect(StreamSource(StreamConsumer(PendingStream(10), block_ms=1)))
+        self.assertEqual([entry_id for entry_id, _ in batch], [f'{n}-0' for n in range(1, 11)])
+    
+    def test_pending_backlog_is_paged(self):
+        consumer = StreamConsumer(PendingStream(25), batch_size=10, block_ms=1)
+        pages = [consumer.read_batch() for _ in range(4)]
+        self.assertEqual([len(page) for page in pages], [10, 10, 5, 0])
+    
+    def test_released_entries_are_read_again(self):
+        source = StreamSource(StreamConsumer(PendingStream(3), block_ms=1))
+        source.release(self.collect(source))
+        self.assertEqual(len(self.collect(source)), 3)
+
+
+class RefreshRecorder:
+    """Client Elasticsearch et cache minimaux qui notent l'ordre des appels"""
+    
+    def __init__(self):
+        self.calls = []
+        self.indices = self
+    
+    def refresh(self, index, **kwargs):
+        self.calls.append(('refresh', index))
+    
+    def bump(self, indices):
+        self.calls.append(('bump', list(indices)))
+
+
+class CacheInvalidationTests(SimpleTestCase):
+    """Invalidation du cache des statistiques une fois le lot visible (BulkIndexer.flush)"""
+    
+    def test_touched_indices_are_refreshed_before_bump(self):
+        recorder = RefreshRecorder()
+        source = mock.Mock(key='iot:data')
+        indexer = BulkIndexer(recorder, source, cache=recorder)
+        batch = [(n, {'data_type': data_type, 'data': {}}) for n, data_type in enumerate(['capteurs', 'alertes'])]
+        with mock.patch('api.indexer.index_messages', return_value=(2, [])):
+            self.assertEqual(indexer.flush(batch), 2)
+        self.assertEqual(recorder.calls, [
+            ('refresh', 'iot-alertes,iot-capteurs'),
+            ('bump', ['iot-alertes', 'iot-capteurs']),
+        ])
+
+
+class StreamGroups:
+    """Stream minimal : XINFO GROUPS et XLEN d'un stream borné par MAXLEN"""
+    
+    def __init__(self, length, groups):
+        self.length = length
+        self.groups = groups
+    
+    def xinfo_groups(self, key):
+        if self.groups is None:
+            raise redis.ResponseError('no such key')
+        return self.groups
+    
+    def xlen(self, key):
+        return self.length
+
+
+class StreamBacklogTests(SimpleTestCase):
+    """Retard du groupe de consommateurs sur le stream d'ingestion (redis_streams.stream_backlog)"""
+    
+    def test_acknowledged_entries_kept_by_maxlen_are_not_counted(self):
+        groups = [
+            {'name': 'autre', 'lag': 900, 'pending': 0},
+            {'name': 'iot-ingest', 'lag': 12, 'pending': 3},
+        ]
+        self.assertEqual(stream_backlog(StreamGroups(1000, groups), 'iot:stream', 'iot-ingest'), 15)
+    
+    def test_unknown_lag_falls_back_to_stream_length(self):
+        self.assertEqual(stream_backlog(StreamGroups(1000, []), 'iot:stream', 'iot-ingest'), 1000)
+        groups = [{'name': 'iot-ingest', 'lag': None, 'pending': 3}]
+        self.assertEqual(stream_backlog(StreamGroups(1000, groups), 'iot:stream', 'iot-ingest'), 1000)
+        self.assertEqual(stream_backlog(StreamGroups(0, None), 'iot:stream', 'iot-ingest'), 0)
+
+
+class LegacyKeywordFieldTests(SimpleTestCase):
+    """Noms de champs des filtres et agrégations selon l'état des index (schemas.keyword_field)"""
+    
+    def tearDown(self):
+        set_legacy_types(())
+    
+    def test_registry_keyword_fields_are_used_as_is(self):
+        self.assertEqual(keyword_field('severite', 'iot-alertes'), 'severite')
+        self.assertEqual(keyword_field('severite.keyword', 'iot-alertes'), 'severite')
+    
+    def test_legacy_index_keeps_keyword_subfield(self):
+        set_legacy_types(['alertes'])
+        self.assertEqual(keyword_field('severite', 'iot-alertes'), 'severite.keyword')
+        self.assertEqual(keyword_field('data_type', 'iot-*'), 'data_type.keyword')
+        self.assertEqual(keyword_field('severite', 'iot-maintenance'), 'severite')
+    
+    def test_legacy_types_are_detected_from_concrete_indices(self):
+        class Indices:
+            def get_alias(self, index):
+                return {'iot-alertes': {'aliases': {}}, 'iot-capteurs-000001': {'aliases': {'iot-capteurs': {}}}}
+        
+        class Client:
+            indices = Indices()
+        
+        self.assertEqual(detect_legacy_types(Client()), ['alertes'])
+        self.assertEqual(keyword_field('severite', 'iot-alertes'), 'severite.keyword')
+
+
+class StoredDocuments:
+    """Client Elasticsearch réduit à msearch sur des documents déjà indexés {_id: index}"""
+    
+    def __init__(self, stored):
+        self.stored = stored
+        self.searches = []
+    
+    def msearch(self, searches):
+        self.searches.append(searches)
+        responses = []
+        for header, body in zip(searches[::2], searches[1::2]):
+            hits = [
+                {'_index': self.stored[doc_id], '_id': doc_id}
+                for doc_id in body['query']['ids']['values']
+                if self.stored.get(doc_id, '').startswith(header['index'])
+            ]
+            responses.append({'hits': {'hits': hits}})
+        return {'responses': responses}
+
+
+class LocateDocumentsTests(SimpleTestCase):
+    """Remplacement des documents déjà indexés après un rollover (index_lifecycle.locate_documents)"""
+    
+    def actions(self, *alert_ids):
+        return list(build_actions(
+            {'data_type': 'alertes', 'data': {'id_alerte': alert_id, 'severite': 'basse'}}
+            for alert_id in alert_ids
+        ))
+    
+    def test_existing_documents_are_written_to_their_index(self):
+        es = StoredDocuments({'A1': 'iot-alertes-000001', 'A2': 'iot-alertes-000002'})
+        actions = self.actions('A1', 'A2', 'A3')
+        self.assertEqual(locate_documents(es, actions), 2)
+        self.assertEqual([action['_index'] for action in actions],
+                         ['iot-alertes-000001', 'iot-alertes-000002', 'iot-alertes'])
+        self.assertEqual(len(es.searches), 1)
+    
+    def test_ids_are_looked_up_per_alias_in_chunks(self):
+        es = StoredDocuments({'A1': 'iot-alertes-000001', 'C1': 'iot-capteurs-000001'})
+        actions = self.actions('A1', 'A2', 'A3', 'C1')
+        self.assertEqual(locate_documents(es, actions, chunk_size=2), 1)
+        headers = [header['index'] for header in es.searches[0][::2]]
+        self.assertEqual(headers, ['iot-alertes', 'iot-alertes'])
+        self.assertEqual(actions[0]['_index'], 'iot-alertes-000001')
+    
+    def test_failed_lookup_keeps_the_write_alias(self):
+        class Failing(StoredDocuments):
+            def msearch(self, searches):
+                return {'responses': [{'error': {'type': 'search_phase_execution_exception'}}]}
+        
+        actions = self.actions('A1')
+        self.assertEqual(locate_documents(Failing({}), actions), 0)
+        self.assertEqual(actions[0]['_index'], 'iot-alertes')
+
+
+class RedeliveryMarkTests(SimpleTestCase):
+    """Marque des messages peut-être déjà indexés, seuls cherchés par Logstash (redis_queue)"""
+    
+    def test_first_delivery_is_not_marked(self):
+        self.assertNotIn(REDELIVERY_FIELD, build_metadata('a.csv', 'csv', 'alertes'))
+        self.assertTrue(build_metadata('a.csv', 'csv', 'alertes', redelivery=True)[REDELIVERY_FIELD])
+    
+    def test_replayed_messages_are_marked(self):
+        message = json.dumps({'data_type': 'alertes', 'data': {'id_alerte': 'A1'}})
+        self.assertTrue(json.loads(mark_redelivery(message))[REDELIVERY_FIELD])
+        self.assertTrue(json.loads(mark_redelivery({'data': {}}))[REDELIVERY_FIELD])
+        self.assertEqual(mark_redelivery('pas du json'), 'pas du json')
+        self.assertEqual(mark_redelivery('[1, 2]'), '[1, 2]')
+
+
+class CoalescedCancellationTests(SimpleTestCase):
+    """Annulation d'un appel coalescé (query_cache.aget_or_call)"""
+    
+    def run_callers(self, cancelled):
+        """Trois appels identiques ; l'appel n° cancelled est annulé pendant la recherche"""
+        async def scenario():
+            cache = QueryCache()
+            release = asyncio.Event()
+            calls = []
+            
+            async def search():
+                calls.append(1)
+                await release.wait()
+                return {'hits': 3}
+            
+            tasks = [asyncio.ensure_future(cache.aget_or_call('k', search)) for _ in range(3)]
+            await asyncio.sleep(0)
+            tasks[cancelled].cancel()
+            await asyncio.sleep(0)
+            release.set()
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            cached = await cache.aget_or_call('k', search)
+            return results, len(calls), cached
+        
+        return asyncio.run(scenario())
+    
+    def test_leader_cancellation_does_not_reach_followers(self):
+        results, calls, cached = self.run_callers(cancelled=0)
+        self.assertIsInstance(results[0], asyncio.CancelledError)
+        self.assertEqual(results[1:], [{'hits': 3}, {'hits': 3}])
+        self.assertEqual(calls, 1)
+        self.assertEqual(cached, {'hits': 3})
+    
+    def test_follower_cancellation_does_not_reach_leader(self):
+        results, calls, _ = self.run_callers(cancelled=1)
+        self.assertEqual(results[0], {'hits': 3})
+        self.assertIsInstance(results[1], asyncio.CancelledError)
+        self.assertEqual(calls, 1)
+
+
+EXPORTED = [
+    {'_id': 'A1', 'id_alerte': 'A1', 'severite': 'critique', 'valeur': 3.5, '_score': None},
+    {'_id': 'A2', 'id_alerte': 'A2', 'severite': 'basse', 'details': {'zone': 'B'}},
+]
+
+
+async def exported_documents(**criteria):
+    for document in EXPORTED:
+        yield dict(document)
+
+
+async def read_stream(content):
+    return b''.join([chunk async for chunk in content])
+
+
+class AsyncExportTests(SimpleTestCase):
+    """Export en flux sous ASGI (exporters.aiter_export, async_views.ExportView)"""
+    
+    def test_async_export_matches_sync_export(self):
+        for export_format in ('ndjson', 'csv'):
+            expected = b''.join(iter_export(
+                [dict(document) for document in EXPORTED], export_format, index='iot-alertes', chunk_size=16
+            ))
+            exported = asyncio.run(read_stream(aiter_export(
+                exported_documents(), export_format, index='iot-alertes', chunk_size=16
+            )))
+            self.assertEqual(exported, expected)
+    
+    def test_view_streams_asynchronously(self):
+        request = RequestFactory().get('/api/export/', {'index': 'iot-alertes', 'compress': 'true'})
+        
+        async def export():
+            response = await async_views.ExportView().get(request)
+            return response, await read_stream(response.streaming_content)
+        
+        with mock.patch.object(async_views.es_service, 'iter_documents', exported_documents):
+            response, content = asyncio.run(export())
+        self.assertTrue(response.is_async)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        lines = gzip.decompress(content).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line)['_id'] for line in lines], ['A1', 'A2'])
+    
+    def test_view_reports_search_errors_before_streaming(self):
+        async def failing(**criteria):
+            raise ConnectionError('Elasticsearch injoignable')
+            yield
+        
+        request = RequestFactory().get('/api/export/')
+        with mock.patch.object(async_views.es_service, 'iter_documents', failing):
+            response = asyncio.run(async_views.ExportView().get(request))
+        self.assertEqual(response.status_code, 502)
+
+
+class CheckpointStore:
+    """Client Elasticsearch du job de rollup : checkpoint et jours ayant reçu des relevés tardifs"""
+    
+    def __init__(self, state, late):
+        self.state = state
+        self.late = late
+        self.queries = []
+    
+    def get(self, index, id):
+        return {'_source': dict(self.state)}
+    
+    def index(self, index, id, document, refresh=None):
+        self.state = document
+    
+    def search(self, index, size, query, aggs):
+        self.queries.append(query)
+        keys = [int(day.timestamp() * 1000) for day in self.late]
+        return {'aggregations': {'days': {'buckets': [{'key': key, 'doc_count': 1} for key in keys]}}}
+
+
+class LateReadingsRollupTests(SimpleTestCase):
+    """Relevés indexés après l'agrégation de leur période (rollups.run_rollup)"""
+    
+    def run_job(self, state, late):
+        es = CheckpointStore(state, late)
+        windows = []
+        with mock.patch.object(rollups, 'ensure_rollup_indices'), \
+                mock.patch.object(rollups, 'rollup_window', lambda es, start, end: windows.append(start) or (0, 0)):
+            summary = rollups.run_rollup(es, now=datetime(2024, 2, 21, 18, 0, tzinfo=dt_timezone.utc))
+        return es, windows, summary
+    
+    def test_days_with_late_readings_are_rolled_up_again(self):
+        late = [datetime(2024, 1, 3, tzinfo=dt_timezone.utc), datetime(2024, 1, 9, tzinfo=dt_timezone.utc)]
+        es, windows, summary = self.run_job(
+            {'checkpoint': '2024-02-21T15:00:00+00:00', 'ingested': '2024-02-21T15:55:00+00:00'}, late
+        )
+        self.assertEqual(windows, late + [datetime(2024, 2, 21, tzinfo=dt_timezone.utc)])
+        self.assertEqual(summary['late_days'], 2)
+        ingested, period = es.queries[0]['bool']['filter']
+        self.assertEqual(ingested, {'range': {'ingested_at': {'gte': '2024-02-21T15:55:00+00:00'}}})
+        self.assertEqual(period, {'range': {'@timestamp': {'lt': '2024-02-21T00:00:00+00:00'}}})
+        # Prochain passage : relevés indexés depuis le début de celui-ci, moins la marge
+        self.assertEqual(es.state['ingested'], '2024-02-21T17:55:00+00:00')
+        self.assertEqual(es.state['checkpoint'], '2024-02-21T17:00:00+00:00')
+    
+    def test_checkpoint_without_ingest_date_starts_tracking(self):
+        es, windows, summary = self.run_job({'checkpoint': '2024-02-21T15:00:00+00:00'}, [])
+        self.assertEqual(es.queries, [])
+        self.assertEqual(summary['late_days'], 0)
+        self.assertEqual(es.state['ingested'], '2024-02-21T17:55:00+00:00')
+
+
+class PointInTimeSearch:
+    """Client Elasticsearch d'une recherche par curseur : corps des requêtes et pages pleines"""
+    
+    def __init__(self):
+        self.bodies = []
+    
+    def open_point_in_time(self, index, keep_alive):
+        return {'id': 'pit'}
+    
+    def close_point_in_time(self, id):
+        pass
+    
+    def search(self, body):
+        self.bodies.append(body)
+        hits = {'hits': [{'_id': str(n), '_source': {}, 'sort': [n]} for n in range(2)]}
+        if body['track_total_hits']:
+            hits['total'] = {'value': 42, 'relation': 'eq'}
+        return {'pit_id': 'pit', 'hits': hits}
+
+
+class CursorTotalTests(SimpleTestCase):
+    """Comptage du total des recherches par curseur (ElasticsearchService.search_page)"""
+    
+    def setUp(self):
+        self.service = ElasticsearchService()
+        self.service.es = PointInTimeSearch()
+    
+    def test_pages_do_not_count_hits_by_default(self):
+        page = self.service.search_page(index='iot-alertes', size=2)
+        self.service.search_page(size=2, cursor=page['next_cursor'])
+        self.assertIsNone(page['total'])
+        self.assertEqual([body['track_total_hits'] for body in self.service.es.bodies], [False, False])
+    
+    def test_total_is_counted_once_on_request(self):
+        page = self.service.search_page(index='iot-alertes', size=2, with_total=True)
+        following = self.service.search_page(size=2, cursor=page['next_cursor'])
+        self.assertEqual((page['total'], following['total']), (42, 42))
+        self.assertEqual([body['track_total_hits'] for body in self.service.es.bodies], [True, False])
+
+
+class CountingElasticsearch:
+    """Client Elasticsearch qui compte les requêtes et répond des agrégations vides"""
+    
+    def __init__(self):
+        self.calls = []
+    
+    @staticmethod
+    def aggregation(definition):
+        agg_type = next(key for key in definition if key != 'aggs')
+        if agg_type in ('terms', 'date_histogram', 'histogram', 'range'):
+            return {'buckets': []}
+        if agg_type == 'stats':
+            return {'count': 0, 'min': None, 'max': None, 'avg': None, 'sum': 0.0}
+        if agg_type == 'filter':
+            return {'doc_count': 0}
+        return {'value': None}
+    
+    def response(self, body):
+        return {
+            'hits': {'total': {'value': 12, 'relation': 'eq'}, 'hits': []},
+            'aggregations': {name: self.aggregation(agg) for name, agg in body.get('aggs', {}).items()},
+        }
+    
+    def search(self, index=None, body=None, **kwargs):
+        self.calls.append('search')
+        return self.response({**(body or {}), **kwargs})
+    
+    def msearch(self, searches):
+        self.calls.append('msearch')
+        return {'responses': [self.response(body) for body in searches[1::2]]}
+    
+    def count(self, index=None, **kwargs):
+        self.calls.append('count')
+        return {'count': 12}
+
+
+class StatsCallCountTests(SimpleTestCase):
+    """Une seule requête Elasticsearch par endpoint de statistiques (ElasticsearchService)"""
+    
+    ENDPOINTS = {
+        'get_statistics': lambda service: service.get_statistics(),
+        'get_alertes_statistics': lambda service: service.get_alertes_statistics(),
+        'get_capteurs_statistics': lambda service: service.get_capteurs_statistics(),
+        'get_consommation_statistics': lambda service: service.get_consommation_statistics(),
+        'get_occupation_statistics': lambda service: service.get_occupation_statistics(),
+        'get_maintenance_statistics': lambda service: service.get_maintenance_statistics(),
+        'get_sensor_statistics': lambda service: service.get_sensor_statistics(),
+        'get_vehicle_statistics': lambda service: service.get_vehicle_statistics(),
+        'get_dashboard': lambda service: service.get_dashboard(),
+    }
+    
+    def test_each_endpoint_makes_one_request(self):
+        service = ElasticsearchService()
+        for name, call in self.ENDPOINTS.items():
+            with self.subTest(endpoint=name):
+                service.es = CountingElasticsearch()
+                result = call(service)
+                self.assertNotIn('error', result)
+                self.assertEqual(len(service.es.calls), 1, service.es.calls)
+
+
+class MetricsHashes:
+    """Redis minimal : hash partagé des métriques et hash de jauges par processus"""
+    
+    def __init__(self):
+        self.hashes = {}
+        self.ttls = {}
+    
+    def pipeline(self, transaction=False):
+        client = self
+        
+        class Pipeline:
+            def __init__(self):
+                self.results = []
+            
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: self.results.append(getattr(client, name)(*args, **kwargs))
+            
+            def execute(self):
+                return self.results
+        
+        return Pipeline()
+    
+    def hincrbyfloat(self, key, field, value):
+        fields = self.hashes.setdefault(key, {})
+        fields[field] = float(fields.get(field, 0)) + value
+    
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+    
+    def expire(self, key, seconds):
+        self.ttls[key] = seconds
+    
+    def delete(self, *keys):
+        for key in keys:
+            self.hashes.pop(key, None)
+    
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+    
+    def scan_iter(self, match, count=None):
+        return iter([key for key in self.hashes if key.startswith(match.rstrip('*'))])
+
+
+class ProcessMetricsTests(SimpleTestCase):
+    """Compteurs et jauges propres à un worker, sans label pid (Metrics.process_collector)"""
+    
+    def test_counters_progress_and_gauges_sum_across_processes(self):
+        client = MetricsHashes()
+        workers = [Metrics(client, key='iot:metrics'), Metrics(client, key='iot:metrics')]
+        counts = [{'hits': 3, 'entries': 5}, {'hits': 4, 'entries': 2}]
+        for number, (worker, count) in enumerate(zip(workers, counts)):
+            worker.process_collector(lambda count=count: [
+                ('iot_query_cache_requests_total', {'outcome': 'hits'}, count['hits']),
+                ('iot_query_cache_entries', {}, count['entries']),
+            ])
+            with mock.patch('api.metrics.process_name', return_value=f'web-{number}'):
+                worker.flush()
+        
+        counts[0]['hits'] = 5
+        with mock.patch('api.metrics.process_name', return_value='web-0'):
+            samples = workers[0].samples()
+        self.assertEqual(samples['iot_query_cache_requests_total{outcome="hits"}'], 9)
+        self.assertEqual(samples['iot_query_cache_entries'], 7)
+        self.assertEqual(set(client.ttls.values()), {15})
+        self.assertNotIn('pid', workers[0].render())
+    
+    def test_counter_reset_in_process_is_not_subtracted(self):
+        metrics = Metrics()
+        count = {'documents': 10}
+        metrics.process_collector(lambda: [('iot_live_stream_documents_total', {}, count['documents'])])
+        metrics.flush()
+        count['documents'] = 2
+        self.assertEqual(metrics.samples()['iot_live_stream_documents_total'], 12)
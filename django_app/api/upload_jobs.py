@@ -0,0 +1,206 @@
+"""
+Traitement asynchrone des uploads
+
+La requête d'upload se contente de stocker le fichier et de créer une ligne
+FileUploadHistory en statut 'pending'. Un pool de threads du processus
+parse ensuite le fichier en flux, l'envoie vers Redis et fait passer la
+ligne par 'processing' puis 'completed' (ou 'failed'), en mettant à jour
+la progression au fil de l'envoi.
+
+Le pool ne survit pas au processus : un upload en attente ou en cours lors
+d'un redémarrage resterait 'pending'/'processing'. manage.py recover_uploads
+(au démarrage du conteneur) reprend ces uploads depuis le fichier stocké
+(recover_uploads) ; l'_id déterministe des documents (document_ids.py) fait
+d'un envoi repris un remplacement et non un doublon. Un upload n'est traité
+que par le processus qui le fait passer de 'pending' à 'processing'.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .clients import redis_client
+from .models import FileUploadHistory
+from .redis_queue import enqueue_records, build_metadata, EnqueueError, TRANSPORT_STREAM
+from .upload_parsers import iter_records, detect_format
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def enqueue_options() -> dict:
+    """Paramètres d'envoi vers Redis (clé, paquets, transport) issus des settings"""
+    stream = settings.REDIS_TRANSPORT == TRANSPORT_STREAM
+    return {
+        'key': settings.REDIS_STREAM_KEY if stream else settings.REDIS_QUEUE_KEY,
+        'chunk_size': settings.REDIS_ENQUEUE_CHUNK_SIZE,
+        'pipeline_depth': settings.REDIS_ENQUEUE_PIPELINE_DEPTH,
+        'transport': settings.REDIS_TRANSPORT,
+        'maxlen': settings.REDIS_STREAM_MAXLEN if stream else None,
+    }
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Pool de workers créé à la première utilisation"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.UPLOAD_WORKERS,
+                thread_name_prefix='upload-worker'
+            )
+        return _executor
+
+
+def submit_upload(upload_id: int):
+    """Planifier le traitement d'un upload en attente"""
+    return get_executor().submit(process_upload, upload_id)
+
+
+def process_upload(upload_id: int):
+    """Parser le fichier stocké d'un upload et l'envoyer vers Redis"""
+    close_old_connections()
+    try:
+        upload = FileUploadHistory.objects.get(pk=upload_id)
+        _run(upload, redis_client)
+    except Exception as e:
+        logger.error(f"❌ Échec du traitement de l'upload {upload_id}: {e}")
+        FileUploadHistory.objects.filter(pk=upload_id).update(
+            status='failed',
+            error_message=str(e),
+            completed_at=timezone.now()
+        )
+    finally:
+        close_old_connections()
+
+
+def _run(upload: FileUploadHistory, redis_client):
+    queryset = FileUploadHistory.objects.filter(pk=upload.pk)
+    now = timezone.now()
+    # Un upload repris par recover_uploads n'est traité qu'une fois
+    if not queryset.filter(status='pending').update(status='processing', started_at=now, heartbeat_at=now):
+        logger.info(f"Upload {upload.pk} déjà pris en charge par un autre processus")
+        return
+    
+    _, compression = detect_format(upload.filename)
+    # Upload repris après un arrêt, ou fichier déjà envoyé : ses
+    # enregistrements peuvent déjà être indexés
+    redelivery = upload.started_at is not None or previously_uploaded(
+        upload.filename, upload.data_type, exclude=upload.pk)
+    last_update = 0.0
+    
+    with upload.stored_file.open('rb') as raw:
+        def on_progress(report):
+            # Mise à jour limitée dans le temps : une écriture par intervalle
+            nonlocal last_update
+            now = time.monotonic()
+            if now - last_update >= settings.UPLOAD_PROGRESS_INTERVAL:
+                last_update = now
+                queryset.update(
+                    records_processed=report['enqueued'],
+                    bytes_processed=raw.tell(),
+                    heartbeat_at=timezone.now()
+                )
+        
+        try:
+            report = enqueue_records(
+                redis_client,
+                iter_records(raw, upload.file_type, compression=compression),
+                build_metadata(upload.filename, upload.file_type, upload.data_type, redelivery=redelivery),
+                progress=on_progress,
+                **enqueue_options()
+            )
+        except EnqueueError as e:
+            count = e.report['enqueued']
+            queryset.update(
+                status='failed',
+                records_count=count,
+                records_processed=count,
+                bytes_processed=raw.tell(),
+                error_message=f"Erreur de parsing après {count} enregistrements: {e}",
+                completed_at=timezone.now()
+            )
+            logger.error(f"❌ Erreur de parsing dans {upload.filename}: {e}")
+            return
+    
+    count = report['enqueued']
+    if report['failed'] and not count:
+        error_message = report['errors'][0]['error']
+        status = 'failed'
+    elif report['failed']:
+        error_message = f"{report['failed']} enregistrements non envoyés ({len(report['errors'])} paquets en échec)"
+        status = 'completed'
+    elif not count:
+        error_message = 'Aucune donnée trouvée'
+        status = 'failed'
+    else:
+        error_message = None
+        status = 'completed'
+    
+    queryset.update(
+        status=status,
+        records_count=count,
+        records_processed=count,
+        bytes_processed=upload.file_size,
+        error_message=error_message,
+        completed_at=timezone.now()
+    )
+    
+    # Le fichier n'est plus utile une fois envoyé ; il est conservé en cas d'échec
+    if status == 'completed':
+        upload.stored_file.delete(save=False)
+        queryset.update(stored_file=None)
+    
+    logger.info(f"✅ Upload {upload.pk}: {count} enregistrements envoyés vers Redis depuis {upload.filename}")
+
+
+def previously_uploaded(filename: str, data_type, exclude=None) -> bool:
+    """Un fichier du même nom a-t-il déjà été envoyé pour ce type de données"""
+    queryset = FileUploadHistory.objects.filter(filename=filename, data_type=data_type)
+    if exclude is not None:
+        queryset = queryset.exclude(pk=exclude)
+    return queryset.exists()
+
+
+def recover_uploads(stale_after: float, resubmit: bool = True) -> Dict[str, list]:
+    """
+    Reprendre les uploads abandonnés par un processus arrêté
+    
+    Un upload 'pending' déposé depuis plus de stale_after secondes, ou
+    'processing' sans signe de vie depuis stale_after secondes, est remis en
+    attente et retraité depuis son fichier stocké (resubmit=False : marqué
+    'failed'). Sans fichier stocké, il est marqué 'failed'.
+    
+    Returns:
+        {'resubmitted': [ids], 'failed': [ids]}
+    """
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    stale = FileUploadHistory.objects.filter(status='pending', uploaded_at__lt=cutoff) | \
+        FileUploadHistory.objects.filter(status='processing', heartbeat_at__lt=cutoff) | \
+        FileUploadHistory.objects.filter(status='processing', heartbeat_at__isnull=True)
+    
+    recovered = {'resubmitted': [], 'failed': []}
+    for upload in stale:
+        # Mise à jour conditionnelle : ignorée si l'upload a avancé entre-temps
+        queryset = FileUploadHistory.objects.filter(pk=upload.pk, status=upload.status, heartbeat_at=upload.heartbeat_at)
+        if not upload.stored_file or not resubmit:
+            reason = "Fichier stocké introuvable" if not upload.stored_file else "Traitement interrompu"
+            if queryset.update(status='failed', error_message=f"{reason} (redémarrage pendant le traitement)",
+                               completed_at=timezone.now()):
+                recovered['failed'].append(upload.pk)
+            continue
+        if queryset.update(status='pending', records_processed=0, bytes_processed=0, heartbeat_at=None):
+            recovered['resubmitted'].append(upload.pk)
+    
+    if recovered['resubmitted'] or recovered['failed']:
+        logger.warning(f"⚠️  Uploads abandonnés : {len(recovered['resubmitted'])} repris, "
+                       f"{len(recovered['failed'])} en échec")
+    return recovered
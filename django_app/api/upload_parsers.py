@@ -0,0 +1,250 @@
+"""
+Parsing en flux des fichiers uploadés (CSV, JSON et NDJSON, compressés ou non)
+
+Le fichier est lu par blocs et les enregistrements sont produits un par un :
+ni les octets bruts, ni le texte décodé, ni la liste complète ne sont gardés
+en mémoire. La mémoire utilisée reste donc constante quelle que soit la
+taille du fichier.
+
+Les fichiers .gz et .zst sont décompressés à la volée pendant la lecture.
+Le support zstd nécessite le paquet optionnel zstandard.
+
+Ce module n'importe pas Django : il est partagé par l'API Django et par
+l'API Flask (file_upload_api.py).
+"""
+import codecs
+import csv
+import gzip
+import json
+from typing import Any, Dict, IO, Iterable, Iterator, Optional, Tuple
+
+DEFAULT_READ_SIZE = 64 * 1024
+
+_WHITESPACE = ' \t\n\r'
+
+# Extension -> format des enregistrements
+FORMAT_EXTENSIONS = {
+    '.csv': 'csv',
+    '.json': 'json',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+}
+
+# Extension -> compression
+COMPRESSION_EXTENSIONS = {
+    '.gz': 'gzip',
+    '.zst': 'zstd',
+}
+
+SUPPORTED_EXTENSIONS = list(FORMAT_EXTENSIONS) + [
+    fmt + comp for comp in COMPRESSION_EXTENSIONS for fmt in FORMAT_EXTENSIONS
+]
+
+
+def detect_format(filename: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Déduire le format et la compression depuis le nom du fichier
+    
+    Exemples: data.csv -> ('csv', None), batch.jsonl.zst -> ('ndjson', 'zstd')
+    
+    Returns:
+        (file_type, compression) ; file_type vaut None si l'extension
+        n'est pas supportée
+    """
+    name = filename.lower()
+    compression = None
+    for ext, comp in COMPRESSION_EXTENSIONS.items():
+        if name.endswith(ext):
+            name = name[:-len(ext)]
+            compression = comp
+            break
+    for ext, file_type in FORMAT_EXTENSIONS.items():
+        if name.endswith(ext):
+            return file_type, compression
+    return None, compression
+
+
+def open_decompressed(fileobj: IO[bytes], compression: Optional[str]) -> IO[bytes]:
+    """Envelopper un fichier binaire pour le décompresser à la lecture"""
+    if compression is None:
+        return fileobj
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=fileobj, mode='rb')
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("Compression zstd non supportée: installer le paquet zstandard")
+        return zstandard.ZstdDecompressor().stream_reader(fileobj, read_across_frames=True)
+    raise ValueError(f"Compression non supportée: {compression}")
+
+
+def iter_byte_chunks(fileobj: IO[bytes], read_size: int = DEFAULT_READ_SIZE) -> Iterator[bytes]:
+    """Lire un fichier binaire par blocs de read_size octets"""
+    while True:
+        chunk = fileobj.read(read_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_text_chunks(byte_chunks: Iterable[bytes], encoding: str = 'utf-8') -> Iterator[str]:
+    """
+    Décoder des blocs d'octets au fil de l'eau
+    
+    Un caractère multi-octets coupé entre deux blocs est reconstitué par le
+    décodeur incrémental. Lève UnicodeDecodeError si l'encodage est invalide.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for chunk in byte_chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def iter_lines(text_chunks: Iterable[str]) -> Iterator[str]:
+    """Découper des blocs de texte en lignes (fin de ligne conservée)"""
+    pending = ''
+    for chunk in text_chunks:
+        lines = (pending + chunk).split('\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    if pending:
+        yield pending
+
+
+def iter_csv_records(text_chunks: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Produire les lignes d'un CSV (avec en-tête) une par une"""
+    yield from csv.DictReader(iter_lines(text_chunks))
+
+
+def iter_json_records(text_chunks: Iterable[str]) -> Iterator[Any]:
+    """
+    Produire les éléments d'un tableau JSON de premier niveau un par un
+    
+    Seul l'élément en cours de décodage est gardé en mémoire. Un objet JSON
+    unique (hors tableau) est produit tel quel, comme avant.
+    
+    Raises:
+        ValueError: JSON invalide ou tronqué (json.JSONDecodeError inclus)
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(text_chunks)
+    buf = ''
+    pos = 0
+    eof = False
+    
+    def fill() -> bool:
+        """Ajouter un bloc au tampon ; False en fin de flux"""
+        nonlocal buf, pos, eof
+        if eof:
+            return False
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            return False
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+    
+    def next_char() -> str:
+        """Avancer jusqu'au prochain caractère non blanc ('' en fin de flux)"""
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if not fill():
+                return ''
+    
+    first = next_char()
+    if not first:
+        return
+    
+    if first != '[':
+        # Document unique : il faut de toute façon le décoder en entier
+        while fill():
+            pass
+        data = json.loads(buf[pos:])
+        if not isinstance(data, dict):
+            raise ValueError("Le JSON doit être un objet ou un tableau d'objets")
+        yield data
+        return
+    
+    pos += 1
+    if next_char() == ']':
+        pos += 1
+    else:
+        while True:
+            if not next_char():
+                raise ValueError("Tableau JSON non terminé")
+            try:
+                element, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if fill():
+                    continue
+                raise
+            if end == len(buf) and fill():
+                # Un nombre ou un littéral peut être coupé en fin de bloc
+                continue
+            yield element
+            pos = end
+            
+            separator = next_char()
+            if separator == ',':
+                pos += 1
+            elif separator == ']':
+                pos += 1
+                break
+            else:
+                raise ValueError(f"Séparateur inattendu dans le tableau JSON: {separator or 'fin de fichier'!r}")
+    
+    if next_char():
+        raise ValueError("Données inattendues après le tableau JSON")
+
+
+def iter_ndjson_records(text_chunks: Iterable[str]) -> Iterator[Any]:
+    """Produire les enregistrements d'un fichier NDJSON (un document JSON par ligne)"""
+    for line_number, line in enumerate(iter_lines(text_chunks), start=1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Ligne {line_number}: {e}")
+
+
+def iter_records(
+    fileobj: IO[bytes],
+    file_type: str,
+    read_size: int = DEFAULT_READ_SIZE,
+    compression: Optional[str] = None
+) -> Iterator[Any]:
+    """
+    Parser un fichier uploadé en flux
+    
+    Args:
+        fileobj: Fichier binaire (UploadedFile Django, FileStorage Flask...)
+        file_type: 'json', 'ndjson' ou 'csv'
+        read_size: Taille des blocs lus
+        compression: None, 'gzip' ou 'zstd' (voir detect_format)
+    
+    Returns:
+        Itérateur sur les enregistrements du fichier
+    """
+    # La décompression n'est ouverte qu'à la première lecture, pour que ses
+    # erreurs remontent comme des erreurs de parsing
+    def byte_chunks():
+        yield from iter_byte_chunks(open_decompressed(fileobj, compression), read_size)
+    
+    text_chunks = iter_text_chunks(byte_chunks())
+    if file_type == 'json':
+        return iter_json_records(text_chunks)
+    if file_type == 'ndjson':
+        return iter_ndjson_records(text_chunks)
+    return iter_csv_records(text_chunks)
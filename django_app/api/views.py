@@ -1,10 +1,9 @@
 """
 Views et ViewSets pour l'API REST
 """
+import itertools
 import logging
-import json
-import csv
-import io
+import os
 from datetime import datetime
 
 from rest_framework import viewsets, status
@@ -15,7 +14,12 @@ from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 
 import redis
 from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views import View
 
+from . import clients
 from .models import FileUploadHistory, ElasticsearchQuery
 from .serializers import (
     FileUploadHistorySerializer,
@@ -25,56 +29,272 @@ from .serializers import (
     VehicleDataSerializer,
     ElasticsearchQuerySerializer,
     SearchRequestSerializer,
+    PageRequestSerializer,
+    ExportRequestSerializer,
     AggregationRequestSerializer,
+    ConsumptionReportSerializer,
+    LiveStreamSerializer,
 )
 from .elasticsearch_service import ElasticsearchService
+from .redis_queue import enqueue_records, build_metadata, EnqueueError, TRANSPORT_STREAM
+from .redis_streams import stream_backlog
+from .upload_parsers import iter_records, detect_format
+from .upload_jobs import submit_upload, enqueue_options, previously_uploaded
+from .dead_letters import DeadLetterQueue
+from .stats_cache import StatsCache
+from .query_cache import QueryCache
+from .health import HealthMonitor
+from .index_lifecycle import detect_legacy_types
+from .metrics import Metrics
+from .exporters import CONTENT_TYPES, iter_export
+from .schemas import DATA_TYPES, source_filter
 
 logger = logging.getLogger(__name__)
 
-# Connexion Redis
-redis_client = redis.Redis(
-    host=settings.REDIS_HOST,
-    port=settings.REDIS_PORT,
-    password=settings.REDIS_PASSWORD,
-    decode_responses=True
-)
+# Connexion Redis (pool créé au premier appel dans chaque worker, voir clients.py)
+redis_client = clients.redis_client
+
+# Métriques Prometheus (/metrics), agrégées dans Redis entre workers
+metrics = Metrics(redis_client, key=settings.METRICS_REDIS_KEY, flush_interval=settings.METRICS_FLUSH_INTERVAL)
+
+# Recherches identiques coalescées et gardées quelques secondes (par worker)
+query_cache = QueryCache(max_entries=settings.QUERY_CACHE_SIZE, ttl=settings.QUERY_CACHE_TTL)
 
 # Service Elasticsearch
-es_service = ElasticsearchService()
+es_service = ElasticsearchService(metrics=metrics, query_cache=query_cache)
+
+# Documents rejetés par l'indexeur
+dead_letters = DeadLetterQueue(redis_client, key=settings.REDIS_DLQ_KEY)
+
+# Cache des statistiques, invalidé par l'indexeur à chaque lot
+stats_cache = StatsCache(redis_client, prefix=settings.STATS_CACHE_PREFIX, ttl=settings.STATS_CACHE_TTL)
+
+
+
+def ingest_queue_length():
+    """Messages en attente d'indexation (liste iot:data, ou retard du groupe sur le stream)"""
+    if settings.REDIS_TRANSPORT == TRANSPORT_STREAM:
+        return stream_backlog(redis_client, settings.REDIS_STREAM_KEY, settings.REDIS_STREAM_GROUP)
+    return redis_client.llen(settings.REDIS_QUEUE_KEY)
+
+
+# Santé des dépendances, vérifiée en arrière-plan dans chaque worker
+health = HealthMonitor(
+    checks={
+        'redis': lambda: redis_client.ping(),
+        'elasticsearch': lambda: es_service.es.ping(),
+        'redis_queue': ingest_queue_length,
+        'redis_dlq': dead_letters.length,
+        # Index d'avant le registre : noms de champs .keyword (schemas.keyword_field)
+        'elasticsearch_legacy': lambda: detect_legacy_types(es_service.es),
+    },
+    required=('redis', 'elasticsearch'),
+    trends=('redis_queue', 'redis_dlq'),
+    interval=settings.HEALTH_CHECK_INTERVAL,
+    stale_after=settings.HEALTH_STALE_AFTER,
+    trend_window=settings.HEALTH_TREND_WINDOW
+)
 
 
-class HealthCheckView(APIView):
-    """Endpoint de santé pour vérifier les services"""
+@metrics.collector
+def queue_metrics():
+    """Longueur de la file d'ingestion et de la DLQ, lue dans l'instantané de santé"""
+    dependencies = health.snapshot()['dependencies']
+    stream = settings.REDIS_TRANSPORT == TRANSPORT_STREAM
+    queues = (
+        (settings.REDIS_STREAM_KEY if stream else settings.REDIS_QUEUE_KEY, dependencies['redis_queue']),
+        (settings.REDIS_DLQ_KEY, dependencies['redis_dlq']),
+    )
+    for queue, state in queues:
+        if state['value'] is not None:
+            yield 'iot_redis_queue_length', 'gauge', "Messages en attente dans la file d'ingestion", \
+                {'queue': queue}, state['value']
+
+
+@metrics.collector
+def health_metrics():
+    """Disponibilité et latence des dépendances, lues dans l'instantané de santé"""
+    for name, state in health.snapshot()['dependencies'].items():
+        if state['up'] is None:
+            continue
+        yield 'iot_dependency_up', 'gauge', "Dépendance disponible à la dernière vérification", \
+            {'dependency': name}, int(state['up'])
+        yield 'iot_dependency_check_latency_seconds', 'gauge', "Durée de la dernière vérification", \
+            {'dependency': name}, state['latency_ms'] / 1000
+
+
+@metrics.collector
+def stats_cache_metrics():
+    """Compteurs hit/miss du cache des statistiques (stats_cache.py)"""
+    for endpoint, values in stats_cache.counters().items():
+        for outcome in ('hits', 'misses'):
+            yield 'iot_stats_cache_requests_total', 'counter', "Lectures du cache des statistiques", \
+                {'endpoint': endpoint, 'outcome': outcome}, values[outcome]
+        yield 'iot_stats_cache_hit_ratio', 'gauge', "Taux de hit du cache des statistiques", \
+            {'endpoint': endpoint}, values['hit_ratio']
+
+
+@metrics.process_collector
+def query_cache_metrics():
+    """Recherches servies par le cache ou coalescées, dans ce worker (query_cache.py)"""
+    counters = query_cache.counters()
+    for outcome in ('hits', 'misses', 'coalesced'):
+        yield 'iot_query_cache_requests_total', {'outcome': outcome}, counters[outcome]
+    yield 'iot_query_cache_evictions_total', {}, counters['evictions']
+    yield 'iot_query_cache_entries', {}, counters['entries']
+
+
+@metrics.process_collector
+def client_pool_metrics():
+    """Connexions des pools Redis/Elasticsearch de ce worker (clients.py)"""
+    for client, stats in clients.pool_stats().items():
+        for state in ('in_use', 'idle'):
+            yield 'iot_client_pool_connections', {'client': client, 'state': state}, stats[state]
+        yield 'iot_client_pool_max_connections', {'client': client}, stats['max']
+
+
+def page_params(params):
+    """Pagination des vues par type (paramètres size, from, pagination, cursor, total)"""
+    serializer = PageRequestSerializer(data={
+        key: params[name]
+        for key, name in (
+            ('size', 'size'), ('from_offset', 'from'), ('pagination', 'pagination'), ('cursor', 'cursor'),
+            ('total', 'total'),
+        )
+        if name in params
+    })
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+def consumption_report(params):
+    """Période, filtres et intervalle des vues de consommation (rollups.py)"""
+    serializer = ConsumptionReportSerializer(data=params)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+def live_stream_params(params):
+    """Filtres, tampon et politique d'un abonnement au flux temps réel (live_stream.py)"""
+    serializer = LiveStreamSerializer(data=params)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+def query_flag(params, name):
+    """Paramètre booléen de query string (1, true, yes)"""
+    return str(params.get(name, '')).lower() in ('1', 'true', 'yes')
+
+
+def typed_search_criteria(params, data_type, filters):
+    """Critères d'une vue par type (TypedSearchView) -> arguments d'ElasticsearchService"""
+    index = f'iot-{data_type}'
+    return {
+        'query': params.get('q'),
+        'fuzzy': query_flag(params, 'fuzzy'),
+        'index': index,
+        'source': source_filter(params.get('fields'), index, projection=True),
+        'filters': {field: params.get(name) for field, name in filters.items()},
+        'sort_by': params.get('sort_by', '@timestamp'),
+        'sort_order': params.get('sort_order', 'desc'),
+    }
+
+
+def search_criteria(params):
+    """Critères de recherche validés (SearchCriteriaSerializer) -> arguments d'ElasticsearchService"""
+    return {
+        'query': params.get('query'),
+        'fuzzy': params.get('fuzzy', False),
+        'index': params.get('index'),
+        'filters': {
+            'device_id': params.get('device_id'),
+            'vehicle_id': params.get('vehicle_id'),
+            'source_file': params.get('source_file'),
+            'file_type': params.get('file_type'),
+            'status': params.get('status'),
+            '@timestamp_from': params.get('date_from'),
+            '@timestamp_to': params.get('date_to'),
+        },
+        'sort_by': params.get('sort_by', '@timestamp'),
+        'sort_order': params.get('sort_order', 'desc'),
+        'source': source_filter(params.get('fields'), params.get('index')),
+    }
+
+
+def paginated_search(page, **criteria):
+    """Recherche par curseur (point-in-time + search_after) ou par offset selon page"""
+    if page.get('cursor') or page.get('pagination') == 'cursor':
+        return es_service.search_page(size=page['size'], cursor=page.get('cursor') or None,
+                                      with_total=page.get('total', False), **criteria)
+    return es_service.search(size=page['size'], from_offset=page['from_offset'], **criteria)
+
+
+def health_status():
+    """Réponse de /api/health/ : format historique (services) et détail par dépendance"""
+    snapshot = health.snapshot()
+    ready, reasons = health.readiness(snapshot)
+    dependencies = snapshot['dependencies']
+    
+    def connection(name):
+        if dependencies[name]['up']:
+            return 'connected'
+        return f"disconnected: {dependencies[name]['last_error'] or 'non vérifié'}"
+    
+    return {
+        'status': 'healthy' if ready else 'degraded',
+        'timestamp': datetime.now().isoformat(),
+        'services': {
+            'redis': connection('redis'),
+            'elasticsearch': connection('elasticsearch'),
+            'redis_queue_length': dependencies['redis_queue']['value'],
+            'redis_dlq_length': dependencies['redis_dlq']['value'],
+        },
+        'reasons': reasons,
+        'checks': snapshot,
+    }
+
+
+def cached_stats(endpoint, index, compute, params=None):
+    """Réponse de statistiques servie depuis le cache Redis si possible"""
+    stats, hit = stats_cache.get_or_compute(endpoint, index, compute, params)
+    response = Response(stats)
+    response['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+
+class MetricsView(View):
+    """Métriques au format texte Prometheus (tous les workers)"""
     
     def get(self, request):
-        """Vérifier le statut de tous les services"""
-        
-        # Redis
         try:
-            redis_client.ping()
-            redis_status = 'connected'
-        except Exception as e:
-            redis_status = f'disconnected: {str(e)}'
-        
-        # Elasticsearch
-        es_connected = es_service.check_connection()
-        es_status = 'connected' if es_connected else 'disconnected'
-        
-        # Redis queue
-        try:
-            queue_length = redis_client.llen("iot:data")
-        except:
-            queue_length = None
-        
-        return Response({
-            'status': 'healthy',
-            'timestamp': datetime.now().isoformat(),
-            'services': {
-                'redis': redis_status,
-                'elasticsearch': es_status,
-                'redis_queue_length': queue_length
-            }
-        })
+            body = metrics.render()
+        except redis.RedisError as e:
+            logger.error(f"❌ Métriques indisponibles: {e}")
+            return HttpResponse(f"# Redis indisponible: {e}\n", status=503, content_type='text/plain')
+        return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class HealthCheckView(APIView):
+    """Endpoint de santé pour vérifier les services (instantané en mémoire, voir health.py)"""
+    
+    def get(self, request):
+        """Statut de tous les services, sans appel Redis ni Elasticsearch"""
+        return Response(health_status())
+
+
+class LivenessView(View):
+    """Sonde liveness : le processus répond (aucune dépendance vérifiée)"""
+    
+    def get(self, request):
+        return JsonResponse({'status': 'alive', 'pid': os.getpid()})
+
+
+class ReadinessView(View):
+    """Sonde readiness : Redis et Elasticsearch disponibles d'après l'instantané"""
+    
+    def get(self, request):
+        ready, reasons = health.readiness()
+        return JsonResponse({'ready': ready, 'reasons': reasons}, status=200 if ready else 503)
 
 
 class FileUploadView(APIView):
@@ -83,7 +303,7 @@ class FileUploadView(APIView):
     parser_classes = [MultiPartParser, FormParser]
     
     def post(self, request):
-        """Upload un fichier CSV ou JSON"""
+        """Upload un fichier CSV, JSON ou NDJSON (éventuellement compressé en .gz/.zst)"""
         
         serializer = FileUploadSerializer(data=request.data)
         if not serializer.is_valid():
@@ -91,7 +311,7 @@ class FileUploadView(APIView):
         
         file = serializer.validated_data['file']
         filename = file.name
-        file_type = 'json' if filename.endswith('.json') else 'csv'
+        file_type, compression = detect_format(filename)
         
         # Extraire le data_type depuis le POST ou le déduire du nom de fichier
         data_type = request.data.get('data_type', None)
@@ -114,90 +334,134 @@ class FileUploadView(APIView):
         
         logger.info(f"📁 Fichier reçu: {filename} [Type: {data_type}]")
         
-        # Lire le contenu
-        try:
-            file_content = file.read().decode('utf-8')
-        except UnicodeDecodeError:
-            return Response({
-                'error': 'Erreur d\'encodage',
-                'message': 'Le fichier doit être encodé en UTF-8'
-            }, status=status.HTTP_400_BAD_REQUEST)
+        # Mode asynchrone : stocker le fichier et rendre la main immédiatement
+        async_mode = request.data.get('async', request.query_params.get('async', ''))
+        if str(async_mode).lower() in ('1', 'true', 'yes'):
+            return self._submit_async(file, filename, file_type, data_type)
         
-        # Parser le fichier
+        # Parser le fichier en flux et envoyer vers Redis par paquets
+        # (le fichier n'est jamais chargé entièrement en mémoire)
         try:
-            if file_type == 'json':
-                data = json.loads(file_content)
-                if isinstance(data, dict):
-                    data = [data]
-            else:  # CSV
-                csv_file = io.StringIO(file_content)
-                reader = csv.DictReader(csv_file)
-                data = list(reader)
-        except Exception as e:
+            report = enqueue_records(
+                redis_client,
+                iter_records(file, file_type, compression=compression),
+                build_metadata(filename, file_type, data_type,
+                               redelivery=previously_uploaded(filename, data_type)),
+                **enqueue_options()
+            )
+        except EnqueueError as e:
+            count = e.report['enqueued']
+            if isinstance(e.error, UnicodeDecodeError):
+                error, message = 'Erreur d\'encodage', 'Le fichier doit être encodé en UTF-8'
+            else:
+                error, message = 'Erreur de parsing', str(e)
+            
+            logger.error(f"❌ {error} dans {filename} après {count} enregistrements: {e}")
+            
+            # Les paquets précédant l'erreur sont déjà dans la file
+            if count:
+                FileUploadHistory.objects.create(
+                    filename=filename,
+                    file_type=file_type,
+                    data_type=data_type,
+                    records_count=count,
+                    records_processed=count,
+                    status='failed',
+                    error_message=f"{error}: {message}"
+                )
+            
             return Response({
-                'error': 'Erreur de parsing',
-                'message': str(e)
+                'error': error,
+                'message': message,
+                'records_processed': count
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        if not data:
+        count = report['enqueued']
+        
+        if not count and not report['failed']:
             return Response({
                 'error': 'Fichier vide',
                 'message': 'Aucune donnée trouvée'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Envoyer vers Redis
-        try:
-            count = 0
-            for record in data:
-                enriched_record = {
-                    "source_file": filename,
-                    "file_type": file_type,
-                    "data_type": data_type,
-                    "upload_timestamp": datetime.now().isoformat(),
-                    "data": record
-                }
-                redis_client.lpush("iot:data", json.dumps(enriched_record))
-                count += 1
-            
-            queue_length = redis_client.llen("iot:data")
-            
-            # Sauvegarder l'historique
-            FileUploadHistory.objects.create(
-                filename=filename,
-                file_type=file_type,
-                records_count=count,
-                status='completed'
-            )
-            
-            logger.info(f"✅ {count} enregistrements envoyés vers Redis depuis {filename}")
-            
-            return Response({
-                'success': True,
-                'message': 'Fichier traité avec succès',
-                'filename': filename,
-                'file_type': file_type,
-                'data_type': data_type,
-                'records_processed': count,
-                'redis_queue_length': queue_length,
-                'timestamp': datetime.now().isoformat()
-            })
-            
-        except Exception as e:
-            logger.error(f"❌ Erreur lors de l'envoi vers Redis: {e}")
+        if not count:
+            message = report['errors'][0]['error']
+            logger.error(f"❌ Erreur lors de l'envoi vers Redis: {message}")
             
             # Sauvegarder l'erreur
             FileUploadHistory.objects.create(
                 filename=filename,
                 file_type=file_type,
+                data_type=data_type,
                 records_count=0,
                 status='failed',
-                error_message=str(e)
+                error_message=message
             )
             
             return Response({
                 'error': 'Erreur serveur',
-                'message': str(e)
+                'message': message
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        # Sauvegarder l'historique
+        FileUploadHistory.objects.create(
+            filename=filename,
+            file_type=file_type,
+            data_type=data_type,
+            records_count=count,
+            records_processed=count,
+            status='completed',
+            error_message=(
+                f"{report['failed']} enregistrements non envoyés ({len(report['errors'])} paquets en échec)"
+                if report['failed'] else None
+            )
+        )
+        
+        logger.info(f"✅ {count} enregistrements envoyés vers Redis depuis {filename}")
+        
+        return Response({
+            'success': True,
+            'message': 'Fichier traité avec succès',
+            'filename': filename,
+            'file_type': file_type,
+            'data_type': data_type,
+            'records_processed': count,
+            'records_failed': report['failed'],
+            'failed_chunks': report['errors'],
+            'redis_queue_length': report['queue_length'],
+            'timestamp': datetime.now().isoformat()
+        })
+    
+    
+    def _submit_async(self, file, filename, file_type, data_type):
+        """Créer un job d'upload en attente et le confier au pool de workers"""
+        upload = FileUploadHistory(
+            filename=filename,
+            file_type=file_type,
+            data_type=data_type,
+            records_count=0,
+            file_size=file.size,
+            status='pending'
+        )
+        # Copie du fichier par blocs vers MEDIA_ROOT/uploads/
+        upload.stored_file.save(filename, file, save=False)
+        upload.save()
+        
+        transaction.on_commit(lambda: submit_upload(upload.pk))
+        
+        logger.info(f"⏳ Upload {upload.pk} en attente de traitement: {filename}")
+        
+        return Response({
+            'success': True,
+            'message': 'Fichier reçu, traitement en arrière-plan',
+            'job_id': upload.pk,
+            'status': upload.status,
+            'filename': filename,
+            'file_type': file_type,
+            'data_type': data_type,
+            'progress_url': reverse('file-upload-progress', args=[upload.pk]),
+            'timestamp': datetime.now().isoformat()
+        }, status=status.HTTP_202_ACCEPTED)
 
 
 class FileUploadViewSet(viewsets.ModelViewSet):
@@ -226,6 +490,99 @@ class FileUploadViewSet(viewsets.ModelViewSet):
             'failed': failed,
             'success_rate': (completed / total * 100) if total > 0 else 0
         })
+    
+    @action(detail=True, methods=['get'])
+    def progress(self, request, pk=None):
+        """Progression d'un upload asynchrone (requête légère pour le polling)"""
+        upload = (
+            FileUploadHistory.objects
+            .only('status', 'records_processed', 'records_count', 'file_size',
+                  'bytes_processed', 'error_message', 'started_at', 'completed_at')
+            .filter(pk=pk)
+            .first()
+        )
+        if upload is None:
+            return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        return Response({
+            'id': upload.pk,
+            'status': upload.status,
+            'records_processed': upload.records_processed,
+            'records_count': upload.records_count,
+            'bytes_processed': upload.bytes_processed,
+            'file_size': upload.file_size,
+            'progress_percent': upload.progress_percent,
+            'error_message': upload.error_message,
+            'started_at': upload.started_at,
+            'completed_at': upload.completed_at
+        })
+
+
+class DeadLetterView(APIView):
+    """Consultation et purge des documents rejetés par Elasticsearch (iot:dlq)"""
+    
+    def get(self, request):
+        """Lister les entrées de la DLQ, des plus récentes aux plus anciennes"""
+        try:
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+            limit = min(max(int(request.query_params.get('limit', 50)), 1), 1000)
+        except ValueError:
+            return Response({'error': 'offset et limit doivent être des entiers'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            return Response({
+                'length': dead_letters.length(),
+                'offset': offset,
+                'limit': limit,
+                'items': dead_letters.list(offset, limit)
+            })
+        except redis.RedisError as e:
+            logger.error(f"❌ Lecture de la DLQ impossible: {e}")
+            return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    
+    def delete(self, request):
+        """Vider la DLQ"""
+        try:
+            purged = dead_letters.purge()
+        except redis.RedisError as e:
+            logger.error(f"❌ Purge de la DLQ impossible: {e}")
+            return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        
+        logger.info(f"🗑️  DLQ purgée: {purged} entrées supprimées")
+        return Response({'purged': purged})
+
+
+class DeadLetterReplayView(APIView):
+    """Rejeu des documents rejetés vers la file d'ingestion"""
+    
+    def post(self, request):
+        """Rejouer les entrées les plus anciennes (toutes, ou 'count')"""
+        count = request.data.get('count')
+        if count is not None:
+            try:
+                count = int(count)
+            except (TypeError, ValueError):
+                return Response({'error': 'count doit être un entier'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        options = enqueue_options()
+        try:
+            replayed = dead_letters.replay(
+                target_key=options['key'],
+                count=count,
+                transport=options['transport'],
+                maxlen=options['maxlen']
+            )
+            remaining = dead_letters.length()
+        except redis.RedisError as e:
+            logger.error(f"❌ Rejeu de la DLQ impossible: {e}")
+            return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        
+        logger.info(f"🔁 {replayed} documents rejoués depuis la DLQ vers {options['key']}")
+        return Response({
+            'replayed': replayed,
+            'remaining': remaining,
+            'queue': options['key']
+        })
 
 
 class DeviceViewSet(viewsets.ViewSet):
@@ -237,23 +594,7 @@ class DeviceViewSet(viewsets.ViewSet):
         serializer.is_valid(raise_exception=True)
         
         params = serializer.validated_data
-        result = es_service.search(
-            query=params.get('query'),
-            index=params.get('index'),
-            size=params.get('size', 50),
-            from_offset=params.get('from_offset', 0),
-            filters={
-                'device_id': params.get('device_id'),
-                'vehicle_id': params.get('vehicle_id'),
-                'source_file': params.get('source_file'),
-                'file_type': params.get('file_type'),
-                'status': params.get('status'),
-                '@timestamp_from': params.get('date_from'),
-                '@timestamp_to': params.get('date_to'),
-            },
-            sort_by=params.get('sort_by', '@timestamp'),
-            sort_order=params.get('sort_order', 'desc')
-        )
+        result = paginated_search(params, **search_criteria(params))
         
         return Response(result)
     
@@ -275,84 +616,52 @@ class SensorViewSet(viewsets.ViewSet):
     """ViewSet pour les données de capteurs"""
     
     def list(self, request):
-        """Lister les données de capteurs"""
-        # Filtrer uniquement les capteurs (ont device_id)
-        filters = {
-            'device_id': request.query_params.get('device_id'),
-            'source_file': request.query_params.get('source_file'),
-            'status': request.query_params.get('status'),
-        }
-        
-        # Retirer les None
-        filters = {k: v for k, v in filters.items() if v is not None}
-        
-        result = es_service.search(
+        """Lister les données de capteurs (documents avec device_id)"""
+        result = paginated_search(
+            page_params(request.query_params),
             query=request.query_params.get('query'),
-            filters=filters,
-            size=int(request.query_params.get('size', 50))
+            fuzzy=query_flag(request.query_params, 'fuzzy'),
+            source=source_filter(request.query_params.get('fields'), es_service.default_index, projection=True),
+            filters={
+                'device_id_exists': True,
+                'device_id': request.query_params.get('device_id'),
+                'source_file': request.query_params.get('source_file'),
+                'status': request.query_params.get('status'),
+            }
         )
         
-        # Filtrer pour ne garder que les documents avec device_id
-        if result.get('documents'):
-            result['documents'] = [
-                doc for doc in result['documents']
-                if 'device_id' in doc
-            ]
-            result['count'] = len(result['documents'])
-        
         return Response(result)
     
     @action(detail=False, methods=['get'])
     def statistics(self, request):
         """Statistiques sur les capteurs"""
-        return Response({
-            'by_device': es_service.aggregate('device_id', 'terms', size=100),
-            'by_location': es_service.aggregate('location', 'terms', size=20),
-            'by_status': es_service.aggregate('status', 'terms', size=10),
-            'temperature_stats': es_service.aggregate('temperature', 'stats'),
-            'humidity_stats': es_service.aggregate('humidity', 'stats'),
-        })
+        return Response(es_service.get_sensor_statistics())
 
 
 class VehicleViewSet(viewsets.ViewSet):
     """ViewSet pour les données de véhicules"""
     
     def list(self, request):
-        """Lister les données de véhicules"""
-        filters = {
-            'vehicle_id': request.query_params.get('vehicle_id'),
-            'driver': request.query_params.get('driver'),
-            'status': request.query_params.get('status'),
-        }
-        
-        filters = {k: v for k, v in filters.items() if v is not None}
-        
-        result = es_service.search(
+        """Lister les données de véhicules (documents avec vehicle_id)"""
+        result = paginated_search(
+            page_params(request.query_params),
             query=request.query_params.get('query'),
-            filters=filters,
-            size=int(request.query_params.get('size', 50))
+            fuzzy=query_flag(request.query_params, 'fuzzy'),
+            source=source_filter(request.query_params.get('fields'), es_service.default_index, projection=True),
+            filters={
+                'vehicle_id_exists': True,
+                'vehicle_id': request.query_params.get('vehicle_id'),
+                'driver': request.query_params.get('driver'),
+                'status': request.query_params.get('status'),
+            }
         )
         
-        # Filtrer pour ne garder que les documents avec vehicle_id
-        if result.get('documents'):
-            result['documents'] = [
-                doc for doc in result['documents']
-                if 'vehicle_id' in doc
-            ]
-            result['count'] = len(result['documents'])
-        
         return Response(result)
     
     @action(detail=False, methods=['get'])
     def statistics(self, request):
         """Statistiques sur les véhicules"""
-        return Response({
-            'by_vehicle': es_service.aggregate('vehicle_id', 'terms', size=100),
-            'by_driver': es_service.aggregate('driver', 'terms', size=50),
-            'by_status': es_service.aggregate('status', 'terms', size=10),
-            'speed_stats': es_service.aggregate('speed', 'stats'),
-            'fuel_level_stats': es_service.aggregate('fuel_level', 'stats'),
-        })
+        return Response(es_service.get_vehicle_statistics())
 
 
 class ElasticsearchSearchView(APIView):
@@ -364,27 +673,77 @@ class ElasticsearchSearchView(APIView):
         serializer.is_valid(raise_exception=True)
         
         params = serializer.validated_data
-        result = es_service.search(
-            query=params.get('query'),
-            index=params.get('index'),
-            size=params.get('size', 50),
-            from_offset=params.get('from_offset', 0),
-            filters={
-                'device_id': params.get('device_id'),
-                'vehicle_id': params.get('vehicle_id'),
-                'source_file': params.get('source_file'),
-                'file_type': params.get('file_type'),
-                'status': params.get('status'),
-                '@timestamp_from': params.get('date_from'),
-                '@timestamp_to': params.get('date_to'),
-            },
-            sort_by=params.get('sort_by', '@timestamp'),
-            sort_order=params.get('sort_order', 'desc')
-        )
+        result = paginated_search(params, **search_criteria(params))
         
         return Response(result)
 
 
+def export_request(query_params):
+    """Paramètres validés d'un export (ExportRequestSerializer) et critères de recherche"""
+    serializer = ExportRequestSerializer(data=query_params)
+    serializer.is_valid(raise_exception=True)
+    
+    params = serializer.validated_data
+    criteria = search_criteria(params)
+    criteria['index'] = criteria['index'] or es_service.default_index
+    return params, criteria
+
+
+def export_response(documents, params, criteria, exporter=iter_export):
+    """
+    Fichier exporté en flux (nom, type de contenu, colonnes CSV)
+    
+    exporter : iter_export pour un itérateur de documents, aiter_export
+    pour un itérateur asynchrone (async_views.ExportView).
+    """
+    export_format = params['output']
+    filename = f"export-{criteria['index'].replace('*', 'all').replace(',', '_')}-" \
+               f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    content_type = CONTENT_TYPES[export_format]
+    if params['compress']:
+        filename += '.gz'
+        content_type = 'application/gzip'
+    
+    logger.info(f"📤 Export {export_format} de {criteria['index']} vers {filename}")
+    # Colonnes CSV : les champs demandés s'ils sont explicites
+    includes = (criteria['source'] or {}).get('includes') or []
+    columns = ['_id'] + includes if includes and not any('*' in name for name in includes) else None
+    response = StreamingHttpResponse(
+        exporter(documents, export_format, index=criteria['index'],
+                 compress=params['compress'], columns=columns),
+        content_type=content_type
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+class ExportView(APIView):
+    """Vue pour exporter tous les résultats d'une recherche (NDJSON ou CSV)"""
+    
+    def get(self, request):
+        """
+        Exporter en flux les documents correspondant aux critères
+        
+        Mêmes critères que /api/search/ (dont fields : colonnes CSV),
+        plus output (ndjson | csv), compress (gzip) et batch_size
+        (documents par requête Elasticsearch).
+        La mémoire du serveur ne dépend pas du nombre de documents.
+        Sous ASGI, c'est async_views.ExportView qui répond.
+        """
+        params, criteria = export_request(request.query_params)
+        documents = es_service.iter_documents(batch_size=params['batch_size'], **criteria)
+        
+        # Premier lot lu avant la réponse : une erreur Elasticsearch donne un
+        # statut 502, pas un fichier tronqué avec un statut 200
+        try:
+            first = next(documents, None)
+        except Exception as e:
+            logger.error(f"❌ Export impossible: {e}")
+            return Response({'error': str(e)}, status=status.HTTP_502_BAD_GATEWAY)
+        documents = itertools.chain([] if first is None else [first], documents)
+        return export_response(documents, params, criteria)
+
+
 class AggregationsView(APIView):
     """Vue pour effectuer des agrégations"""
     
@@ -412,158 +771,192 @@ class StatisticsView(APIView):
     def get(self, request):
         """Obtenir les statistiques"""
         index = request.query_params.get('index', es_service.default_index)
-        stats = es_service.get_statistics(index)
-        
-        return Response(stats)
+        return cached_stats('stats', index, lambda: es_service.get_statistics(index), {'index': index})
 
 
-# === Vues pour les nouveaux types de données ===
+class DashboardView(APIView):
+    """Statistiques des cinq types de données en une requête (un seul _msearch)"""
+    
+    def get(self, request):
+        indices = ','.join(f'iot-{data_type}' for data_type in DATA_TYPES)
+        return cached_stats('dashboard', indices, es_service.get_dashboard)
 
-class AlertesView(APIView):
-    """Vue pour gérer les alertes"""
+
+class StatsCacheView(APIView):
+    """Compteurs hit/miss du cache des statistiques par endpoint et du cache des recherches (worker)"""
     
     def get(self, request):
-        """Récupérer les alertes avec filtres"""
-        result = es_service.search(
-            query=request.query_params.get('q'),
-            index='iot-alertes',
-            size=int(request.query_params.get('size', 50)),
-            from_offset=int(request.query_params.get('from', 0)),
-            filters={
-                'severite': request.query_params.get('severite'),
-                'statut': request.query_params.get('statut'),
-                'categorie': request.query_params.get('categorie'),
-                'batiment': request.query_params.get('batiment'),
+        try:
+            counters = stats_cache.counters()
+        except redis.RedisError as e:
+            logger.error(f"❌ Lecture des compteurs du cache impossible: {e}")
+            return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({
+            'ttl': stats_cache.ttl,
+            'endpoints': counters,
+            'queries': {
+                'ttl': query_cache.ttl,
+                'max_entries': query_cache.max_entries,
+                'pid': os.getpid(),
+                **query_cache.counters(),
             },
-            sort_by=request.query_params.get('sort_by', '@timestamp'),
-            sort_order=request.query_params.get('sort_order', 'desc')
-        )
+        })
+    
+    def delete(self, request):
+        """Remettre les compteurs à zéro"""
+        try:
+            stats_cache.reset_counters()
+            query_cache.reset_counters()
+        except redis.RedisError as e:
+            logger.error(f"❌ Remise à zéro des compteurs du cache impossible: {e}")
+            return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        logger.info("🗑️  Compteurs du cache des statistiques remis à zéro")
+        return Response({'reset': True})
+
+
+# === Vues pour les nouveaux types de données ===
+
+class TypedSearchView(APIView):
+    """
+    Recherche dans l'index d'un type de données (iot-<data_type>)
+    
+    Paramètres : q, fields, sort_by, sort_order, pagination (size, from,
+    pagination, cursor) et les filtres de la vue ({champ: paramètre}).
+    """
+    
+    data_type = None
+    filters = {}
+    
+    def get(self, request):
+        params = request.query_params
+        result = paginated_search(page_params(params), **typed_search_criteria(params, self.data_type, self.filters))
         return Response(result)
 
 
+class AlertesView(TypedSearchView):
+    """Vue pour gérer les alertes"""
+    
+    data_type = 'alertes'
+    filters = {
+        'severite': 'severite',
+        'statut': 'statut',
+        'categorie': 'categorie',
+        'batiment': 'batiment',
+    }
+
+
 class AlertesStatsView(APIView):
     """Statistiques des alertes"""
     
     def get(self, request):
-        stats = es_service.get_alertes_statistics()
-        return Response(stats)
+        return cached_stats('alertes_stats', 'iot-alertes', es_service.get_alertes_statistics)
 
 
-class CapteursView(APIView):
+class CapteursView(TypedSearchView):
     """Vue pour gérer les capteurs"""
     
-    def get(self, request):
-        """Récupérer les données des capteurs avec filtres"""
-        result = es_service.search(
-            query=request.query_params.get('q'),
-            index='iot-capteurs',
-            size=int(request.query_params.get('size', 50)),
-            from_offset=int(request.query_params.get('from', 0)),
-            filters={
-                'type': request.query_params.get('type'),
-                'statut_capteur': request.query_params.get('statut'),
-                'batiment': request.query_params.get('batiment'),
-                'zone': request.query_params.get('zone'),
-            },
-            sort_by=request.query_params.get('sort_by', '@timestamp'),
-            sort_order=request.query_params.get('sort_order', 'desc')
-        )
-        return Response(result)
+    data_type = 'capteurs'
+    filters = {
+        'type': 'type',
+        'statut_capteur': 'statut',
+        'batiment': 'batiment',
+        'zone': 'zone',
+    }
 
 
 class CapteursStatsView(APIView):
     """Statistiques des capteurs"""
     
     def get(self, request):
-        stats = es_service.get_capteurs_statistics()
-        return Response(stats)
+        return cached_stats('capteurs_stats', 'iot-capteurs', es_service.get_capteurs_statistics)
 
 
-class ConsommationView(APIView):
+class ConsommationView(TypedSearchView):
     """Vue pour gérer la consommation d'énergie"""
     
-    def get(self, request):
-        """Récupérer les données de consommation avec filtres"""
-        result = es_service.search(
-            query=request.query_params.get('q'),
-            index='iot-consommation',
-            size=int(request.query_params.get('size', 50)),
-            from_offset=int(request.query_params.get('from', 0)),
-            filters={
-                'type_energie': request.query_params.get('type_energie'),
-                'sous_type': request.query_params.get('sous_type'),
-                'batiment': request.query_params.get('batiment'),
-                'zone': request.query_params.get('zone'),
-            },
-            sort_by=request.query_params.get('sort_by', '@timestamp'),
-            sort_order=request.query_params.get('sort_order', 'desc')
-        )
-        return Response(result)
+    data_type = 'consommation'
+    filters = {
+        'type_energie': 'type_energie',
+        'sous_type': 'sous_type',
+        'batiment': 'batiment',
+        'zone': 'zone',
+    }
 
 
 class ConsommationStatsView(APIView):
-    """Statistiques de consommation"""
+    """Statistiques de consommation (paramètres date_from, date_to, batiment, zone, type_energie, sous_type)"""
     
     def get(self, request):
-        stats = es_service.get_consommation_statistics()
-        return Response(stats)
+        report = consumption_report(request.query_params)
+        return cached_stats(
+            'consommation_stats', 'iot-consommation',
+            lambda: es_service.get_consommation_statistics(report['date_from'], report['date_to'], report['filters']),
+            report
+        )
 
 
-class OccupationView(APIView):
-    """Vue pour gérer l'occupation des salles"""
+class ConsommationHistogramView(APIView):
+    """Consommation, coût et empreinte carbone par intervalle (mêmes paramètres, plus interval)"""
     
     def get(self, request):
-        """Récupérer les données d'occupation avec filtres"""
-        result = es_service.search(
-            query=request.query_params.get('q'),
-            index='iot-occupation',
-            size=int(request.query_params.get('size', 50)),
-            from_offset=int(request.query_params.get('from', 0)),
-            filters={
-                'type_salle': request.query_params.get('type_salle'),
-                'statut_occupation': request.query_params.get('statut'),
-                'batiment': request.query_params.get('batiment'),
-                'zone': request.query_params.get('zone'),
-            },
-            sort_by=request.query_params.get('sort_by', '@timestamp'),
-            sort_order=request.query_params.get('sort_order', 'desc')
+        report = consumption_report(request.query_params)
+        return cached_stats(
+            'consommation_histogram', 'iot-consommation',
+            lambda: es_service.get_consommation_histogram(
+                report['interval'], report['date_from'], report['date_to'], report['filters']
+            ),
+            report
         )
-        return Response(result)
+
+
+class OccupationView(TypedSearchView):
+    """Vue pour gérer l'occupation des salles"""
+    
+    data_type = 'occupation'
+    filters = {
+        'type_salle': 'type_salle',
+        'statut_occupation': 'statut',
+        'batiment': 'batiment',
+        'zone': 'zone',
+    }
 
 
 class OccupationStatsView(APIView):
     """Statistiques d'occupation"""
     
     def get(self, request):
-        stats = es_service.get_occupation_statistics()
-        return Response(stats)
+        return cached_stats('occupation_stats', 'iot-occupation', es_service.get_occupation_statistics)
 
 
-class MaintenanceView(APIView):
+class MaintenanceView(TypedSearchView):
     """Vue pour gérer la maintenance"""
     
-    def get(self, request):
-        """Récupérer les données de maintenance avec filtres"""
-        result = es_service.search(
-            query=request.query_params.get('q'),
-            index='iot-maintenance',
-            size=int(request.query_params.get('size', 50)),
-            from_offset=int(request.query_params.get('from', 0)),
-            filters={
-                'type_equipement': request.query_params.get('type_equipement'),
-                'type_maintenance': request.query_params.get('type_maintenance'),
-                'severite': request.query_params.get('severite'),
-                'batiment': request.query_params.get('batiment'),
-            },
-            sort_by=request.query_params.get('sort_by', '@timestamp'),
-            sort_order=request.query_params.get('sort_order', 'desc')
-        )
-        return Response(result)
+    data_type = 'maintenance'
+    filters = {
+        'type_equipement': 'type_equipement',
+        'type_maintenance': 'type_maintenance',
+        'severite': 'severite',
+        'batiment': 'batiment',
+    }
 
 
 class MaintenanceStatsView(APIView):
     """Statistiques de maintenance"""
     
     def get(self, request):
-        stats = es_service.get_maintenance_statistics()
-        return Response(stats)
+        return cached_stats('maintenance_stats', 'iot-maintenance', es_service.get_maintenance_statistics)
+
+
+class LiveStreamView(View):
+    """
+    Flux temps réel des documents indexés (Server-Sent Events)
+    
+    Servi par async_views.LiveStreamView : sous WSGI, chaque client connecté
+    occuperait un thread du worker pendant toute la durée du flux.
+    """
+    
+    def get(self, request):
+        return JsonResponse(
+            {'error': "Flux temps réel disponible uniquement en déploiement ASGI (config/asgi.py)"},
+            status=501
+        )
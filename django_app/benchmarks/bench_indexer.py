@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Benchmark de l'indexation Redis -> Elasticsearch
+
+Mesure le débit (documents/s) de BulkIndexer pour plusieurs nombres de
+workers, et optionnellement celui du pipeline Logstash sur la même machine.
+
+Mode Python : N messages sont poussés sur une liste dédiée, puis
+BulkIndexer la vide dans des index bench-iot-* (supprimés à la fin).
+
+Mode --logstash : N messages sont poussés sur iot:data (lue par Logstash,
+run_indexer doit être arrêté) avec un source_file unique ; le chronomètre
+s'arrête quand tous les documents sont visibles dans iot-capteurs, puis ils
+sont supprimés. Le temps inclut l'envoi vers Redis et le refresh (1s).
+
+Usage (depuis django_app/):
+    python benchmarks/bench_indexer.py
+    python benchmarks/bench_indexer.py --records 200000 --workers 1 2 4 8 --logstash
+    REDIS_HOST=localhost ELASTICSEARCH_URL=http://localhost:9200 python benchmarks/bench_indexer.py
+"""
+import argparse
+import os
+import sys
+import time
+
+import redis
+from elasticsearch import Elasticsearch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.indexer import BulkIndexer, ListSource  # noqa: E402
+from api.redis_queue import enqueue_records, build_metadata, DEFAULT_QUEUE_KEY  # noqa: E402
+from api.schemas import keyword_field  # noqa: E402
+
+BENCH_KEY = "bench:iot:data"
+BENCH_PREFIX = "bench-iot"
+
+
+def make_records(count):
+    """Enregistrements représentatifs de logs_capteurs.csv (valeurs texte, comme un CSV)"""
+    return [
+        {
+            "timestamp": f"2025-01-15 10:{i // 60 % 60:02d}:{i % 60:02d}",
+            "capteur_id": f"CAP-{i % 500:04d}",
+            "type": "temperature",
+            "valeur": "21.5",
+            "unite": "°C",
+            "batiment": "Batiment A",
+            "salle": f"Salle {i % 50}",
+            "etage": "2",
+            "zone": "Zone Nord",
+            "statut_capteur": "actif",
+            "batterie": "87",
+            "precision": "0.1",
+            "seuil_min": "18",
+            "seuil_max": "26",
+        }
+        for i in range(count)
+    ]
+
+
+def report(label, count, elapsed):
+    rate = count / elapsed
+    print(f"{label:<40} {count:>8} docs en {elapsed:8.3f}s  -> {rate:>12,.0f} docs/s")
+    return rate
+
+
+def bench_python(client, es, records, args, workers):
+    client.delete(BENCH_KEY)
+    enqueue_records(client, records, build_metadata("bench.csv", "csv", "capteurs"), key=BENCH_KEY)
+    
+    indexer = BulkIndexer(
+        es, ListSource(client, key=BENCH_KEY),
+        batch_size=args.batch_size, flush_interval=args.flush_interval,
+        workers=workers, chunk_size=args.chunk_size, prefix=BENCH_PREFIX
+    )
+    start = time.perf_counter()
+    stats = indexer.run(drain=True)
+    elapsed = time.perf_counter() - start
+    return report(f"run_indexer workers={workers}", stats['indexed'], elapsed)
+
+
+def bench_logstash(client, es, records, timeout):
+    source_file = f"bench-logstash-{int(time.time())}.csv"
+    query = {"term": {keyword_field("source_file", "iot-capteurs"): source_file}}
+    
+    start = time.perf_counter()
+    enqueue_records(client, records, build_metadata(source_file, "csv", "capteurs"), key=DEFAULT_QUEUE_KEY)
+    count = 0
+    try:
+        while time.perf_counter() - start < timeout:
+            count = es.count(index="iot-capteurs", query=query, ignore_unavailable=True)['count']
+            if count >= len(records):
+                break
+            time.sleep(0.5)
+        elapsed = time.perf_counter() - start
+    finally:
+        es.delete_by_query(index="iot-capteurs", query=query, refresh=True,
+                           conflicts="proceed", ignore_unavailable=True)
+    
+    if count < len(records):
+        print(f"Logstash: seulement {count}/{len(records)} documents après {timeout}s")
+        return None
+    return report("Logstash (redis-to-elasticsearch.conf)", count, elapsed)
+
+
+def delete_bench_indices(es):
+    # Suppression par nom : les jokers sont refusés par défaut (destructive_requires_name)
+    names = list(es.indices.get(index=f"{BENCH_PREFIX}-*", ignore_unavailable=True))
+    if names:
+        es.indices.delete(index=",".join(names))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--flush-interval', type=float, default=1.0)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--logstash', action='store_true', help="Mesurer aussi Logstash")
+    parser.add_argument('--timeout', type=float, default=600, help="Attente maximale pour Logstash (s)")
+    args = parser.parse_args()
+    
+    client = redis.Redis(
+        host=os.getenv('REDIS_HOST', 'localhost'),
+        port=int(os.getenv('REDIS_PORT', 6379)),
+        password=os.getenv('REDIS_PASSWORD', 'redis_password_123'),
+        decode_responses=True
+    )
+    client.ping()
+    es = Elasticsearch([os.getenv('ELASTICSEARCH_URL', 'http://localhost:9200')])
+    es.info()
+    
+    records = make_records(args.records)
+    print(f"{args.records} documents, lots de {args.batch_size}, requêtes bulk de {args.chunk_size}")
+    print("-" * 90)
+    
+    rates = {}
+    try:
+        for workers in args.workers:
+            rates[workers] = bench_python(client, es, records, args, workers)
+            delete_bench_indices(es)
+        
+        logstash = bench_logstash(client, es, records, args.timeout) if args.logstash else None
+    finally:
+        client.delete(BENCH_KEY)
+        delete_bench_indices(es)
+    
+    print("-" * 90)
+    if logstash:
+        best = max(rates, key=rates.get)
+        print(f"Meilleur run_indexer (workers={best}) : x{rates[best] / logstash:.1f} par rapport à Logstash")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark de l'envoi des enregistrements vers Redis
+
+Compare l'ancien envoi (un LPUSH et un datetime.now() par enregistrement)
+avec enqueue_records (LPUSH multi-valeurs pipelinés) sur un vrai serveur Redis.
+
+Usage (depuis django_app/):
+    python benchmarks/bench_redis_enqueue.py
+    python benchmarks/bench_redis_enqueue.py --records 100000 --chunk-size 1000
+    REDIS_HOST=localhost python benchmarks/bench_redis_enqueue.py
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import redis
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.redis_queue import enqueue_records, build_metadata  # noqa: E402
+
+BENCH_KEY = "bench:iot:data"
+
+
+def make_records(count):
+    """Enregistrements représentatifs de logs_capteurs.csv"""
+    return [
+        {
+            "capteur_id": f"CAP-{i % 500:04d}",
+            "timestamp": "2025-01-15 10:30:00",
+            "type": "temperature",
+            "valeur": "21.5",
+            "unite": "°C",
+            "batiment": "Batiment A",
+            "etage": "2",
+            "zone": "Nord",
+            "statut_capteur": "actif",
+            "batterie": "87",
+        }
+        for i in range(count)
+    ]
+
+
+def legacy_enqueue(client, records, filename, file_type, data_type):
+    """Ancienne implémentation : un aller-retour par enregistrement"""
+    count = 0
+    for record in records:
+        enriched_record = {
+            "source_file": filename,
+            "file_type": file_type,
+            "data_type": data_type,
+            "upload_timestamp": datetime.now().isoformat(),
+            "data": record
+        }
+        client.lpush(BENCH_KEY, json.dumps(enriched_record))
+        count += 1
+    return count
+
+
+def run(label, func):
+    start = time.perf_counter()
+    count = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {count:>8} enr. en {elapsed:8.3f}s  -> {count / elapsed:>12,.0f} enr./s")
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--pipeline-depth', type=int, default=8)
+    args = parser.parse_args()
+    
+    client = redis.Redis(
+        host=os.getenv('REDIS_HOST', 'localhost'),
+        port=int(os.getenv('REDIS_PORT', 6379)),
+        password=os.getenv('REDIS_PASSWORD', 'redis_password_123'),
+        decode_responses=True
+    )
+    client.ping()
+    
+    records = make_records(args.records)
+    print(f"Redis {client.connection_pool.connection_kwargs['host']} - {args.records} enregistrements")
+    print("-" * 90)
+    
+    try:
+        client.delete(BENCH_KEY)
+        before = run("avant : LPUSH par enregistrement",
+                     lambda: legacy_enqueue(client, records, "bench.csv", "csv", "capteurs"))
+        
+        client.delete(BENCH_KEY)
+        after = run(f"après : chunk={args.chunk_size} pipeline={args.pipeline_depth}",
+                    lambda: enqueue_records(
+                        client, records, build_metadata("bench.csv", "csv", "capteurs"),
+                        key=BENCH_KEY, chunk_size=args.chunk_size, pipeline_depth=args.pipeline_depth,
+                    )['enqueued'])
+    finally:
+        client.delete(BENCH_KEY)
+    
+    print("-" * 90)
+    print(f"Accélération: x{after / before:.1f}")
+
+
+if __name__ == '__main__':
+    main()
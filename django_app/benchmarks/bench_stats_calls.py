@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark des allers-retours Elasticsearch des endpoints de statistiques
+
+Appelle chaque méthode get_*_statistics d'ElasticsearchService (dont
+celles des ViewSets capteurs et véhicules), ainsi que get_dashboard, sur
+un client Elasticsearch simulé qui compte les requêtes et ajoute une
+latence réseau fixe, puis affiche le nombre d'appels et la durée par
+endpoint.
+
+Un endpoint qui dépasse --max-calls requêtes fait échouer le script
+(code de sortie 1) : un second aller-retour (count + search...) ne peut
+pas réapparaître sans être vu. Aucun serveur n'est nécessaire. Le même
+contrôle tourne dans les tests (api.tests.StatsCallCountTests) ; ce
+script sert surtout à mesurer l'effet de la latence.
+
+Usage (depuis django_app/):
+    python benchmarks/bench_stats_calls.py
+    python benchmarks/bench_stats_calls.py --latency-ms 5 --repeat 20
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from api.elasticsearch_service import ElasticsearchService  # noqa: E402
+
+ENDPOINTS = {
+    '/api/stats/': lambda service: service.get_statistics(),
+    '/api/alertes/stats/': lambda service: service.get_alertes_statistics(),
+    '/api/capteurs/stats/': lambda service: service.get_capteurs_statistics(),
+    '/api/consommation/stats/': lambda service: service.get_consommation_statistics(),
+    '/api/occupation/stats/': lambda service: service.get_occupation_statistics(),
+    '/api/maintenance/stats/': lambda service: service.get_maintenance_statistics(),
+    '/api/dashboard/': lambda service: service.get_dashboard(),
+    '/api/sensors/statistics/': lambda service: service.get_sensor_statistics(),
+    '/api/vehicles/statistics/': lambda service: service.get_vehicle_statistics(),
+}
+
+
+def fake_aggregation(definition):
+    """Réponse vide plausible pour une agrégation"""
+    agg_type = next(iter(key for key in definition if key != 'aggs'))
+    if agg_type in ('terms', 'date_histogram', 'histogram', 'range'):
+        return {'buckets': []}
+    if agg_type == 'stats':
+        return {'count': 0, 'min': None, 'max': None, 'avg': None, 'sum': 0.0}
+    if agg_type == 'filter':
+        return {'doc_count': 0}
+    return {'value': None}
+
+
+class StubElasticsearch:
+    """Client Elasticsearch simulé : compte les appels, latence fixe"""
+    
+    def __init__(self, latency: float = 0.0, total: int = 1234):
+        self.latency = latency
+        self.total = total
+        self.calls = Counter()
+    
+    def _call(self, name):
+        self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+    
+    def search(self, index=None, body=None, **kwargs):
+        self._call('search')
+        return self._response({**(body or {}), **kwargs})
+    
+    def _response(self, body):
+        return {
+            'hits': {'total': {'value': self.total, 'relation': 'eq'}, 'hits': []},
+            'aggregations': {
+                name: fake_aggregation(definition) for name, definition in body.get('aggs', {}).items()
+            },
+        }
+    
+    def msearch(self, searches=None, **kwargs):
+        self._call('msearch')
+        bodies = (searches or [])[1::2]
+        return {'responses': [self._response(body) for body in bodies]}
+    
+    def count(self, index=None, **kwargs):
+        self._call('count')
+        return {'count': self.total}
+    
+    def __getattr__(self, name):
+        raise AttributeError(f"Appel Elasticsearch non simulé: {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency-ms', type=float, default=2.0, help="Latence simulée par requête")
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--max-calls', type=int, default=1, help="Requêtes maximales par endpoint")
+    args = parser.parse_args()
+    
+    service = ElasticsearchService()
+    print(f"Latence simulée {args.latency_ms} ms par requête, {args.repeat} appels par endpoint")
+    print("-" * 90)
+    
+    failed = []
+    for endpoint, call in ENDPOINTS.items():
+        stub = StubElasticsearch(latency=args.latency_ms / 1000)
+        service.es = stub
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            result = call(service)
+        elapsed = (time.perf_counter() - start) / args.repeat
+        
+        calls = sum(stub.calls.values()) / args.repeat
+        detail = ', '.join(f"{name}={count // args.repeat}" for name, count in sorted(stub.calls.items()))
+        error = result.get('error') if isinstance(result, dict) else None
+        print(f"{endpoint:<28} {calls:>4.0f} requête(s) ({detail})  {elapsed * 1000:7.2f} ms"
+              + (f"  ERREUR: {error}" if error else ""))
+        if calls > args.max_calls or error:
+            failed.append(endpoint)
+    
+    print("-" * 90)
+    if failed:
+        print(f"❌ Trop de requêtes ou erreur : {', '.join(failed)}")
+        sys.exit(1)
+    print(f"✅ Au plus {args.max_calls} requête(s) Elasticsearch par endpoint")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,15 @@
+"""
+ASGI config for BigData IoT Backend
+
+Production : gunicorn -k uvicorn.workers.UvicornWorker config.asgi:application
+Les vues de lecture asynchrones (api/async_views.py) sont activées ici.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ.setdefault('DJANGO_ASYNC_VIEWS', '1')
+
+application = get_asgi_application()
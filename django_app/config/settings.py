@@ -34,6 +34,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -63,6 +64,11 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
+
+# Vues asynchrones (api/async_views.py) : activées par config/asgi.py, les
+# clients asynchrones ont besoin de la boucle d'événements du serveur ASGI
+ASYNC_VIEWS = os.getenv('DJANGO_ASYNC_VIEWS', '0') == '1'
 
 # Database (SQLite for now, can use PostgreSQL later)
 DATABASES = {
@@ -98,6 +104,20 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Upload de fichiers : parsing en flux, au-delà de FILE_UPLOAD_MAX_MEMORY_SIZE
+# Django écrit le fichier dans un fichier temporaire au lieu de la mémoire
+FILE_UPLOAD_MAX_SIZE = int(os.getenv('FILE_UPLOAD_MAX_SIZE', 4 * 1024 * 1024 * 1024))  # 4GB
+
+# Fichiers uploadés en mode asynchrone (en attente de traitement)
+MEDIA_URL = 'media/'
+MEDIA_ROOT = Path(os.getenv('MEDIA_ROOT', BASE_DIR / 'media'))
+
+# Pool de workers pour les uploads asynchrones
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', 2))
+UPLOAD_PROGRESS_INTERVAL = float(os.getenv('UPLOAD_PROGRESS_INTERVAL', 1.0))  # secondes entre deux mises à jour
+# Upload sans progression depuis UPLOAD_STALE_AFTER s : repris par manage.py recover_uploads
+UPLOAD_STALE_AFTER = float(os.getenv('UPLOAD_STALE_AFTER', 300))
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -129,17 +149,115 @@ REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
 REDIS_PASSWORD = os.getenv('REDIS_PASSWORD', 'redis_password_123')
 REDIS_URL = f'redis://:{REDIS_PASSWORD}@{REDIS_HOST}:{REDIS_PORT}/0'
 
+# Pool de connexions Redis de chaque processus (api/clients.py) : un Redis
+# lent fait échouer l'appel après REDIS_SOCKET_TIMEOUT au lieu de bloquer
+# le worker ; REDIS_RETRIES nouvelles tentatives (attente exponentielle)
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', 50))
+REDIS_SOCKET_CONNECT_TIMEOUT = float(os.getenv('REDIS_SOCKET_CONNECT_TIMEOUT', 2))
+REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', 5))
+REDIS_RETRY_ON_TIMEOUT = os.getenv('REDIS_RETRY_ON_TIMEOUT', '1') == '1'
+REDIS_RETRIES = int(os.getenv('REDIS_RETRIES', 2))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv('REDIS_HEALTH_CHECK_INTERVAL', 30))
+
+# File Redis consommée par Logstash (ou manage.py run_indexer) et envoi par paquets pipelinés
+REDIS_QUEUE_KEY = os.getenv('REDIS_QUEUE_KEY', 'iot:data')
+REDIS_ENQUEUE_CHUNK_SIZE = int(os.getenv('REDIS_ENQUEUE_CHUNK_SIZE', 500))
+REDIS_ENQUEUE_PIPELINE_DEPTH = int(os.getenv('REDIS_ENQUEUE_PIPELINE_DEPTH', 8))
+
+# Transport des uploads : 'list' (iot:data, lu par Logstash) ou 'stream'
+# (Redis Stream lu par groupe de consommateurs : manage.py consume_iot_stream)
+REDIS_TRANSPORT = os.getenv('REDIS_TRANSPORT', 'list')
+REDIS_STREAM_KEY = os.getenv('REDIS_STREAM_KEY', 'iot:stream')
+REDIS_STREAM_GROUP = os.getenv('REDIS_STREAM_GROUP', 'iot-ingest')
+REDIS_STREAM_MAXLEN = int(os.getenv('REDIS_STREAM_MAXLEN', 1000000))
+REDIS_STREAM_CLAIM_IDLE_MS = int(os.getenv('REDIS_STREAM_CLAIM_IDLE_MS', 60000))
+
+# Indexeur Python Redis -> Elasticsearch (manage.py run_indexer)
+INDEXER_BATCH_SIZE = int(os.getenv('INDEXER_BATCH_SIZE', 5000))
+INDEXER_FLUSH_INTERVAL = float(os.getenv('INDEXER_FLUSH_INTERVAL', 1.0))
+INDEXER_WORKERS = int(os.getenv('INDEXER_WORKERS', 2))
+INDEXER_CHUNK_SIZE = int(os.getenv('INDEXER_CHUNK_SIZE', 1000))
+# Refus temporaires (429, 5xx) : attente exponentielle avec jitter entre les tentatives
+INDEXER_MAX_RETRIES = int(os.getenv('INDEXER_MAX_RETRIES', 5))
+INDEXER_INITIAL_BACKOFF = float(os.getenv('INDEXER_INITIAL_BACKOFF', 0.5))
+INDEXER_MAX_BACKOFF = float(os.getenv('INDEXER_MAX_BACKOFF', 60))
+# Documents refusés définitivement par Elasticsearch (API /api/dlq/)
+REDIS_DLQ_KEY = os.getenv('REDIS_DLQ_KEY', 'iot:dlq')
+
+# Flux temps réel /api/stream/ (SSE, déploiement ASGI) : l'indexeur publie
+# chaque lot indexé sur LIVE_STREAM_CHANNEL ; chaque client a un tampon de
+# LIVE_STREAM_BUFFER documents au plus (politique drop ou merge au-delà)
+LIVE_STREAM_PUBLISH = os.getenv('LIVE_STREAM_PUBLISH', '1') == '1'
+LIVE_STREAM_CHANNEL = os.getenv('LIVE_STREAM_CHANNEL', 'iot:live')
+LIVE_STREAM_BUFFER = int(os.getenv('LIVE_STREAM_BUFFER', 500))
+LIVE_STREAM_POLICY = os.getenv('LIVE_STREAM_POLICY', 'drop')
+LIVE_STREAM_MAX_CLIENTS = int(os.getenv('LIVE_STREAM_MAX_CLIENTS', 1000))
+# Commentaire SSE envoyé sans nouveauté (proxies, détection des clients partis)
+LIVE_STREAM_HEARTBEAT = float(os.getenv('LIVE_STREAM_HEARTBEAT', 15))
+
+# Cache Redis des endpoints de statistiques, invalidé par l'indexeur après
+# chaque lot ; le TTL couvre les écritures Logstash et ingest_all
+STATS_CACHE_PREFIX = os.getenv('STATS_CACHE_PREFIX', 'iot:cache')
+STATS_CACHE_TTL = int(os.getenv('STATS_CACHE_TTL', 300))
+
 # Elasticsearch configuration
 ELASTICSEARCH_HOST = os.getenv('ELASTICSEARCH_HOST', 'elasticsearch')
 ELASTICSEARCH_PORT = int(os.getenv('ELASTICSEARCH_PORT', 9200))
 ELASTICSEARCH_URL = f'http://{ELASTICSEARCH_HOST}:{ELASTICSEARCH_PORT}'
 
+# Client Elasticsearch de chaque processus (api/clients.py) : connexions
+# par nœud, délai par requête (connexion et lecture), reprises. Le sniffing
+# découvre les nœuds du cluster : à n'activer que si leurs adresses publiées
+# sont joignables depuis l'API (pas derrière un Service Kubernetes)
+ELASTICSEARCH_CONNECTIONS_PER_NODE = int(os.getenv('ELASTICSEARCH_CONNECTIONS_PER_NODE', 10))
+ELASTICSEARCH_REQUEST_TIMEOUT = float(os.getenv('ELASTICSEARCH_REQUEST_TIMEOUT', 10))
+ELASTICSEARCH_MAX_RETRIES = int(os.getenv('ELASTICSEARCH_MAX_RETRIES', 2))
+ELASTICSEARCH_RETRY_ON_TIMEOUT = os.getenv('ELASTICSEARCH_RETRY_ON_TIMEOUT', '1') == '1'
+ELASTICSEARCH_SNIFF = os.getenv('ELASTICSEARCH_SNIFF', '0') == '1'
+
 ELASTICSEARCH_INDEX = {
     'IOT_DATA': 'iot-*',
     'SENSORS': 'sensors-*',
     'VEHICLES': 'vehicles-*',
 }
 
+# Pagination : from + size limité à index.max_result_window, au-delà
+# pagination par curseur (point-in-time + search_after)
+ELASTICSEARCH_MAX_RESULT_WINDOW = int(os.getenv('ELASTICSEARCH_MAX_RESULT_WINDOW', 10000))
+SEARCH_PIT_KEEP_ALIVE = os.getenv('SEARCH_PIT_KEEP_ALIVE', '2m')
+
+# Recherches et agrégations identiques (api/query_cache.py) : une seule
+# requête Elasticsearch par worker pour les appels simultanés, réponse
+# gardée QUERY_CACHE_TTL s (QUERY_CACHE_SIZE réponses au plus ; 0 =
+# coalescence seule). Garder un TTL de l'ordre du refresh des index (1 s)
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', 256))
+QUERY_CACHE_TTL = float(os.getenv('QUERY_CACHE_TTL', 2))
+
+# Métriques Prometheus (/metrics) : mesures de chaque worker agrégées dans Redis
+METRICS_REDIS_KEY = os.getenv('METRICS_REDIS_KEY', 'iot:metrics')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+
+# Santé (/api/health/, sondes live/ready) : vérifications en arrière-plan
+# toutes les HEALTH_CHECK_INTERVAL s, servies depuis la mémoire ; readiness
+# échoue si l'instantané a plus de HEALTH_STALE_AFTER s
+HEALTH_CHECK_INTERVAL = float(os.getenv('HEALTH_CHECK_INTERVAL', 5))
+HEALTH_STALE_AFTER = float(os.getenv('HEALTH_STALE_AFTER', 30))
+HEALTH_TREND_WINDOW = float(os.getenv('HEALTH_TREND_WINDOW', 300))
+
+# Fraction des requêtes journalisées en détail (durée, temps Elasticsearch)
+REQUEST_DEBUG_SAMPLE_RATE = float(os.getenv('REQUEST_DEBUG_SAMPLE_RATE', 0.0))
+
+# Rollover des index iot-<type>-NNNNNN (manage.py setup_elasticsearch)
+ELASTICSEARCH_ROLLOVER_MAX_SIZE = os.getenv('ELASTICSEARCH_ROLLOVER_MAX_SIZE', '50gb')
+ELASTICSEARCH_ROLLOVER_MAX_AGE = os.getenv('ELASTICSEARCH_ROLLOVER_MAX_AGE', '30d')
+# Conservation des index après rollover (ex: '365d'), vide = illimitée
+ELASTICSEARCH_RETENTION = os.getenv('ELASTICSEARCH_RETENTION') or None
+
+# Rollups horaires/journaliers de la consommation (manage.py rollup_consommation) :
+# seules les heures terminées depuis ROLLUP_DELAY_MINUTES sont agrégées
+ROLLUP_DELAY_MINUTES = int(os.getenv('ROLLUP_DELAY_MINUTES', 15))
+ROLLUP_INTERVAL = int(os.getenv('ROLLUP_INTERVAL', 300))
+
 # Logging
 LOGGING = {
     'version': 1,
@@ -1,6 +1,7 @@
 """
 URL configuration for BigData IoT Backend
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
@@ -15,15 +16,24 @@ router.register(r'files', views.FileUploadViewSet, basename='file-upload')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', views.MetricsView.as_view(), name='metrics'),
     
     # API endpoints
     path('api/', include(router.urls)),
     
     # Endpoints personnalisés
     path('api/search/', views.ElasticsearchSearchView.as_view(), name='elasticsearch-search'),
+    path('api/export/', views.ExportView.as_view(), name='export'),
     path('api/stats/', views.StatisticsView.as_view(), name='statistics'),
+    path('api/stats/cache/', views.StatsCacheView.as_view(), name='statistics-cache'),
+    path('api/dashboard/', views.DashboardView.as_view(), name='dashboard'),
     path('api/aggregations/', views.AggregationsView.as_view(), name='aggregations'),
     path('api/health/', views.HealthCheckView.as_view(), name='health-check'),
+    path('api/health/live/', views.LivenessView.as_view(), name='health-live'),
+    path('api/health/ready/', views.ReadinessView.as_view(), name='health-ready'),
+    path('api/dlq/', views.DeadLetterView.as_view(), name='dead-letters'),
+    path('api/dlq/replay/', views.DeadLetterReplayView.as_view(), name='dead-letters-replay'),
+    path('api/stream/', views.LiveStreamView.as_view(), name='live-stream'),
     
     # Nouveaux endpoints pour les fichiers logs
     path('api/alertes/', views.AlertesView.as_view(), name='alertes'),
@@ -32,6 +42,7 @@ urlpatterns = [
     path('api/capteurs/stats/', views.CapteursStatsView.as_view(), name='capteurs-stats'),
     path('api/consommation/', views.ConsommationView.as_view(), name='consommation'),
     path('api/consommation/stats/', views.ConsommationStatsView.as_view(), name='consommation-stats'),
+    path('api/consommation/histogram/', views.ConsommationHistogramView.as_view(), name='consommation-histogram'),
     path('api/occupation/', views.OccupationView.as_view(), name='occupation'),
     path('api/occupation/stats/', views.OccupationStatsView.as_view(), name='occupation-stats'),
     path('api/maintenance/', views.MaintenanceView.as_view(), name='maintenance'),
@@ -40,3 +51,9 @@ urlpatterns = [
     # Upload de fichiers (legacy endpoint)
     path('upload/', views.FileUploadView.as_view(), name='file-upload-legacy'),
 ]
+
+# Déploiement ASGI (config/asgi.py) : vues asynchrones pour les lectures,
+# placées en tête pour remplacer les routes synchrones de même URL
+if settings.ASYNC_VIEWS:
+    from api import async_views
+    urlpatterns = async_views.urlpatterns() + urlpatterns
@@ -1,82 +1,68 @@
 """
-Flask API pour recevoir des fichiers (CSV/JSON) et les envoyer vers Redis
+Flask API pour recevoir des fichiers (CSV/JSON/NDJSON, compressés .gz/.zst) et les envoyer vers Redis
 Les données sont ensuite consommées par Logstash pour indexation dans Elasticsearch
 """
 
 from flask import Flask, request, jsonify
 import redis
-import json
-import csv
-import io
+import os
 from datetime import datetime
 import logging
 
+from api.redis_queue import enqueue_records, build_metadata, EnqueueError, TRANSPORT_LIST, TRANSPORT_STREAM
+from api.upload_parsers import iter_records, detect_format, SUPPORTED_EXTENSIONS
+from api.clients import LazyClient, redis_options
+
 # Configuration de l'application Flask
 app = Flask(__name__)
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # Limite 16MB
+# Parsing en flux : la limite ne dépend plus de la mémoire disponible (4GB par défaut)
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('FILE_UPLOAD_MAX_SIZE', 4 * 1024 * 1024 * 1024))
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Connexion Redis
-redis_client = redis.Redis(
-    host='redis',
-    port=6379,
-    password='redis_password_123',
-    decode_responses=True
-)
-
-# Vérifier la connexion Redis au démarrage
-try:
-    redis_client.ping()
-    logger.info("✅ Connexion Redis réussie")
-except Exception as e:
-    logger.error(f"❌ Erreur connexion Redis: {e}")
-
-
-def process_json_file(file_content):
-    """Traite un fichier JSON et retourne une liste de dictionnaires"""
-    try:
-        data = json.loads(file_content)
-        
-        # Si c'est un objet unique, le mettre dans une liste
-        if isinstance(data, dict):
-            data = [data]
-        
-        return data, None
-    except json.JSONDecodeError as e:
-        return None, f"Erreur de parsing JSON: {str(e)}"
+# File Redis et taille des paquets envoyés
+REDIS_QUEUE_KEY = os.getenv('REDIS_QUEUE_KEY', 'iot:data')
+REDIS_ENQUEUE_CHUNK_SIZE = int(os.getenv('REDIS_ENQUEUE_CHUNK_SIZE', 500))
 
+# Transport : 'list' (iot:data, lu par Logstash) ou 'stream' (groupe de consommateurs)
+REDIS_TRANSPORT = os.getenv('REDIS_TRANSPORT', TRANSPORT_LIST)
+REDIS_STREAM_KEY = os.getenv('REDIS_STREAM_KEY', 'iot:stream')
+REDIS_STREAM_MAXLEN = int(os.getenv('REDIS_STREAM_MAXLEN', 1000000))
 
-def process_csv_file(file_content):
-    """Traite un fichier CSV et retourne une liste de dictionnaires"""
-    try:
-        csv_file = io.StringIO(file_content)
-        reader = csv.DictReader(csv_file)
-        data = list(reader)
-        return data, None
-    except Exception as e:
-        return None, f"Erreur de parsing CSV: {str(e)}"
+# Connexion Redis : mêmes variables d'environnement que Django (config/settings.py),
+# pool créé au premier appel dans chaque processus (api/clients.py)
+redis_client = LazyClient('upload-redis', lambda: redis.Redis(**redis_options(
+    host=os.getenv('REDIS_HOST', 'redis'),
+    port=int(os.getenv('REDIS_PORT', 6379)),
+    password=os.getenv('REDIS_PASSWORD', 'redis_password_123'),
+    max_connections=int(os.getenv('REDIS_MAX_CONNECTIONS', 50)),
+    connect_timeout=float(os.getenv('REDIS_SOCKET_CONNECT_TIMEOUT', 2)),
+    timeout=float(os.getenv('REDIS_SOCKET_TIMEOUT', 5)),
+    retry_on_timeout=os.getenv('REDIS_RETRY_ON_TIMEOUT', '1') == '1',
+)))
 
 
 def send_to_redis(data_list, file_type, filename):
-    """Envoie les données vers Redis avec métadonnées"""
-    count = 0
-    for record in data_list:
-        # Enrichir chaque enregistrement avec des métadonnées
-        enriched_record = {
-            "source_file": filename,
-            "file_type": file_type,
-            "upload_timestamp": datetime.now().isoformat(),
-            "data": record
-        }
-        
-        # Envoyer vers Redis (liste iot:data)
-        redis_client.lpush("iot:data", json.dumps(enriched_record))
-        count += 1
+    """
+    Envoie les données vers Redis avec métadonnées
     
-    return count
+    data_list peut être un itérateur (fichier parsé en flux) : les
+    enregistrements sont poussés par paquets pipelinés (liste iot:data ou
+    stream selon REDIS_TRANSPORT).
+    Retourne le rapport d'envoi (enregistrements envoyés, paquets en échec).
+    """
+    stream = REDIS_TRANSPORT == TRANSPORT_STREAM
+    return enqueue_records(
+        redis_client,
+        data_list,
+        build_metadata(filename, file_type),
+        key=REDIS_STREAM_KEY if stream else REDIS_QUEUE_KEY,
+        chunk_size=REDIS_ENQUEUE_CHUNK_SIZE,
+        transport=REDIS_TRANSPORT,
+        maxlen=REDIS_STREAM_MAXLEN if stream else None,
+    )
 
 
 @app.route('/health', methods=['GET'])
@@ -98,11 +84,13 @@ def health_check():
 @app.route('/upload', methods=['POST'])
 def upload_file():
     """
-    Endpoint principal pour uploader des fichiers CSV ou JSON
+    Endpoint principal pour uploader des fichiers CSV, JSON ou NDJSON
     
     Usage:
         curl -X POST -F "file=@data.csv" http://localhost:8000/upload
         curl -X POST -F "file=@data.json" http://localhost:8000/upload
+        curl -X POST -F "file=@batch.ndjson.gz" http://localhost:8000/upload
+        curl -X POST -F "file=@batch.jsonl.zst" http://localhost:8000/upload
     """
     
     # Vérifier qu'un fichier est présent
@@ -124,81 +112,76 @@ def upload_file():
     filename = file.filename
     logger.info(f"📁 Fichier reçu: {filename}")
     
-    # Lire le contenu du fichier
-    try:
-        file_content = file.read().decode('utf-8')
-    except UnicodeDecodeError:
-        return jsonify({
-            "error": "Erreur d'encodage",
-            "message": "Le fichier doit être encodé en UTF-8"
-        }), 400
-    
-    # Détecter le type de fichier et le traiter
-    data_list = None
-    error_msg = None
-    
-    if filename.endswith('.json'):
-        data_list, error_msg = process_json_file(file_content)
-        file_type = "json"
-    elif filename.endswith('.csv'):
-        data_list, error_msg = process_csv_file(file_content)
-        file_type = "csv"
-    else:
+    # Détecter le type de fichier et sa compression éventuelle
+    file_type, compression = detect_format(filename)
+    if file_type is None:
         return jsonify({
             "error": "Type de fichier non supporté",
-            "message": "Seuls les fichiers .json et .csv sont acceptés",
+            "message": f"Formats acceptés: {', '.join(SUPPORTED_EXTENSIONS)}",
             "filename": filename
         }), 400
     
-    # Vérifier les erreurs de parsing
-    if error_msg:
+    # Parser le fichier en flux (décompression à la volée) et envoyer les données vers Redis
+    try:
+        report = send_to_redis(
+            iter_records(file.stream, file_type, compression=compression),
+            file_type,
+            filename
+        )
+    except EnqueueError as e:
+        if isinstance(e.error, UnicodeDecodeError):
+            error, message = "Erreur d'encodage", "Le fichier doit être encodé en UTF-8"
+        else:
+            error, message = "Erreur de traitement", f"Erreur de parsing {file_type.upper()}: {e}"
         return jsonify({
-            "error": "Erreur de traitement",
-            "message": error_msg,
-            "filename": filename
+            "error": error,
+            "message": message,
+            "filename": filename,
+            "records_processed": e.report['enqueued']
         }), 400
     
+    count = report['enqueued']
+    
     # Vérifier que des données ont été trouvées
-    if not data_list or len(data_list) == 0:
+    if not count and not report['failed']:
         return jsonify({
             "error": "Fichier vide",
             "message": "Aucune donnée trouvée dans le fichier",
             "filename": filename
         }), 400
     
-    # Envoyer les données vers Redis
-    try:
-        count = send_to_redis(data_list, file_type, filename)
-        
-        # Vérifier la longueur de la file Redis
-        queue_length = redis_client.llen("iot:data")
-        
-        logger.info(f"✅ {count} enregistrements envoyés vers Redis depuis {filename}")
-        
-        return jsonify({
-            "success": True,
-            "message": f"Fichier traité avec succès",
-            "filename": filename,
-            "file_type": file_type,
-            "records_processed": count,
-            "redis_queue_length": queue_length,
-            "timestamp": datetime.now().isoformat()
-        }), 200
-        
-    except Exception as e:
-        logger.error(f"❌ Erreur lors de l'envoi vers Redis: {e}")
+    if not count:
+        message = report['errors'][0]['error']
+        logger.error(f"❌ Erreur lors de l'envoi vers Redis: {message}")
         return jsonify({
             "error": "Erreur serveur",
-            "message": f"Impossible d'envoyer les données vers Redis: {str(e)}",
+            "message": f"Impossible d'envoyer les données vers Redis: {message}",
             "filename": filename
         }), 500
+    
+    logger.info(f"✅ {count} enregistrements envoyés vers Redis depuis {filename}")
+    
+    return jsonify({
+        "success": True,
+        "message": f"Fichier traité avec succès",
+        "filename": filename,
+        "file_type": file_type,
+        "records_processed": count,
+        "records_failed": report['failed'],
+        "failed_chunks": report['errors'],
+        "redis_queue_length": report['queue_length'],
+        "timestamp": datetime.now().isoformat()
+    }), 200
 
 
 @app.route('/stats', methods=['GET'])
 def get_stats():
     """Obtenir des statistiques sur la file Redis"""
     try:
-        queue_length = redis_client.llen("iot:data")
+        if REDIS_TRANSPORT == TRANSPORT_STREAM:
+            queue_length = redis_client.xlen(REDIS_STREAM_KEY)
+        else:
+            queue_length = redis_client.llen(REDIS_QUEUE_KEY)
         
         return jsonify({
             "redis_queue_length": queue_length,
@@ -212,4 +195,10 @@ def get_stats():
 
 
 if __name__ == '__main__':
+    # Vérifier la connexion Redis au démarrage
+    try:
+        redis_client.ping()
+        logger.info("✅ Connexion Redis réussie")
+    except Exception as e:
+        logger.error(f"❌ Erreur connexion Redis: {e}")
     app.run(host='0.0.0.0', port=8000, debug=True)
@@ -11,6 +11,12 @@ import sys
 import os
 import glob
 
+# _id déterministes et registre des schémas partagés avec l'indexeur (django_app/api/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "django_app"))
+from api.document_ids import document_id  # noqa: E402
+from api.index_lifecycle import delete_indices, locate_documents, setup_indices  # noqa: E402
+from api.schemas import DATA_TYPES, coerce  # noqa: E402
+
 ES_HOST = "http://localhost:9200"
 es = Elasticsearch([ES_HOST], verify_certs=False, ssl_show_warn=False)
 BASE_PATH = "./Fichier_logs"
@@ -44,21 +50,10 @@ def load_csv_files(pattern):
             print(f"   Erreur {filepath}: {e}")
     return all_data
 
-def prepare_numeric_fields(data, int_fields=[], float_fields=[]):
-    """Convertir les champs numériques"""
+def prepare_numeric_fields(data, data_type):
+    """Convertir les champs numériques (types du registre api/schemas.py)"""
     for item in data:
-        for field in int_fields:
-            if field in item and item[field] and item[field] != 'NA':
-                try:
-                    item[field] = int(item[field])
-                except:
-                    pass
-        for field in float_fields:
-            if field in item and item[field] and item[field] != 'NA':
-                try:
-                    item[field] = float(item[field])
-                except:
-                    pass
+        coerce(item, data_type)
         # Parser timestamp
         if 'timestamp' in item:
             try:
@@ -68,17 +63,32 @@ def prepare_numeric_fields(data, int_fields=[], float_fields=[]):
                 pass
     return data
 
-def ingest_data(index_name, data):
-    """Ingérer des données dans un index"""
+def document_ids(data, data_type):
+    """_id de chaque document, calculés avant la conversion des champs numériques"""
+    return [document_id(item, data_type) for item in data]
+
+def ingest_data(index_name, data, ids):
+    """Ingérer des données dans un index (un document existant est remplacé)"""
     if not data:
         print(f"   Aucune donnée pour {index_name}")
         return 0
     
-    actions = [{"_index": index_name, "_source": item} for item in data]
+    actions = [{"_index": index_name, "_id": doc_id, "_source": item} for doc_id, item in zip(ids, data)]
     try:
-        success, errors = helpers.bulk(es, actions, stats_only=False, raise_on_error=False)
+        # Un document déjà indexé est remplacé dans son index, même après un rollover
+        locate_documents(es, actions)
+        # Les refus 429 (Elasticsearch saturé) sont réessayés avec une attente exponentielle
+        success, errors = helpers.bulk(es, actions, stats_only=False, raise_on_error=False,
+                                       max_retries=5, initial_backoff=2, max_backoff=60)
         if errors:
             print(f"   ⚠️  Quelques erreurs d'ingestion ({len(errors)} docs)")
+            reasons = {}
+            for item in errors:
+                error = next(iter(item.values())).get('error', {})
+                reason = error.get('type', str(error)) if isinstance(error, dict) else str(error)
+                reasons[reason] = reasons.get(reason, 0) + 1
+            for reason, count in reasons.items():
+                print(f"      {reason}: {count}")
         return len(actions) if isinstance(success, list) else success
     except Exception as e:
         print(f"   ❌ Erreur: {e}")
@@ -97,63 +107,66 @@ def main():
         print(f"❌ Erreur de connexion: {e}")
         sys.exit(1)
     
-    # Supprimer anciens indices
-    print("🗑️  Suppression des anciens indices...")
-    for idx in ['iot-alertes', 'iot-capteurs', 'iot-consommation', 'iot-occupation', 'iot-maintenance']:
-        if es.indices.exists(index=idx):
-            es.indices.delete(index=idx)
-            print(f"   Supprimé: {idx}")
-    print()
+    # Les _id étant déterministes, une nouvelle ingestion remplace les documents
+    # existants : les indices restent disponibles. --reset force la suppression.
+    if '--reset' in sys.argv:
+        print("🗑️  Suppression des anciens indices...")
+        for data_type in DATA_TYPES:
+            for idx in delete_indices(es, data_type):
+                print(f"   Supprimé: {idx}")
+        print()
+    
+    # Templates et alias iot-<type> (index iot-<type>-000001 avec rollover)
+    try:
+        setup_indices(es)
+        print("✅ Templates et alias d'index installés\n")
+    except Exception as e:
+        print(f"⚠️  Templates et alias d'index non installés: {e}\n")
     
     total = 0
     
     # Alertes
     print("📊 ALERTES")
     data = load_json_files("logs_alertes*.json")
-    data = prepare_numeric_fields(data, 
-        int_fields=['duree_depassement', 'etage'],
-        float_fields=['valeur_actuelle', 'seuil'])
-    count = ingest_data('iot-alertes', data)
+    ids = document_ids(data, 'alertes')
+    data = prepare_numeric_fields(data, 'alertes')
+    count = ingest_data('iot-alertes', data, ids)
     print(f"✅ {count} alertes ingérées\n")
     total += count
     
     # Capteurs
     print("📊 CAPTEURS")
     data = load_csv_files("logs_capteurs*.csv")
-    data = prepare_numeric_fields(data,
-        int_fields=['etage'],
-        float_fields=['valeur', 'batterie', 'precision', 'seuil_min', 'seuil_max'])
-    count = ingest_data('iot-capteurs', data)
+    ids = document_ids(data, 'capteurs')
+    data = prepare_numeric_fields(data, 'capteurs')
+    count = ingest_data('iot-capteurs', data, ids)
     print(f"✅ {count} capteurs ingérés\n")
     total += count
     
     # Consommation
     print("📊 CONSOMMATION")
     data = load_json_files("logs_consommation*.json")
-    data = prepare_numeric_fields(data,
-        float_fields=['valeur_consommation', 'cout_estime', 'cout_unitaire', 
-                     'empreinte_carbone', 'comparaison_mois_precedent', 'facteur_charge'])
-    count = ingest_data('iot-consommation', data)
+    ids = document_ids(data, 'consommation')
+    data = prepare_numeric_fields(data, 'consommation')
+    count = ingest_data('iot-consommation', data, ids)
     print(f"✅ {count} consommations ingérées\n")
     total += count
     
     # Occupation
     print("📊 OCCUPATION")
     data = load_csv_files("logs_occupation*.csv")
-    data = prepare_numeric_fields(data,
-        int_fields=['capacite_max', 'nombre_personnes', 'co2_moyen', 'etage'],
-        float_fields=['taux_utilisation', 'temperature_moyenne', 'consommation_elec'])
-    count = ingest_data('iot-occupation', data)
+    ids = document_ids(data, 'occupation')
+    data = prepare_numeric_fields(data, 'occupation')
+    count = ingest_data('iot-occupation', data, ids)
     print(f"✅ {count} occupations ingérées\n")
     total += count
     
     # Maintenance
     print("📊 MAINTENANCE")
     data = load_csv_files("logs_maintenance*.csv")
-    data = prepare_numeric_fields(data,
-        int_fields=['vie_restante', 'duree_intervention_estimee', 'historique_pannes'],
-        float_fields=['cout_estime'])
-    count = ingest_data('iot-maintenance', data)
+    ids = document_ids(data, 'maintenance')
+    data = prepare_numeric_fields(data, 'maintenance')
+    count = ingest_data('iot-maintenance', data, ids)
     print(f"✅ {count} maintenances ingérées\n")
     total += count
     
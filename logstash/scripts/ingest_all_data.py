@@ -8,8 +8,15 @@ import json
 import csv
 from datetime import datetime
 from elasticsearch import Elasticsearch, helpers
+import os
 import sys
 
+# _id déterministes et registre des schémas partagés avec l'indexeur (django_app/api/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "django_app"))
+from api.document_ids import document_id  # noqa: E402
+from api.index_lifecycle import delete_indices, locate_documents, setup_indices  # noqa: E402
+from api.schemas import DATA_TYPES, coerce  # noqa: E402
+
 # Configuration Elasticsearch
 ES_HOST = "http://elasticsearch:9200"
 es = Elasticsearch([ES_HOST])
@@ -23,6 +30,9 @@ def ingest_alertes():
     
     actions = []
     for item in data:
+        # _id calculé sur l'enregistrement brut, avant les conversions
+        doc_id = document_id(item, 'alertes')
+        
         # Parser la date
         if 'timestamp' in item:
             try:
@@ -31,23 +41,18 @@ def ingest_alertes():
             except:
                 pass
         
-        # Convertir les champs numériques
-        if 'valeur_actuelle' in item:
-            item['valeur_actuelle'] = float(item['valeur_actuelle'])
-        if 'seuil' in item:
-            item['seuil'] = float(item['seuil'])
-        if 'duree_depassement' in item:
-            item['duree_depassement'] = int(item['duree_depassement'])
-        if 'etage' in item:
-            item['etage'] = int(item['etage'])
+        # Convertir les champs numériques (types du registre api/schemas.py)
+        coerce(item, 'alertes')
         
         action = {
             "_index": "iot-alertes",
+            "_id": doc_id,
             "_source": item
         }
         actions.append(action)
     
-    # Bulk insert
+    # Bulk insert (un document déjà indexé est remplacé dans son index, même après un rollover)
+    locate_documents(es, actions)
     success, failed = helpers.bulk(es, actions, stats_only=True)
     print(f"✅ Alertes: {success} documents insérés, {failed} erreurs")
     return success
@@ -61,6 +66,9 @@ def ingest_capteurs():
         actions = []
         
         for row in reader:
+            # _id calculé sur l'enregistrement brut, avant les conversions
+            doc_id = document_id(row, 'capteurs')
+            
             # Parser la date
             if 'timestamp' in row:
                 try:
@@ -69,29 +77,17 @@ def ingest_capteurs():
                 except:
                     pass
             
-            # Convertir les champs numériques
-            try:
-                if 'valeur' in row and row['valeur']:
-                    row['valeur'] = float(row['valeur'])
-                if 'batterie' in row and row['batterie']:
-                    row['batterie'] = float(row['batterie'])
-                if 'etage' in row and row['etage']:
-                    row['etage'] = int(row['etage'])
-                if 'precision' in row and row['precision']:
-                    row['precision'] = float(row['precision'])
-                if 'seuil_min' in row and row['seuil_min']:
-                    row['seuil_min'] = float(row['seuil_min'])
-                if 'seuil_max' in row and row['seuil_max']:
-                    row['seuil_max'] = float(row['seuil_max'])
-            except:
-                pass
+            # Convertir les champs numériques (types du registre api/schemas.py)
+            coerce(row, 'capteurs')
             
             action = {
                 "_index": "iot-capteurs",
+                "_id": doc_id,
                 "_source": row
             }
             actions.append(action)
         
+        locate_documents(es, actions)
         success, failed = helpers.bulk(es, actions, stats_only=True)
         print(f"✅ Capteurs: {success} documents insérés, {failed} erreurs")
         return success
@@ -105,6 +101,9 @@ def ingest_consommation():
     
     actions = []
     for item in data:
+        # _id calculé sur l'enregistrement brut, avant les conversions
+        doc_id = document_id(item, 'consommation')
+        
         # Parser la date
         if 'timestamp' in item:
             try:
@@ -113,29 +112,17 @@ def ingest_consommation():
             except:
                 pass
         
-        # Convertir les champs numériques
-        try:
-            if 'valeur_consommation' in item:
-                item['valeur_consommation'] = float(item['valeur_consommation'])
-            if 'cout_estime' in item:
-                item['cout_estime'] = float(item['cout_estime'])
-            if 'cout_unitaire' in item:
-                item['cout_unitaire'] = float(item['cout_unitaire'])
-            if 'empreinte_carbone' in item:
-                item['empreinte_carbone'] = float(item['empreinte_carbone'])
-            if 'comparaison_mois_precedent' in item:
-                item['comparaison_mois_precedent'] = float(item['comparaison_mois_precedent'])
-            if 'facteur_charge' in item:
-                item['facteur_charge'] = float(item['facteur_charge'])
-        except:
-            pass
+        # Convertir les champs numériques (types du registre api/schemas.py)
+        coerce(item, 'consommation')
         
         action = {
             "_index": "iot-consommation",
+            "_id": doc_id,
             "_source": item
         }
         actions.append(action)
     
+    locate_documents(es, actions)
     success, failed = helpers.bulk(es, actions, stats_only=True)
     print(f"✅ Consommation: {success} documents insérés, {failed} erreurs")
     return success
@@ -149,6 +136,9 @@ def ingest_occupation():
         actions = []
         
         for row in reader:
+            # _id calculé sur l'enregistrement brut, avant les conversions
+            doc_id = document_id(row, 'occupation')
+            
             # Parser la date
             if 'timestamp' in row:
                 try:
@@ -157,31 +147,17 @@ def ingest_occupation():
                 except:
                     pass
             
-            # Convertir les champs numériques
-            try:
-                if 'capacite_max' in row and row['capacite_max']:
-                    row['capacite_max'] = int(row['capacite_max'])
-                if 'nombre_personnes' in row and row['nombre_personnes']:
-                    row['nombre_personnes'] = int(row['nombre_personnes'])
-                if 'taux_utilisation' in row and row['taux_utilisation']:
-                    row['taux_utilisation'] = float(row['taux_utilisation'])
-                if 'temperature_moyenne' in row and row['temperature_moyenne']:
-                    row['temperature_moyenne'] = float(row['temperature_moyenne'])
-                if 'co2_moyen' in row and row['co2_moyen']:
-                    row['co2_moyen'] = int(row['co2_moyen'])
-                if 'consommation_elec' in row and row['consommation_elec']:
-                    row['consommation_elec'] = float(row['consommation_elec'])
-                if 'etage' in row and row['etage']:
-                    row['etage'] = int(row['etage'])
-            except:
-                pass
+            # Convertir les champs numériques (types du registre api/schemas.py)
+            coerce(row, 'occupation')
             
             action = {
                 "_index": "iot-occupation",
+                "_id": doc_id,
                 "_source": row
             }
             actions.append(action)
         
+        locate_documents(es, actions)
         success, failed = helpers.bulk(es, actions, stats_only=True)
         print(f"✅ Occupation: {success} documents insérés, {failed} erreurs")
         return success
@@ -195,6 +171,9 @@ def ingest_maintenance():
         actions = []
         
         for row in reader:
+            # _id calculé sur l'enregistrement brut, avant les conversions
+            doc_id = document_id(row, 'maintenance')
+            
             # Parser la date
             if 'timestamp' in row:
                 try:
@@ -203,23 +182,17 @@ def ingest_maintenance():
                 except:
                     pass
             
-            # Convertir les champs numériques
-            try:
-                if 'vie_restante' in row and row['vie_restante']:
-                    row['vie_restante'] = int(row['vie_restante'])
-                if 'cout_estime' in row and row['cout_estime']:
-                    row['cout_estime'] = float(row['cout_estime'])
-                if 'duree_intervention_estimee' in row and row['duree_intervention_estimee']:
-                    row['duree_intervention_estimee'] = int(row['duree_intervention_estimee'])
-            except:
-                pass
+            # Convertir les champs numériques (types du registre api/schemas.py)
+            coerce(row, 'maintenance')
             
             action = {
                 "_index": "iot-maintenance",
+                "_id": doc_id,
                 "_source": row
             }
             actions.append(action)
         
+        locate_documents(es, actions)
         success, failed = helpers.bulk(es, actions, stats_only=True)
         print(f"✅ Maintenance: {success} documents insérés, {failed} erreurs")
         return success
@@ -227,11 +200,10 @@ def ingest_maintenance():
 def delete_all_indices():
     """Supprimer tous les indices IoT existants"""
     print("🗑️  Suppression des anciens indices...")
-    indices = ['iot-alertes', 'iot-capteurs', 'iot-consommation', 'iot-occupation', 'iot-maintenance']
     
-    for index in indices:
-        if es.indices.exists(index=index):
-            es.indices.delete(index=index)
+    # Alias iot-<type> : supprimer les index iot-<type>-NNNNNN derrière l'alias
+    for data_type in DATA_TYPES:
+        for index in delete_indices(es, data_type):
             print(f"   Supprimé: {index}")
 
 def create_index_patterns():
@@ -265,8 +237,15 @@ def main():
     print("✅ Connexion à Elasticsearch réussie")
     print()
     
-    # Supprimer les anciens indices
-    delete_all_indices()
+    # Les _id étant déterministes, une nouvelle ingestion remplace les documents
+    # existants sans rendre les indices indisponibles. --reset force la suppression.
+    if '--reset' in sys.argv:
+        delete_all_indices()
+        print()
+    
+    # Templates et alias iot-<type> (index iot-<type>-000001 avec rollover)
+    setup_indices(es)
+    print("✅ Templates et alias d'index installés")
     print()
     
     # Ingérer toutes les données